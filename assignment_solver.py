@@ -0,0 +1,104 @@
+import heapq
+
+
+def solve_min_cost_assignment(requirements, candidates, costs):
+    """
+    Assign people to shift slots for a single day as a min-cost max-flow.
+
+    Every person takes at most one slot and every slot takes at most its
+    required headcount. The result fills as many slots as possible first and,
+    among all maximum fillings, has the lowest total cost.
+
+    Parameters:
+    requirements (list): Required headcount per slot index
+    candidates (list): (name, [slot indices the person can take]) pairs,
+                       in tie-break order
+    costs (dict): (name, slot index) -> integer cost of that assignment
+
+    Returns:
+    dict: name -> assigned slot index, for every assigned person
+    """
+    slot_count = len(requirements)
+    filled = [0] * slot_count
+    assigned = {}
+    order = {name: i for i, (name, _) in enumerate(candidates)}
+
+    # free_heaps[s]: people not yet assigned who can take slot s
+    free_heaps = [[] for _ in range(slot_count)]
+    # move_heaps[s][t]: people sitting in slot t who could move to slot s
+    move_heaps = [[[] for _ in range(slot_count)] for _ in range(slot_count)]
+    slots_of = {}
+
+    for name, slots in candidates:
+        slots_of[name] = slots
+        for s in slots:
+            free_heaps[s].append((costs[(name, s)], order[name], name))
+    for heap in free_heaps:
+        heapq.heapify(heap)
+
+    def best_free(s):
+        heap = free_heaps[s]
+        while heap and heap[0][2] in assigned:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def best_move(s, t):
+        heap = move_heaps[s][t]
+        while heap and assigned.get(heap[0][2]) != t:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def place(name, s):
+        assigned[name] = s
+        for other in slots_of[name]:
+            if other != s:
+                heapq.heappush(move_heaps[other][s],
+                               (costs[(name, other)] - costs[(name, s)], order[name], name))
+
+    while True:
+        # Shortest augmenting path over the compressed graph whose nodes are
+        # the slots. Bellman-Ford is fine here: there are only a few slots and
+        # successive shortest paths never leave a negative cycle behind.
+        inf = float("inf")
+        dist = [0 if filled[s] < requirements[s] else inf for s in range(slot_count)]
+        via = [None] * slot_count
+        for _ in range(slot_count):
+            changed = False
+            for s in range(slot_count):
+                if dist[s] == inf:
+                    continue
+                for t in range(slot_count):
+                    if t == s:
+                        continue
+                    entry = best_move(s, t)
+                    if entry and dist[s] + entry[0] < dist[t]:
+                        dist[t] = dist[s] + entry[0]
+                        via[t] = (s, entry[2])
+                        changed = True
+            if not changed:
+                break
+
+        best = None
+        for s in range(slot_count):
+            if dist[s] == inf:
+                continue
+            entry = best_free(s)
+            if entry and (best is None or dist[s] + entry[0] < best[0]):
+                best = (dist[s] + entry[0], s, entry[2])
+        if best is None:
+            break
+
+        # Walk the path back to the source: the end slot gains a free person
+        # and each slot on the way hands one of its people to the previous slot.
+        _, s, name = best
+        moves = [(name, s)]
+        while via[s] is not None:
+            prev, mover = via[s]
+            moves.append((mover, prev))
+            s = prev
+        filled[s] += 1
+        for mover, slot in moves:
+            place(mover, slot)
+
+    return assigned
+
@@ -0,0 +1,213 @@
+import os
+import threading
+
+from availability_store import changed_cells, rename_cells
+from json_codec import decode, encode, read_json
+
+
+class JournalAvailabilityStore:
+    """
+    Availability kept as a JSON snapshot plus an append-only journal of edits.
+
+    Every save appends one small JSON line per changed cell to the journal,
+    e.g. {"op":"set","date":"2025-01-06","employee":"Amy","shifts":["7-16"]}.
+    Once the journal passes compact_bytes it is rotated aside and a
+    background thread writes the current state as the new snapshot, then
+    drops the rotated journal. Records hold absolute values, so replaying a
+    rotated journal over a snapshot that already contains it is harmless:
+    on startup the snapshot is loaded and whatever journals exist replayed.
+    Only an undecodable last line, torn by a crash, is dropped; one anywhere
+    else raises ValueError and leaves the files untouched.
+    """
+
+    def __init__(self, snapshot_path="availability.json", journal_path="availability.journal",
+                 compact_bytes=1 << 20):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.rotated_path = journal_path + ".compacting"
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._compactor = None
+
+        self._data = {}
+        if os.path.exists(snapshot_path):
+            self._data = _copy(read_json(snapshot_path))
+        for path in (self.rotated_path, journal_path):
+            if os.path.exists(path):
+                self._replay(path)
+
+        self._journal = open(journal_path, 'ab')
+        if os.path.exists(self.rotated_path):
+            # A compaction was interrupted; finish it
+            self._start_compaction(_copy(self._data))
+
+    def close(self):
+        """Wait for a running compaction and close the journal."""
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self._journal.close()
+
+    def is_empty(self):
+        return not self._data
+
+    def load(self):
+        """The whole availability dict, or None when nothing is stored."""
+        with self._lock:
+            return _copy(self._data) if self._data else None
+
+    def save(self, data, cells=None):
+        """
+        Store data. cells lists the (date, employee) pairs that changed; when
+        it is None every cell is compared with the stored state and only the
+        differences are journaled. A listed cell missing from data is deleted.
+        """
+        with self._lock:
+            if cells is None:
+                cells = changed_cells(self._data, data)
+            records = []
+            for date, employee in cells:
+                shifts = data.get(date, {}).get(employee)
+                if shifts is None:
+                    records.append({"op": "delete", "date": date, "employee": employee})
+                else:
+                    records.append({"op": "set", "date": date, "employee": employee, "shifts": list(shifts)})
+            self._append(records)
+
+    def delete_employee(self, name):
+        """Drop every cell of one employee."""
+        with self._lock:
+            self._append([{"op": "delete_employee", "employee": name}])
+
+    def add_employee(self, name, shifts=()):
+        """Give name an entry listing shifts on every stored date where they have none."""
+        with self._lock:
+            self._append([{"op": "add_employee", "employee": name, "shifts": list(shifts)}])
+
+    def rename_employee(self, old_name, new_name):
+        """Move old_name's cells to new_name; on dates where new_name already has one, that one is kept."""
+        with self._lock:
+            self._append([{"op": "rename_employee", "employee": old_name, "new_name": new_name}])
+
+    def stored_ids(self):
+        """Employees are kept by name only, so there are no ids."""
+        return {}
+
+    def coverage(self):
+        """(number of stored dates, {employee: number of dates they have an entry on})."""
+        with self._lock:
+            counts = {}
+            for day in self._data.values():
+                for name in day:
+                    counts[name] = counts.get(name, 0) + 1
+            return len(self._data), counts
+
+    def replace_all(self, data):
+        """Store data as the complete availability, dropping everything else."""
+        with self._lock:
+            # One record with everything, so replaying stays correct until it is compacted
+            self._append([{"op": "replace", "data": data}])
+            self._rotate(force=True)
+
+    def import_json(self, path):
+        """Replace the stored availability with the contents of a JSON file."""
+        self.replace_all(read_json(path))
+
+    def export_json(self, path):
+        """Write the stored availability to a JSON file in the availability.json format."""
+        _write_json(path, self.load() or {})
+
+    def flush(self):
+        """Force the journal to disk."""
+        with self._lock:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def _append(self, records):
+        if not records:
+            return
+        for record in records:
+            _apply(self._data, record)
+        self._journal.write(b"".join(encode(record, pretty=False) + b"\n" for record in records))
+        self._journal.flush()
+        if self._journal.tell() >= self.compact_bytes:
+            self._rotate()
+
+    def _rotate(self, force=False):
+        """Set the journal aside and compact it in the background (caller holds the lock)."""
+        if self._compactor is not None and self._compactor.is_alive():
+            if not force:
+                return  # the next save past the threshold will try again
+            self._compactor.join()
+        self._journal.close()
+        if os.path.exists(self.rotated_path):
+            # Leftover of an interrupted compaction: keep its records ahead of the new ones
+            with open(self.rotated_path, 'ab') as rotated, open(self.journal_path, 'rb') as journal:
+                rotated.write(journal.read())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.rotated_path)
+        self._journal = open(self.journal_path, 'ab')
+        self._start_compaction(_copy(self._data))
+
+    def _start_compaction(self, state):
+        self._compactor = threading.Thread(target=self._compact, args=(state,), daemon=True)
+        self._compactor.start()
+
+    def _compact(self, state):
+        _write_json(self.snapshot_path, state)
+        os.remove(self.rotated_path)
+
+    def _replay(self, path):
+        with open(path, 'rb+') as f:
+            valid = 0
+            for line in f:
+                try:
+                    record = decode(line)
+                except ValueError:
+                    if f.read(1):
+                        # Records follow, so this is not a torn write; compacting would lose them
+                        raise ValueError(f"Corrupt journal record in {path} at byte {valid}") from None
+                    # Torn last line of a crash; cut it off so later appends stay readable
+                    f.truncate(valid)
+                    break
+                _apply(self._data, record)
+                valid += len(line)
+
+
+def _apply(data, record):
+    op = record["op"]
+    if op == "set":
+        data.setdefault(record["date"], {})[record["employee"]] = list(record["shifts"])
+    elif op == "delete":
+        day = data.get(record["date"])
+        if day is not None:
+            day.pop(record["employee"], None)
+            if not day:
+                del data[record["date"]]
+    elif op == "delete_employee":
+        for date in list(data):
+            data[date].pop(record["employee"], None)
+    elif op == "add_employee":
+        for day in data.values():
+            day.setdefault(record["employee"], list(record["shifts"]))
+    elif op == "rename_employee":
+        rename_cells(data, record["employee"], record["new_name"])
+    elif op == "replace":
+        data.clear()
+        data.update(_copy(record["data"]))
+
+
+def _copy(data):
+    return {date: {employee: list(shifts) for employee, shifts in day.items()} for date, day in data.items()}
+
+
+def _write_json(path, data):
+    """Write data to path atomically, so a crash leaves the old or the new file."""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(encode(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
@@ -0,0 +1,307 @@
+import os
+import sqlite3
+
+from json_codec import read_json, write_json
+
+# 2: cells keyed by ids the store made up; 3: by registry ids (see adopt_ids)
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS employees (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS cells (
+    date TEXT NOT NULL,
+    employee INTEGER NOT NULL REFERENCES employees (id),
+    PRIMARY KEY (date, employee)
+);
+CREATE TABLE IF NOT EXISTS shifts (
+    date TEXT NOT NULL,
+    employee INTEGER NOT NULL REFERENCES employees (id),
+    position INTEGER NOT NULL,
+    shift TEXT NOT NULL,
+    PRIMARY KEY (date, employee, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cells_by_employee ON cells (employee);
+CREATE INDEX IF NOT EXISTS shifts_by_employee ON shifts (employee, date);
+"""
+
+# Version 1 keyed cells and shifts by the employee's name
+_MIGRATE_FROM_NAMES = """
+ALTER TABLE cells RENAME TO cells_v1;
+ALTER TABLE shifts RENAME TO shifts_v1;
+DROP INDEX cells_by_employee;
+DROP INDEX shifts_by_employee;
+{schema}
+INSERT INTO employees (name) SELECT employee FROM cells_v1 GROUP BY employee ORDER BY MIN(rowid);
+INSERT INTO cells (date, employee)
+    SELECT c.date, e.id FROM cells_v1 c JOIN employees e ON e.name = c.employee ORDER BY c.rowid;
+INSERT INTO shifts (date, employee, position, shift)
+    SELECT s.date, e.id, s.position, s.shift FROM shifts_v1 s JOIN employees e ON e.name = s.employee;
+DROP TABLE cells_v1;
+DROP TABLE shifts_v1;
+"""
+
+
+class SQLiteAvailabilityStore:
+    """
+    Availability ({iso_date: {name: [shift, ...]}}) kept in an SQLite file so
+    an edit only writes the cells it touched.
+
+    cells has one row per (date, employee) entry, so empty lists survive and
+    load() returns dates and names in the order they were first stored;
+    shifts holds each cell's list in order. Both refer to employees by id
+    and the name is stored once in employees, so renaming is a one-row
+    update however much history there is. When the database is new and
+    legacy_json exists, that file is imported once; a database keyed by
+    names is migrated when opened.
+
+    employee_ids(name) gives the id an employee is stored under, normally
+    the EmployeeRegistry id, so the database and the registry agree on who
+    is who; names it returns None for get negative ids, which no registry
+    hands out. adopt_ids() renumbers a database written before that.
+    """
+
+    def __init__(self, path="availability.db", legacy_json=None, employee_ids=None):
+        self.path = path
+        self.employee_ids = employee_ids
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._migrate()
+        self._ids = dict(self.connection.execute("SELECT name, id FROM employees"))
+        # Last state loaded or saved, to find what a whole-dict save changed
+        self._known = None
+
+        if legacy_json and os.path.exists(legacy_json) and self.is_empty():
+            self.import_json(legacy_json)
+
+    def _migrate(self):
+        version = self._version()
+        if version >= 2:
+            return
+        has_cells = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cells'").fetchone()
+        if has_cells:
+            # Keyed by name until now; the ids it gets are the store's own until adopt_ids()
+            script, version = _MIGRATE_FROM_NAMES.format(schema=SCHEMA), 2
+        else:
+            script, version = SCHEMA, SCHEMA_VERSION
+        self.connection.executescript(
+            f"BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;")
+
+    def _version(self):
+        return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def is_empty(self):
+        return self.connection.execute("SELECT 1 FROM cells LIMIT 1").fetchone() is None
+
+    def load(self):
+        """The whole availability dict, or None when nothing is stored."""
+        data = {}
+        for date, employee in self.connection.execute(
+                "SELECT c.date, e.name FROM cells c JOIN employees e ON e.id = c.employee ORDER BY c.rowid"):
+            data.setdefault(date, {})[employee] = []
+        if not data:
+            self._known = {}
+            return None
+        for date, employee, shift in self.connection.execute(
+                "SELECT s.date, e.name, s.shift FROM shifts s JOIN employees e ON e.id = s.employee "
+                "ORDER BY s.date, s.employee, s.position"):
+            data[date][employee].append(shift)
+        self._known = _freeze(data)
+        return data
+
+    def save(self, data, cells=None):
+        """
+        Store data. cells lists the (date, employee) pairs that changed; when
+        it is None every cell is compared with the last known state and only
+        the differences are written. A listed cell missing from data is deleted.
+        """
+        if cells is None:
+            if self._known is None:
+                self.load()
+            cells = changed_cells(self._known, data)
+        if not cells:
+            return
+        with self.connection:
+            for date, employee in cells:
+                shifts = data.get(date, {}).get(employee)
+                self._write_cell(date, employee, shifts)
+        for date, employee in cells:
+            shifts = data.get(date, {}).get(employee)
+            if shifts is None:
+                self._known.get(date, {}).pop(employee, None)
+            else:
+                self._known.setdefault(date, {})[employee] = tuple(shifts)
+
+    def _employee_id(self, name):
+        employee_id = self._ids.get(name)
+        if employee_id is None:
+            employee_id = self.employee_ids(name) if self.employee_ids is not None else None
+            taken = set(self._ids.values())
+            if employee_id is None or employee_id in taken:
+                # Not a registry employee, or the id still names someone who was not synced away
+                employee_id = min(min(taken, default=0), 0) - 1
+            self.connection.execute("INSERT INTO employees (id, name) VALUES (?, ?)", (employee_id, name))
+            self._ids[name] = employee_id
+        return employee_id
+
+    def _write_cell(self, date, employee, shifts):
+        if shifts is None and employee not in self._ids:
+            return
+        employee_id = self._employee_id(employee)
+        self.connection.execute("DELETE FROM shifts WHERE date = ? AND employee = ?", (date, employee_id))
+        if shifts is None:
+            self.connection.execute("DELETE FROM cells WHERE date = ? AND employee = ?", (date, employee_id))
+            return
+        self.connection.execute("INSERT OR IGNORE INTO cells (date, employee) VALUES (?, ?)", (date, employee_id))
+        self.connection.executemany(
+            "INSERT INTO shifts (date, employee, position, shift) VALUES (?, ?, ?, ?)",
+            [(date, employee_id, position, shift) for position, shift in enumerate(shifts)])
+
+    def delete_employee(self, name):
+        """Drop every cell of one employee."""
+        employee_id = self._ids.pop(name, None)
+        if employee_id is not None:
+            with self.connection:
+                self.connection.execute("DELETE FROM shifts WHERE employee = ?", (employee_id,))
+                self.connection.execute("DELETE FROM cells WHERE employee = ?", (employee_id,))
+                self.connection.execute("DELETE FROM employees WHERE id = ?", (employee_id,))
+        if self._known is not None:
+            for day in self._known.values():
+                day.pop(name, None)
+
+    def add_employee(self, name, shifts=()):
+        """Give name an entry listing shifts on every stored date where they have none."""
+        with self.connection:
+            missing = [date for (date,) in self.connection.execute(
+                "SELECT DISTINCT date FROM cells WHERE date NOT IN (SELECT date FROM cells WHERE employee = ?)",
+                (self._ids.get(name, -1),))]
+            for date in missing:
+                self._write_cell(date, name, shifts)
+        if self._known is not None:
+            for date in missing:
+                self._known.setdefault(date, {})[name] = tuple(shifts)
+
+    def rename_employee(self, old_name, new_name):
+        """
+        Move old_name's cells to new_name: a one-row update of employees,
+        unless new_name already has cells, in which case those are kept on
+        the dates both have. The merged cells keep old_name's id when that
+        is new_name's registry id.
+        """
+        old_id = self._ids.get(old_name)
+        if old_id is None or new_name == old_name:
+            return
+        new_id = self._ids.get(new_name)
+        with self.connection:
+            if new_id is None:
+                self.connection.execute("UPDATE employees SET name = ? WHERE id = ?", (new_name, old_id))
+                self._ids[new_name] = old_id
+            else:
+                # new_name got an id of its own while its registry id still named old_name
+                keep = old_id if self.employee_ids is not None and self.employee_ids(new_name) == old_id else new_id
+                for table in ("shifts", "cells"):
+                    self.connection.execute(
+                        f"DELETE FROM {table} WHERE employee = ? "
+                        "AND date IN (SELECT date FROM cells WHERE employee = ?)", (old_id, new_id))
+                    self.connection.execute(f"UPDATE {table} SET employee = ? WHERE employee IN (?, ?)",
+                                            (keep, old_id, new_id))
+                self.connection.execute("DELETE FROM employees WHERE id IN (?, ?) AND id != ?", (old_id, new_id, keep))
+                self.connection.execute("UPDATE employees SET name = ? WHERE id = ?", (new_name, keep))
+                self._ids[new_name] = keep
+            del self._ids[old_name]
+        if self._known is not None:
+            rename_cells(self._known, old_name, new_name)
+
+    def adopt_ids(self, registry_ids):
+        """
+        Renumber the stored employees to the ids in registry_ids ({name: id});
+        names missing from it get negative ids. Returns False when every
+        employee already had its id.
+        """
+        wanted = {}
+        unknown = -1
+        for name in self._ids:
+            wanted[name] = registry_ids.get(name)
+            if wanted[name] is None:
+                wanted[name], unknown = unknown, unknown - 1
+        if wanted == self._ids:
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            return False
+        # Park every row above both the old and the new ids first, so no step collides
+        offset = 2 * max(abs(i) for i in list(self._ids.values()) + list(wanted.values())) + 2
+        with self.connection:
+            for table in ("shifts", "cells"):
+                self.connection.execute(f"UPDATE {table} SET employee = employee + ?", (offset,))
+                self.connection.executemany(f"UPDATE {table} SET employee = ? WHERE employee = ?",
+                                            [(wanted[name], old_id + offset) for name, old_id in self._ids.items()])
+            self.connection.execute("DELETE FROM employees")
+            self.connection.executemany("INSERT INTO employees (id, name) VALUES (?, ?)",
+                                        [(employee_id, name) for name, employee_id in wanted.items()])
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._ids = wanted
+        return True
+
+    def stored_ids(self):
+        """{name: registry id} of every stored employee; empty until the ids are registry ids."""
+        return dict(self._ids) if self._version() >= SCHEMA_VERSION else {}
+
+    def coverage(self):
+        """(number of stored dates, {employee: number of dates they have an entry on})."""
+        date_count = self.connection.execute("SELECT COUNT(DISTINCT date) FROM cells").fetchone()[0]
+        counts = dict(self.connection.execute(
+            "SELECT e.name, COUNT(*) FROM cells c JOIN employees e ON e.id = c.employee GROUP BY c.employee"))
+        return date_count, counts
+
+    def replace_all(self, data):
+        """Store data as the complete availability, dropping everything else."""
+        with self.connection:
+            self.connection.execute("DELETE FROM shifts")
+            self.connection.execute("DELETE FROM cells")
+            self.connection.execute("DELETE FROM employees")
+            self._ids.clear()
+            for date, day in data.items():
+                for employee, shifts in day.items():
+                    self._write_cell(date, employee, shifts)
+        self._known = _freeze(data)
+
+    def import_json(self, path):
+        """Replace the stored availability with the contents of a JSON file."""
+        self.replace_all(read_json(path))
+
+    def export_json(self, path):
+        """Write the stored availability to a JSON file in the availability.json format."""
+        write_json(path, self.load() or {})
+
+
+def _freeze(data):
+    return {date: {employee: tuple(shifts) for employee, shifts in day.items()} for date, day in data.items()}
+
+
+def rename_cells(data, old_name, new_name):
+    for day in data.values():
+        if old_name in day:
+            shifts = day.pop(old_name)
+            day.setdefault(new_name, shifts)
+
+
+def changed_cells(known, data):
+    """(date, employee) pairs whose lists differ between known and data, including removed ones."""
+    changed = []
+    for date, day in data.items():
+        known_day = known.get(date, {})
+        for employee, shifts in day.items():
+            known_shifts = known_day.get(employee)
+            if known_shifts is None or list(known_shifts) != list(shifts):
+                changed.append((date, employee))
+        for employee in known_day:
+            if employee not in day:
+                changed.append((date, employee))
+    for date, known_day in known.items():
+        if date not in data:
+            changed.extend((date, employee) for employee in known_day)
+    return changed
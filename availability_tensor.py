@@ -0,0 +1,120 @@
+import numpy as np
+
+from compact_availability import ABSENT, CompactAvailability
+
+
+class AvailabilityTensor:
+    """
+    Availability compiled once per scheduling run into dense arrays.
+
+    Attributes:
+    dates / names / shifts: index -> ISO date, employee name, shift string
+    date_index / name_index / shift_index: the reverse lookups
+    cells: uint8 [date, employee, shift], 1 where the shift string is listed
+    present: bool [date, employee], True where the employee has an entry
+    lengths: int16 [date, employee], number of listed entries
+    first: int32 [date, employee], shift index of the first entry or -1
+    """
+
+    def __init__(self, dates, names, shifts, cells, present, lengths, first):
+        self.dates = dates
+        self.names = names
+        self.shifts = shifts
+        self.date_index = {d: i for i, d in enumerate(dates)}
+        self.name_index = {n: i for i, n in enumerate(names)}
+        self.shift_index = {s: i for i, s in enumerate(shifts)}
+        self.cells = cells
+        self.present = present
+        self.lengths = lengths
+        self.first = first
+
+    def columns(self, names):
+        """Employee indices for the given names, in the same order."""
+        return np.array([self.name_index[name] for name in names], dtype=np.intp)
+
+    def shift_mask(self, date_idx, cols, shift):
+        """Boolean vector over cols: who listed this shift on this date."""
+        idx = self.shift_index.get(shift)
+        if idx is None:
+            return np.zeros(len(cols), dtype=bool)
+        return self.cells[date_idx, cols, idx].astype(bool)
+
+
+def compile_availability(availability, iso_dates, names):
+    """
+    Build an AvailabilityTensor for the given dates and employees.
+
+    Employees or dates missing from availability are marked as not present;
+    entries for names outside the list are ignored.
+    """
+    if isinstance(availability, CompactAvailability):
+        return _compile_compact(availability, iso_dates, names)
+
+    name_index = {name: i for i, name in enumerate(names)}
+    shift_index = {}
+    shifts = []
+
+    present = np.zeros((len(iso_dates), len(names)), dtype=bool)
+    lengths = np.zeros((len(iso_dates), len(names)), dtype=np.int16)
+    first = np.full((len(iso_dates), len(names)), -1, dtype=np.int32)
+    entries = []  # (date, employee, shift) triples, scattered in one go below
+
+    for d, iso_date in enumerate(iso_dates):
+        day = availability.get(iso_date)
+        if not day:
+            continue
+        for name, listed in day.items():
+            e = name_index.get(name)
+            if e is None:
+                continue
+            present[d, e] = True
+            lengths[d, e] = len(listed)
+            for pos, shift in enumerate(listed):
+                s = shift_index.get(shift)
+                if s is None:
+                    s = shift_index[shift] = len(shifts)
+                    shifts.append(shift)
+                if pos == 0:
+                    first[d, e] = s
+                entries.append((d, e, s))
+
+    cells = np.zeros((len(iso_dates), len(names), max(len(shifts), 1)), dtype=np.uint8)
+    if entries:
+        d_idx, e_idx, s_idx = np.array(entries, dtype=np.intp).T
+        cells[d_idx, e_idx, s_idx] = 1
+
+    return AvailabilityTensor(list(iso_dates), list(names), shifts, cells, present, lengths, first)
+
+
+def _compile_compact(availability, iso_dates, names):
+    """compile_availability for a CompactAvailability: one table lookup per distinct cell pattern."""
+    rows = np.array([availability.rows.get(d, -1) for d in iso_dates], dtype=np.intp)
+    columns = np.array([availability.name_index.get(n, -1) for n in names], dtype=np.intp)
+    codes = np.zeros((len(iso_dates), len(names)), dtype=np.intp)
+    known_rows, known_columns = rows >= 0, columns >= 0
+    codes[np.ix_(known_rows, known_columns)] = availability.codes[np.ix_(rows[known_rows], columns[known_columns])]
+
+    # Only the patterns that occur decide the shift axis and the per-pattern tables
+    used = [code for code in np.unique(codes).tolist() if code != ABSENT]
+    shift_index = {}
+    shifts = []
+    for code in used:
+        for shift in availability.patterns[code]:
+            if shift not in shift_index:
+                shift_index[shift] = len(shifts)
+                shifts.append(shift)
+
+    pattern_count = len(availability.patterns)
+    pattern_lengths = np.zeros(pattern_count, dtype=np.int16)
+    pattern_first = np.full(pattern_count, -1, dtype=np.int32)
+    pattern_cells = np.zeros((pattern_count, max(len(shifts), 1)), dtype=np.uint8)
+    for code in used:
+        pattern = availability.patterns[code]
+        pattern_lengths[code] = len(pattern)
+        if pattern:
+            pattern_first[code] = shift_index[pattern[0]]
+        for shift in pattern:
+            pattern_cells[code, shift_index[shift]] = 1
+
+    return AvailabilityTensor(list(iso_dates), list(names), shifts, pattern_cells[codes], codes != ABSENT,
+                              pattern_lengths[codes], pattern_first[codes])
@@ -0,0 +1,151 @@
+import threading
+import time
+
+SAVED = "saved"
+DIRTY = "dirty"
+SAVING = "saving"
+FAILED = "failed"
+
+
+class AvailabilityWriter:
+    """
+    Writes availability saves to a store on a background thread.
+
+    submit() only copies the edited cells and returns; edits that arrive
+    close together are coalesced into one store.save(). A batch is written
+    once no edit has come in for idle_ms, or interval_ms after the first
+    unsaved edit if they keep coming. flush() writes whatever is queued on
+    the calling thread, for exit, crashes and code that reads the store
+    directly.
+
+    status is one of SAVED, DIRTY (queued), SAVING or FAILED; a failed batch
+    stays queued and is retried every interval_ms.
+    """
+
+    def __init__(self, store, interval_ms=500, idle_ms=150):
+        self.store = store
+        self.interval = interval_ms / 1000
+        self.idle = idle_ms / 1000
+        self.status = SAVED
+        self.error = None
+
+        # Queued saves: a full copy of the data when a whole-dict save is
+        # queued, otherwise {(date, employee): shifts or None for deleted}
+        self._full = None
+        self._cells = {}
+        self._dirty_since = None
+        self._last_submit = None
+
+        # _write_lock is taken before _condition and held for a whole write,
+        # so batches reach the store in the order they were taken
+        self._write_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, data, cells=None):
+        """Queue a save_data(data, cells) and return without touching the disk."""
+        with self._condition:
+            if cells is None:
+                self._full = {date: {employee: list(shifts) for employee, shifts in day.items()}
+                              for date, day in data.items()}
+                self._cells.clear()
+            else:
+                for date, employee in cells:
+                    shifts = data.get(date, {}).get(employee)
+                    shifts = None if shifts is None else list(shifts)
+                    if self._full is not None:
+                        _set_cell(self._full, date, employee, shifts)
+                    else:
+                        self._cells[(date, employee)] = shifts
+            now = time.monotonic()
+            if self._dirty_since is None:
+                self._dirty_since = now
+            self._last_submit = now
+            if self.status == SAVED:
+                self.status = DIRTY
+            self._condition.notify()
+
+    def flush(self):
+        """
+        Write everything queued before returning.
+
+        Raises RuntimeError when the write fails.
+        """
+        with self._write_lock:
+            batch = self._take()
+            if batch is not None:
+                self._write(batch)
+            if self.status == FAILED:
+                raise RuntimeError(f"File write failed: {str(self.error)}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._dirty_since is None:
+                    self._condition.wait()
+                while self._dirty_since is not None:
+                    due = min(self._dirty_since + self.interval, self._last_submit + self.idle)
+                    remaining = due - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            with self._write_lock:
+                # flush() may have written the batch while this thread waited
+                batch = self._take()
+                if batch is not None:
+                    self._write(batch)
+
+    def _take(self):
+        with self._condition:
+            if self._dirty_since is None:
+                return None
+            batch = (self._full, self._cells)
+            self._full, self._cells = None, {}
+            self._dirty_since = self._last_submit = None
+            self.status = SAVING
+            return batch
+
+    def _write(self, batch):
+        full, cells = batch
+        try:
+            if full is not None:
+                self.store.save(full)
+            else:
+                data = {}
+                for (date, employee), shifts in cells.items():
+                    if shifts is not None:
+                        data.setdefault(date, {})[employee] = shifts
+                self.store.save(data, list(cells))
+        except Exception as e:
+            self._requeue(full, cells, e)
+            return
+        with self._condition:
+            self.error = None
+            self.status = DIRTY if self._dirty_since is not None else SAVED
+
+    def _requeue(self, full, cells, error):
+        """Put a failed batch back behind anything submitted since, to be retried."""
+        with self._condition:
+            if full is not None:
+                if self._full is None:
+                    for (date, employee), shifts in self._cells.items():
+                        _set_cell(full, date, employee, shifts)
+                    self._full, self._cells = full, {}
+            else:
+                cells.update(self._cells)
+                if self._full is None:
+                    self._cells = cells
+            now = time.monotonic()
+            self._dirty_since = self._dirty_since or now
+            self._last_submit = now + self.interval
+            self.error = error
+            self.status = FAILED
+            self._condition.notify()
+
+
+def _set_cell(data, date, employee, shifts):
+    if shifts is None:
+        data.get(date, {}).pop(employee, None)
+    else:
+        data.setdefault(date, {})[employee] = shifts
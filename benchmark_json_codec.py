@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import json_codec
+
+SHIFTS = ["7-16", "0930-1830", "10-19", "15-24", "23-8"]
+LEAVE = ["AL", "SL", "CL"]
+
+
+def synthetic_save(employees, days, seed=0):
+    """A save file's worth of data: availability plus a generated schedule."""
+    rng = random.Random(seed)
+    names = [f"Freelancer {i:04d}" for i in range(employees)]
+    dates = [(date(2025, 1, 1) + timedelta(days=d)).isoformat() for d in range(days)]
+    availability = {
+        day: {name: rng.sample(SHIFTS, rng.randint(0, 3)) if rng.random() < 0.9 else [rng.choice(LEAVE)]
+              for name in names}
+        for day in dates
+    }
+    schedule = [{"Date": day, **{name: rng.choice(SHIFTS + ["off"]) for name in names[:100]}} for day in dates]
+    return {
+        "metadata": {"id": "save_benchmark", "created_at": "2025-01-01T00:00:00", "description": "benchmark"},
+        "availability_data": availability,
+        "schedule_data": schedule,
+    }
+
+
+def best_of(runs, function):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def stdlib_write(path, obj):
+    # What every save did before json_codec
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, indent=4, ensure_ascii=False)
+
+
+def stdlib_read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON persistence before and after json_codec.")
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    data = synthetic_save(args.employees, args.days)
+    print(f"{args.employees} employees x {args.days} days, codec backend: {json_codec.BACKEND}")
+
+    cases = [("stdlib indent=4 (old)", None, stdlib_write, stdlib_read)]
+    # The stdlib fallback of json_codec is measured too when orjson is installed
+    backends = [json_codec.orjson, None] if json_codec.orjson is not None else [None]
+    for backend in backends:
+        for pretty in (False, True):
+            cases.append((f"{'orjson' if backend else 'stdlib'} {'pretty' if pretty else 'compact'}", backend,
+                          lambda path, obj, pretty=pretty: json_codec.write_json(path, obj, pretty),
+                          json_codec.read_json))
+
+    installed = json_codec.orjson
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "save.json")
+        print(f"{'format':<24}{'save s':>10}{'load s':>10}{'size MB':>10}")
+        for name, backend, write, read in cases:
+            json_codec.orjson = backend
+            save_time = best_of(args.runs, lambda: write(path, data))
+            load_time = best_of(args.runs, lambda: read(path))
+            assert read(path) == data
+            size = os.path.getsize(path) / 1e6
+            print(f"{name:<24}{save_time:>10.3f}{load_time:>10.3f}{size:>10.1f}")
+        json_codec.orjson = installed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import json_codec
+from benchmark_json_codec import best_of, synthetic_save
+from save_manager import SaveManager
+
+
+def disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare save size and load latency per compression codec.")
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--saves", type=int, default=10, help="saves in a row, one cell changed between them")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    data = synthetic_save(args.employees, args.days)
+    availability, schedule = data["availability_data"], data["schedule_data"]
+    print(f"{args.employees} employees x {args.days} days, {args.saves} saves, codec backend: {json_codec.BACKEND}")
+    print(f"{'codec':<8}{'file MB':>10}{'file load s':>13}{'save s':>10}{'saves MB':>10}{'load s':>10}")
+
+    for compression in [None] + list(json_codec.COMPRESSIONS):
+        with tempfile.TemporaryDirectory() as directory:
+            # The whole document in one file, as legacy saves and backups are
+            suffix = ".json" + (json_codec.COMPRESSIONS[compression][1] if compression else "")
+            file_path = os.path.join(directory, "save" + suffix)
+            json_codec.write_json(file_path, data, compression=compression)
+            file_size = os.path.getsize(file_path) / 1e6
+            file_load = best_of(args.runs, lambda: json_codec.read_json(file_path))
+            assert json_codec.read_json(file_path) == data
+
+            # Chunked saves through SaveManager, as the application writes them
+            manager = SaveManager(os.path.join(directory, "saves"), compression)
+            rng = random.Random(0)
+            dates, names = list(availability), list(next(iter(availability.values())))
+            start = time.perf_counter()
+            for i in range(args.saves):
+                availability[rng.choice(dates)][rng.choice(names)] = ["AL"]
+                save_id = manager.save_schedule(availability, schedule, f"benchmark {i}")
+            save_time = (time.perf_counter() - start) / args.saves
+            saves_size = disk_usage(manager.saves_directory) / 1e6
+            load_time = best_of(args.runs, lambda: manager.load_save(save_id))
+            assert manager.load_save(save_id)["availability_data"] == availability
+            manager.catalog.close()
+
+        print(f"{compression or 'none':<8}{file_size:>10.2f}{file_load:>13.3f}{save_time:>10.3f}"
+              f"{saves_size:>10.2f}{load_time:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import shutil
+
+from json_codec import compress, decompress
+
+
+class ChunkStore:
+    """
+    Immutable blobs stored once each under the SHA-256 of their content.
+
+    A chunk lives in directory/<first two hex digits>/<digest>, so putting
+    the same bytes twice writes nothing the second time. Chunks are written
+    to a temporary file and renamed, so a digest never names a partial file.
+
+    With a compression from json_codec.COMPRESSIONS, chunks are written
+    compressed; the digest is always that of the uncompressed bytes, and
+    get() reads chunks in any of the codecs.
+    """
+
+    def __init__(self, directory, compression=None):
+        self.directory = directory
+        self.compression = compression
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def put(self, data):
+        """Store data unless a chunk with its digest exists; returns the digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(compress(data, self.compression))
+            os.replace(temp_path, path)
+        return digest
+
+    def get(self, digest):
+        """The (uncompressed) bytes of a chunk; raises FileNotFoundError when it is missing."""
+        with open(self.path(digest), 'rb') as f:
+            return decompress(f.read())
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def digests(self):
+        """Digests of every stored chunk."""
+        for prefix in os.listdir(self.directory):
+            prefix_path = os.path.join(self.directory, prefix)
+            if os.path.isdir(prefix_path):
+                for name in os.listdir(prefix_path):
+                    if not name.endswith(".tmp"):
+                        yield name
+
+
+def link_or_copy(source, destination):
+    """
+    Hard-link source at destination, replacing what is there, so the data is
+    stored once; copies it where that is not possible (another file system,
+    or one without hard links). Only for files that are never modified in place.
+    """
+    temp_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copy2(source, temp_path)
+    os.replace(temp_path, destination)
@@ -0,0 +1,231 @@
+import struct
+import zipfile
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+# Column order of every table; position is an entry's index in its cell's
+# list, -1 (with shift -1) for a cell that lists nothing
+CODE_COLUMNS = ("date", "employee", "position", "shift")
+CODE_DTYPES = (np.int32, np.int32, np.int16, np.int32)
+TABLES = ("dates", "employees", "shifts")
+
+
+class EncodedTable:
+    """
+    Availability or schedule entries as integer codes into string tables.
+
+    Row i is dates[date[i]], employees[employee[i]], shifts[shift[i]] at
+    position[i] of that cell. Rows are in the order they were written, so
+    decoding gives back the same nesting and order. Loaded tables are
+    memory-mapped: nothing is read until a column is used.
+    """
+    __slots__ = ("dates", "employees", "shifts", "date", "employee", "position", "shift", "_source")
+
+    def __init__(self, dates, employees, shifts, date, employee, position, shift, source=None):
+        self.dates = dates
+        self.employees = employees
+        self.shifts = shifts
+        self.date = date
+        self.employee = employee
+        self.position = position
+        self.shift = shift
+        self._source = source  # keeps a memory map open while the columns are in use
+
+    def __len__(self):
+        return len(self.date)
+
+    def code(self, table, value):
+        """Index of value in one of the string tables, or -1 when it does not occur."""
+        matches = np.flatnonzero(np.asarray(getattr(self, table)) == value)
+        return int(matches[0]) if len(matches) else -1
+
+    def select(self, date=None, employee=None, shift=None):
+        """Bool mask over rows matching every value given."""
+        mask = np.ones(len(self), dtype=bool)
+        for column, table, value in (("date", "dates", date), ("employee", "employees", employee),
+                                     ("shift", "shifts", shift)):
+            if value is not None:
+                mask &= np.asarray(getattr(self, column)) == self.code(table, value)
+        return mask
+
+    def to_availability(self):
+        """{date: {employee: [shift, ...]}}."""
+        dates, employees, shifts = list(self.dates), list(self.employees), list(self.shifts)
+        availability = {}
+        for d, e, s in zip(np.asarray(self.date).tolist(), np.asarray(self.employee).tolist(),
+                           np.asarray(self.shift).tolist()):
+            cell = availability.setdefault(dates[d], {}).setdefault(employees[e], [])
+            if s >= 0:
+                cell.append(shifts[s])
+        return availability
+
+    def to_schedule(self):
+        """[{"Date": date, employee: shift, ...}, ...] as generate_schedule produces it."""
+        dates, employees, shifts = list(self.dates), list(self.employees), list(self.shifts)
+        rows = {}
+        for d, e, s in zip(np.asarray(self.date).tolist(), np.asarray(self.employee).tolist(),
+                           np.asarray(self.shift).tolist()):
+            row = rows.setdefault(d, {"Date": dates[d]})
+            if e >= 0:
+                row[employees[e]] = shifts[s]
+        return list(rows.values())
+
+
+def encode_availability(availability):
+    """EncodedTable of an availability dict."""
+    encoder = _Encoder()
+    for iso_date, day in availability.items():
+        for name, shifts in day.items():
+            if not shifts:
+                encoder.add(iso_date, name, -1, None)
+            for position, shift in enumerate(shifts):
+                encoder.add(iso_date, name, position, shift)
+    return encoder.table()
+
+
+def encode_schedule(rows):
+    """EncodedTable of schedule rows ({"Date": ..., employee: shift}); a row without entries keeps its date."""
+    encoder = _Encoder()
+    for row in rows:
+        entries = [(name, shift) for name, shift in row.items() if name != "Date"]
+        if not entries:
+            encoder.add(row["Date"], None, -1, None)
+        for name, shift in entries:
+            encoder.add(row["Date"], name, 0, shift)
+    return encoder.table()
+
+
+def write_table(path, table):
+    """
+    Store an EncodedTable: Arrow IPC with dictionary-encoded columns when
+    path ends in .arrow (needs pyarrow), otherwise an uncompressed .npz.
+    """
+    if str(path).endswith(".arrow"):
+        _write_arrow(path, table)
+        return
+    with open(path, 'wb') as f:
+        np.savez(f, dates=_strings(table.dates), employees=_strings(table.employees),
+                 shifts=_strings(table.shifts), date=table.date, employee=table.employee,
+                 position=table.position, shift=table.shift)
+
+
+def read_table(path):
+    """EncodedTable stored by write_table, memory-mapped rather than read."""
+    if str(path).endswith(".arrow"):
+        return _read_arrow(path)
+    arrays = _map_npz(path)
+    return EncodedTable(*(arrays[name] for name in TABLES + CODE_COLUMNS))
+
+
+def write_availability(path, availability):
+    write_table(path, encode_availability(availability))
+
+
+def read_availability(path):
+    return read_table(path).to_availability()
+
+
+def write_schedule(path, rows):
+    write_table(path, encode_schedule(rows))
+
+
+def read_schedule(path):
+    return read_table(path).to_schedule()
+
+
+class _Encoder:
+    """Collects rows, interning each string table on the way."""
+
+    def __init__(self):
+        self.indexes = ({}, {}, {})
+        self.columns = ([], [], [], [])
+
+    def add(self, date, employee, position, shift):
+        date_column, employee_column, position_column, shift_column = self.columns
+        date_column.append(self._code(0, date))
+        employee_column.append(self._code(1, employee))
+        position_column.append(position)
+        shift_column.append(self._code(2, shift))
+
+    def _code(self, table, value):
+        if value is None:
+            return -1
+        index = self.indexes[table]
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(index)
+        return code
+
+    def table(self):
+        tables = [list(index) for index in self.indexes]
+        columns = [np.array(column, dtype=dtype) for column, dtype in zip(self.columns, CODE_DTYPES)]
+        return EncodedTable(*tables, *columns)
+
+
+def _strings(values):
+    # Fixed-width unicode, so the tables load without pickle and can be mapped
+    return np.array(list(values), dtype=str) if len(values) else np.zeros(0, dtype="<U1")
+
+
+def _map_npz(path):
+    """Arrays of an uncompressed .npz as read-only memory maps, without reading their data."""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive:
+        members = archive.infolist()
+    with open(path, 'rb') as f:
+        for member in members:
+            if member.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: {member.filename} is compressed and cannot be memory-mapped")
+            # The data follows the member's local header, whose name and extra field lengths may
+            # differ from the central directory's
+            f.seek(member.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(member.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = member.filename[:-len(".npy")]
+            if 0 in shape:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+def _require_arrow():
+    if pa is None:
+        raise RuntimeError("Arrow files need pyarrow; use a .npz path instead")
+
+
+def _write_arrow(path, table):
+    _require_arrow()
+    columns = {}
+    for column, values in (("date", table.dates), ("employee", table.employees), ("shift", table.shifts)):
+        indices = pa.array(getattr(table, column), type=pa.int32(), mask=np.asarray(getattr(table, column)) < 0)
+        columns[column] = pa.DictionaryArray.from_arrays(indices, pa.array(list(values), type=pa.string()))
+    columns["position"] = pa.array(table.position, type=pa.int16())
+    arrow_table = pa.table({name: columns[name] for name in CODE_COLUMNS})
+    with pa.OSFile(str(path), 'wb') as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+
+
+def _read_arrow(path):
+    _require_arrow()
+    source = pa.memory_map(str(path), 'r')
+    arrow_table = pa.ipc.open_file(source).read_all()
+    tables, codes = {}, {}
+    for column, table_name in (("date", "dates"), ("employee", "employees"), ("shift", "shifts")):
+        array = arrow_table.column(column).combine_chunks()
+        tables[table_name] = array.dictionary.to_pylist()
+        codes[column] = array.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+    codes["position"] = arrow_table.column("position").to_numpy()
+    return EncodedTable(*(tables[name] for name in TABLES), *(codes[name] for name in CODE_COLUMNS), source=source)
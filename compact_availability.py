@@ -0,0 +1,273 @@
+from collections.abc import MutableMapping, MutableSequence
+
+import numpy as np
+
+# Leave and special codes, always the first tokens so their bits never move
+LEAVE_CODES = ("AL", "CL", "PH", "ON", "自由調配", "half off")
+
+# Cell codes with a fixed meaning; every other code indexes CompactAvailability.patterns
+ABSENT = 0  # the employee has no entry on that date
+EMPTY = 1   # the employee has an entry with nothing listed
+
+_TOKEN_BITS = 64
+
+
+class CompactAvailability(MutableMapping):
+    """
+    Availability ({iso_date: {name: [shift, ...]}}) as one small integer per cell.
+
+    Every distinct string (shift, leave code or anything else) is interned
+    once as a token, and every distinct cell list once as a pattern of
+    tokens, so a cell is a uint16 index into patterns in codes[row, column]
+    and a year of 500 employees fits in well under a megabyte. Patterns keep
+    their lists' order and repeats, so a cell reads back exactly as written.
+
+    Each pattern also has a bitmask over the first 64 tokens, the leave
+    codes being tokens 0-5, so questions such as "who listed 7-16 on each
+    date" or "who is on leave" are array lookups: see mask() and
+    leave_mask().
+
+    It behaves like the nested dict it replaces: availability[date] is a
+    day view mapping names to a list view whose edits are written back,
+    and to_dict() returns plain dicts and lists.
+    """
+
+    def __init__(self, availability=None):
+        self.tokens = list(LEAVE_CODES)
+        self.token_index = {token: t for t, token in enumerate(self.tokens)}
+        self.patterns = [None, ()]  # indexed by cell code; ABSENT has no pattern
+        self.pattern_index = {(): EMPTY}
+        self.pattern_bits = np.zeros(16, dtype=np.uint64)
+        self.names = []
+        self.name_index = {}
+        self.rows = {}  # iso date -> row of codes, in insertion order
+        self._free_rows = []
+        self.codes = np.zeros((0, 0), dtype=np.uint16)
+        if availability is not None:
+            for iso_date, day in availability.items():
+                self[iso_date] = day
+
+    # Mapping interface over dates
+
+    def __getitem__(self, iso_date):
+        if iso_date not in self.rows:
+            raise KeyError(iso_date)
+        return DayView(self, iso_date)
+
+    def __setitem__(self, iso_date, day):
+        # Intern first: day may be a view of this very row
+        cells = [(self._column(name), self.intern(shifts)) for name, shifts in day.items()]
+        row = self._row(iso_date)
+        self.codes[row] = ABSENT
+        for column, code in cells:
+            self.codes[row, column] = code
+
+    def __delitem__(self, iso_date):
+        row = self.rows.pop(iso_date)
+        self.codes[row] = ABSENT
+        self._free_rows.append(row)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, iso_date):
+        return iso_date in self.rows
+
+    # Cells
+
+    def cell(self, iso_date, name):
+        """The tuple listed by name on iso_date, or None when there is no entry."""
+        row = self.rows.get(iso_date)
+        column = self.name_index.get(name)
+        if row is None or column is None:
+            return None
+        return self.patterns[self.codes[row, column]]
+
+    def set_cell(self, iso_date, name, shifts):
+        """List shifts for name on iso_date, adding the date and name when new."""
+        code = self.intern(shifts)
+        row, column = self._row(iso_date), self._column(name)
+        self.codes[row, column] = code
+
+    def delete_cell(self, iso_date, name):
+        """Remove name's entry on iso_date; raises KeyError when there is none."""
+        row = self.rows.get(iso_date)
+        column = self.name_index.get(name)
+        if row is None or column is None or self.codes[row, column] == ABSENT:
+            raise KeyError(name)
+        self.codes[row, column] = ABSENT
+
+    def intern(self, shifts):
+        """Cell code for a list of shifts, adding its pattern and tokens when new."""
+        pattern = tuple(shifts)
+        code = self.pattern_index.get(pattern)
+        if code is not None:
+            return code
+        bits = 0
+        for token in pattern:
+            t = self.token_index.get(token)
+            if t is None:
+                t = self.token_index[token] = len(self.tokens)
+                self.tokens.append(token)
+            if t < _TOKEN_BITS:
+                bits |= 1 << t
+        code = self.pattern_index[pattern] = len(self.patterns)
+        self.patterns.append(pattern)
+        if code >= len(self.pattern_bits):
+            self.pattern_bits = np.concatenate([self.pattern_bits, np.zeros_like(self.pattern_bits)])
+        self.pattern_bits[code] = bits
+        if code > np.iinfo(self.codes.dtype).max:
+            self.codes = self.codes.astype(np.uint32)
+        return code
+
+    # Vectorised queries
+
+    def mask(self, token):
+        """Bool [date, name] over date_order() and names: True where the cell lists token."""
+        t = self.token_index.get(token)
+        rows = self._ordered_rows()
+        if t is None:
+            return np.zeros((len(rows), len(self.names)), dtype=bool)
+        if t < _TOKEN_BITS:
+            listed = (self.pattern_bits[:len(self.patterns)] >> np.uint64(t)) & np.uint64(1) == 1
+        else:
+            listed = np.array([token in pattern if pattern else False for pattern in self.patterns])
+        return listed[self.codes[rows, :len(self.names)]]
+
+    def leave_mask(self):
+        """Bool [date, name] over date_order() and names: True where any leave code is listed."""
+        leave_bits = np.uint64((1 << len(LEAVE_CODES)) - 1)
+        on_leave = self.pattern_bits[:len(self.patterns)] & leave_bits != 0
+        return on_leave[self.codes[self._ordered_rows(), :len(self.names)]]
+
+    def present_mask(self):
+        """Bool [date, name] over date_order() and names: True where there is an entry."""
+        return self.codes[self._ordered_rows(), :len(self.names)] != ABSENT
+
+    def date_order(self):
+        """Dates in the row order of the masks (insertion order)."""
+        return list(self.rows)
+
+    def to_dict(self):
+        """The availability as plain nested dicts and lists."""
+        return {iso_date: dict(DayView(self, iso_date).plain_items()) for iso_date in self.rows}
+
+    @property
+    def nbytes(self):
+        """Bytes held by the code array and the interned tables' arrays."""
+        return self.codes.nbytes + self.pattern_bits.nbytes
+
+    def _ordered_rows(self):
+        return np.fromiter(self.rows.values(), dtype=np.intp, count=len(self.rows))
+
+    def _row(self, iso_date):
+        row = self.rows.get(iso_date)
+        if row is not None:
+            return row
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = len(self.rows)
+            if row >= self.codes.shape[0]:
+                self._grow(max(16, 2 * self.codes.shape[0]), self.codes.shape[1])
+        self.rows[iso_date] = row
+        return row
+
+    def _column(self, name):
+        column = self.name_index.get(name)
+        if column is not None:
+            return column
+        column = self.name_index[name] = len(self.names)
+        self.names.append(name)
+        if column >= self.codes.shape[1]:
+            self._grow(self.codes.shape[0], max(16, 2 * self.codes.shape[1]))
+        return column
+
+    def _grow(self, row_count, column_count):
+        # Doubling keeps adding dates and names amortised O(1)
+        codes = np.zeros((row_count, column_count), dtype=self.codes.dtype)
+        codes[:self.codes.shape[0], :self.codes.shape[1]] = self.codes
+        self.codes = codes
+
+
+class DayView(MutableMapping):
+    """One date of a CompactAvailability as a {name: shifts} mapping, in name order."""
+    __slots__ = ("store", "iso_date")
+
+    def __init__(self, store, iso_date):
+        self.store = store
+        self.iso_date = iso_date
+
+    def __getitem__(self, name):
+        if self.store.cell(self.iso_date, name) is None:
+            raise KeyError(name)
+        return CellView(self.store, self.iso_date, name)
+
+    def __setitem__(self, name, shifts):
+        self.store.set_cell(self.iso_date, name, shifts)
+
+    def __delitem__(self, name):
+        self.store.delete_cell(self.iso_date, name)
+
+    def __iter__(self):
+        store = self.store
+        row = store.codes[store.rows[self.iso_date], :len(store.names)]
+        return (store.names[column] for column in np.flatnonzero(row != ABSENT))
+
+    def __len__(self):
+        store = self.store
+        return int(np.count_nonzero(store.codes[store.rows[self.iso_date], :len(store.names)]))
+
+    def plain_items(self):
+        """(name, list) pairs with plain lists."""
+        store = self.store
+        row = store.codes[store.rows[self.iso_date], :len(store.names)]
+        for column in np.flatnonzero(row != ABSENT):
+            yield store.names[column], list(store.patterns[row[column]])
+
+
+class CellView(MutableSequence):
+    """One cell of a CompactAvailability as a list; every change is written back."""
+    __slots__ = ("store", "iso_date", "name")
+
+    def __init__(self, store, iso_date, name):
+        self.store = store
+        self.iso_date = iso_date
+        self.name = name
+
+    def _items(self):
+        return self.store.cell(self.iso_date, self.name) or ()
+
+    def _write(self, items):
+        self.store.set_cell(self.iso_date, self.name, items)
+
+    def __getitem__(self, index):
+        items = self._items()[index]
+        return list(items) if isinstance(index, slice) else items
+
+    def __setitem__(self, index, value):
+        items = list(self._items())
+        items[index] = value
+        self._write(items)
+
+    def __delitem__(self, index):
+        items = list(self._items())
+        del items[index]
+        self._write(items)
+
+    def __len__(self):
+        return len(self._items())
+
+    def insert(self, index, value):
+        items = list(self._items())
+        items.insert(index, value)
+        self._write(items)
+
+    def __eq__(self, other):
+        return list(self._items()) == list(other) if isinstance(other, (list, tuple, CellView)) else NotImplemented
+
+    def __repr__(self):
+        return repr(list(self._items()))
@@ -0,0 +1,373 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+import numpy as np
+
+from shift_intervals import MINUTES_PER_DAY, parse_shift
+
+
+class Violation:
+    """One broken labour constraint; str() gives the warning text."""
+    __slots__ = ("kind", "employee", "date", "value", "limit", "hard", "message")
+
+    def __init__(self, kind, employee, date, value, limit, hard, message):
+        self.kind = kind            # constraint type, e.g. "max_consecutive_days"
+        self.employee = employee
+        self.date = date            # ISO date on which the limit was crossed
+        self.value = value
+        self.limit = limit
+        self.hard = hard
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return f"Violation({self.kind!r}, {self.employee!r}, {self.date!r}, {self.value!r}, {self.limit!r})"
+
+
+class Constraint(ABC):
+    """
+    Base of the labour constraints declared under a role's "constraints".
+
+    A constraint holds only its configuration; the running per-person state
+    of a pass lives in the object returned by new_state(), so the same
+    RuleSet can serve any number of passes. Days are fed in date order:
+
+    allowed(state, date, starts, ends): bool [person, slot] of who can take
+        slots with the given start/end minutes without breaking the limit
+    record(state, date, starts, ends): advance the state by one day, with
+        each person's start/end minute (-1 when off); returns the person
+        indices that crossed the limit that day and their values
+    fits(timeline, j, p, start, end): the same question as allowed() for an
+        arbitrary position of a filled ShiftTimeline, looking both ways
+    """
+    kind = None
+
+    def __init__(self, config):
+        self.hard = config.get("hard", True)
+        if not isinstance(self.hard, bool):
+            raise ValueError(f"{self.kind}: 'hard' must be true or false")
+
+    def copy_state(self, state):
+        return [np.copy(part) if isinstance(part, np.ndarray) else part for part in state]
+
+    def same_state(self, a, b):
+        return all(np.array_equal(x, y) if isinstance(x, np.ndarray) else x == y for x, y in zip(a, b))
+
+    @abstractmethod
+    def new_state(self, person_count):
+        """Running state of a pass over person_count people, before its first day."""
+
+    @abstractmethod
+    def allowed(self, state, date, starts, ends):
+        pass
+
+    @abstractmethod
+    def record(self, state, date, starts, ends):
+        pass
+
+    @abstractmethod
+    def fits(self, timeline, j, p, start, end):
+        pass
+
+    @abstractmethod
+    def describe(self, employee, date, value):
+        """Warning text for a Violation of this constraint."""
+
+
+def _number(config, key, kind, default=None, integer=False):
+    value = config.get(key, default)
+    valid = (int,) if integer else (int, float)
+    if value is None or isinstance(value, bool) or not isinstance(value, valid) or value < 0:
+        kind_of = "integer" if integer else "number"
+        raise ValueError(f"{kind}: '{key}' must be a non-negative {kind_of}")
+    return value
+
+
+class MaxConsecutiveDays(Constraint):
+    """No more than limit working days in a row (unscheduled dates count as off)."""
+    kind = "max_consecutive_days"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.limit = _number(config, "limit", self.kind, integer=True)
+
+    def new_state(self, person_count):
+        # streak of working days ending on last_day
+        return [np.zeros(person_count, dtype=np.int64), None]
+
+    def _streak(self, state, date):
+        streak, last_day = state
+        return streak if last_day == date.toordinal() - 1 else np.zeros_like(streak)
+
+    def allowed(self, state, date, starts, ends):
+        ok = self._streak(state, date) + 1 <= self.limit
+        return np.repeat(ok[:, None], len(starts), axis=1)
+
+    def record(self, state, date, starts, ends):
+        worked = starts >= 0
+        streak = np.where(worked, self._streak(state, date) + 1, 0)
+        state[0], state[1] = streak, date.toordinal()
+        crossed = np.flatnonzero(streak == self.limit + 1)
+        return crossed, streak[crossed]
+
+    def fits(self, timeline, j, p, start, end):
+        days = timeline.offsets // MINUTES_PER_DAY
+        run = 1
+        k = j - 1
+        while k >= 0 and days[k] == days[k + 1] - 1 and timeline.works(k, p):
+            run += 1
+            k -= 1
+        k = j + 1
+        while k < len(days) and days[k] == days[k - 1] + 1 and timeline.works(k, p):
+            run += 1
+            k += 1
+        return run <= self.limit
+
+    def describe(self, employee, date, value):
+        return f"Warning: {employee} works more than {self.limit} consecutive days (up to {date})."
+
+
+class MaxWeeklyHours(Constraint):
+    """No more than limit hours in any Monday-to-Sunday week."""
+    kind = "max_weekly_hours"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.limit = _number(config, "limit", self.kind)
+
+    def new_state(self, person_count):
+        # minutes worked so far in week
+        return [np.zeros(person_count, dtype=np.int64), None]
+
+    def _minutes(self, state, date):
+        minutes, week = state
+        return minutes if week == date.isocalendar()[:2] else np.zeros_like(minutes)
+
+    def allowed(self, state, date, starts, ends):
+        lengths = np.asarray(ends) - np.asarray(starts)
+        return self._minutes(state, date)[:, None] + lengths[None, :] <= self.limit * 60
+
+    def record(self, state, date, starts, ends):
+        before = self._minutes(state, date)
+        after = before + np.where(starts >= 0, ends - starts, 0)
+        state[0], state[1] = after, date.isocalendar()[:2]
+        limit = self.limit * 60
+        crossed = np.flatnonzero((before <= limit) & (after > limit))
+        return crossed, after[crossed] / 60
+
+    def fits(self, timeline, j, p, start, end):
+        lo, hi = timeline.week_range(j)
+        minutes = end - start
+        for k in range(lo, hi):
+            if k != j and timeline.works(k, p):
+                minutes += timeline.ends[k, p] - timeline.starts[k, p]
+        return minutes <= self.limit * 60
+
+    def describe(self, employee, date, value):
+        return f"Warning: {employee} works {value:g} hours in the week of {date} (max {self.limit:g})."
+
+
+class MaxNightsPerMonth(Constraint):
+    """No more than limit night shifts (ending after ends_after, default 22:00) per calendar month."""
+    kind = "max_nights_per_month"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.limit = _number(config, "limit", self.kind, integer=True)
+        ends_after = parse_shift(f"0-{config.get('ends_after', '22')}")
+        if ends_after is None:
+            raise ValueError(f"{self.kind}: 'ends_after' must be a time such as \"22\" or \"2130\"")
+        self.ends_after = ends_after.end
+
+    def new_state(self, person_count):
+        # nights so far in month
+        return [np.zeros(person_count, dtype=np.int64), None]
+
+    def _nights(self, state, date):
+        nights, month = state
+        return nights if month == (date.year, date.month) else np.zeros_like(nights)
+
+    def allowed(self, state, date, starts, ends):
+        night = np.asarray(ends) > self.ends_after
+        return (self._nights(state, date)[:, None] + night[None, :]) <= self.limit
+
+    def record(self, state, date, starts, ends):
+        nights = self._nights(state, date) + ((starts >= 0) & (ends > self.ends_after))
+        state[0], state[1] = nights, (date.year, date.month)
+        crossed = np.flatnonzero((nights == self.limit + 1) & (ends > self.ends_after))
+        return crossed, nights[crossed]
+
+    def fits(self, timeline, j, p, start, end):
+        if end <= self.ends_after:
+            return True
+        lo, hi = timeline.month_range(j)
+        nights = 1
+        for k in range(lo, hi):
+            if k != j and timeline.works(k, p) and timeline.ends[k, p] - timeline.offsets[k] > self.ends_after:
+                nights += 1
+        return nights <= self.limit
+
+    def describe(self, employee, date, value):
+        return f"Warning: {employee} has {value} night shifts in {date[:7]} (max {self.limit})."
+
+
+class MinDaysOff(Constraint):
+    """At least days off in every window of consecutive calendar days (default 7)."""
+    kind = "min_days_off"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.days = _number(config, "days", self.kind, integer=True)
+        self.window = _number(config, "window", self.kind, default=7, integer=True)
+        if self.days > self.window:
+            raise ValueError(f"{self.kind}: 'days' cannot exceed 'window'")
+        self.max_worked = self.window - self.days
+
+    def new_state(self, person_count):
+        # days worked within the window, the (day, worked) entries making it
+        # up, and who was already over the limit on the last recorded day
+        return [np.zeros(person_count, dtype=np.int64), deque(), np.zeros(person_count, dtype=bool)]
+
+    def copy_state(self, state):
+        return [state[0].copy(), deque(state[1]), state[2].copy()]
+
+    def same_state(self, a, b):
+        return (np.array_equal(a[0], b[0]) and np.array_equal(a[2], b[2]) and len(a[1]) == len(b[1])
+                and all(x[0] == y[0] and np.array_equal(x[1], y[1]) for x, y in zip(a[1], b[1])))
+
+    def _slide(self, state, day):
+        """Drop the entries that fall out of the window ending on day."""
+        worked, recent = state[0], state[1]
+        while recent and recent[0][0] <= day - self.window:
+            worked = worked - recent.popleft()[1]
+        state[0] = worked
+        return worked
+
+    def allowed(self, state, date, starts, ends):
+        ok = self._slide(state, date.toordinal()) + 1 <= self.max_worked
+        return np.repeat(ok[:, None], len(starts), axis=1)
+
+    def record(self, state, date, starts, ends):
+        day = date.toordinal()
+        today = (starts >= 0).astype(np.int64)
+        after = self._slide(state, day) + today
+        over = after > self.max_worked
+        # Report once per stretch of windows that are over the limit
+        crossed = np.flatnonzero(over & ~state[2])
+        state[0], state[2] = after, over
+        state[1].append((day, today))
+        return crossed, self.window - after[crossed]
+
+    def fits(self, timeline, j, p, start, end):
+        days = timeline.offsets // MINUTES_PER_DAY
+        day = days[j]
+        for window_start in range(day - self.window + 1, day + 1):
+            lo = bisect_left(days, window_start)
+            hi = bisect_right(days, window_start + self.window - 1)
+            worked = 1 + sum(1 for k in range(lo, hi) if k != j and timeline.works(k, p))
+            if worked > self.max_worked:
+                return False
+        return True
+
+    def describe(self, employee, date, value):
+        return (f"Warning: {employee} has {value} days off in the {self.window} days "
+                f"up to {date} (min {self.days}).")
+
+
+CONSTRAINT_TYPES = {cls.kind: cls for cls in (MaxConsecutiveDays, MaxWeeklyHours, MaxNightsPerMonth, MinDaysOff)}
+
+
+def compile_constraints(configs):
+    """
+    Constraint objects for a role's "constraints" list, e.g.
+    [{"type": "max_consecutive_days", "limit": 6}, {"type": "min_days_off", "days": 1, "hard": false}].
+
+    Raises ValueError for unknown types or bad settings.
+    """
+    if not isinstance(configs, list):
+        raise ValueError("constraints must be a list")
+    constraints = []
+    for config in configs:
+        if not isinstance(config, dict) or config.get("type") not in CONSTRAINT_TYPES:
+            raise ValueError(f"unknown constraint {config!r}; known types: {', '.join(CONSTRAINT_TYPES)}")
+        constraints.append(CONSTRAINT_TYPES[config["type"]](config))
+    return tuple(constraints)
+
+
+class ConstraintTracker:
+    """
+    Running state of a role's constraints over one day-by-day pass.
+
+    names are the people in column order. allowed() masks the slots hard
+    constraints forbid; record() advances every constraint by a day of
+    assignments and returns the Violations it produced.
+    """
+
+    def __init__(self, constraints, names):
+        self.constraints = constraints
+        self.names = names
+        self.states = [constraint.new_state(len(names)) for constraint in constraints]
+
+    def allowed(self, date, intervals):
+        """Bool [person, slot] for slot intervals (None entries are never restricted)."""
+        allowed = np.ones((len(self.names), len(intervals)), dtype=bool)
+        shifts = [(s, interval) for s, interval in enumerate(intervals) if interval is not None]
+        if not shifts or not self.constraints:
+            return allowed
+        columns = [s for s, _ in shifts]
+        starts = np.array([interval.start for _, interval in shifts], dtype=np.int64)
+        ends = np.array([interval.end for _, interval in shifts], dtype=np.int64)
+        for constraint, state in zip(self.constraints, self.states):
+            if constraint.hard:
+                allowed[:, columns] &= constraint.allowed(state, date, starts, ends)
+        return allowed
+
+    def record(self, date, shifts):
+        """Advance by one day given each person's shift string (or 'off'/leave)."""
+        if not self.constraints:
+            return []
+        starts = np.full(len(self.names), -1, dtype=np.int64)
+        ends = np.full(len(self.names), -1, dtype=np.int64)
+        for p, shift in enumerate(shifts):
+            interval = parse_shift(shift)
+            if interval is not None:
+                starts[p], ends[p] = interval.start, interval.end
+
+        violations = []
+        iso_date = date.strftime("%Y-%m-%d")
+        for constraint, state in zip(self.constraints, self.states):
+            crossed, values = constraint.record(state, date, starts, ends)
+            for p, value in zip(crossed.tolist(), values.tolist()):
+                violations.append(Violation(constraint.kind, self.names[p], iso_date, value, _limit(constraint),
+                                            constraint.hard, constraint.describe(self.names[p], iso_date, value)))
+        return violations
+
+    def snapshot(self):
+        return [constraint.copy_state(state) for constraint, state in zip(self.constraints, self.states)]
+
+    def restore(self, snapshot):
+        self.states = [constraint.copy_state(state) for constraint, state in zip(self.constraints, snapshot)]
+
+    def matches(self, snapshot):
+        """True when the current state equals a snapshot."""
+        return all(constraint.same_state(state, other)
+                   for constraint, state, other in zip(self.constraints, self.states, snapshot))
+
+
+def _limit(constraint):
+    return constraint.days if isinstance(constraint, MinDaysOff) else constraint.limit
+
+
+def check_constraints(constraints, names, dates, rows):
+    """
+    Violations of constraints in finished schedule rows (one {name: shift}
+    dict per date, in date order), e.g. for roles the scheduler does not assign.
+    """
+    tracker = ConstraintTracker(constraints, names)
+    violations = []
+    for date, row in zip(dates, rows):
+        violations.extend(tracker.record(date, [row.get(name, "off") for name in names]))
+    return violations
@@ -0,0 +1,145 @@
+FREELANCER_ROLE = "Freelancer"
+
+
+class EmployeeRegistry:
+    """
+    Employees in file order, indexed by name and by id.
+
+    Lookups by name or id are dict hits. The per-role lists and the
+    freelancer names are derived from the employees' primary role
+    (employee_type) and rebuilt on first use after an add, update or
+    remove, so they never go stale. version goes up on every change.
+
+    Ids are stable: they are saved with the employees, and one without an id
+    gets next_id, a number above every id the registry has held. next_id is
+    saved too, so ids of removed employees are not handed out again even
+    after a restart.
+    """
+    __slots__ = ("_employees", "_by_name", "_by_id", "_next_id", "_roles", "_freelancers",
+                 "_freelancer_set", "version")
+
+    def __init__(self, employees=(), next_id=1):
+        self._employees = []
+        self._by_name = {}
+        self._by_id = {}
+        employees = list(employees)
+        self._next_id = max(next_id, 1 + max((employee.id for employee in employees
+                                              if getattr(employee, "id", None) is not None), default=0))
+        self._roles = None
+        self._freelancers = None
+        self._freelancer_set = None
+        self.version = 0
+        for employee in employees:
+            self.add(employee)
+
+    def __iter__(self):
+        return iter(self._employees)
+
+    def __len__(self):
+        return len(self._employees)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def get(self, name, default=None):
+        """The employee called name, or default."""
+        return self._by_name.get(name, default)
+
+    def by_id(self, employee_id, default=None):
+        """The employee with employee_id, or default."""
+        return self._by_id.get(employee_id, default)
+
+    def members(self, role):
+        """Employees whose primary role is role, in registry order."""
+        return list(self._role_index().get(role, ()))
+
+    def names(self, role=None):
+        """Names of every employee, or of the members of one role, in registry order."""
+        employees = self._employees if role is None else self._role_index().get(role, ())
+        return [employee.name for employee in employees]
+
+    @property
+    def next_id(self):
+        """The id the next employee added without one gets; save it with the employees."""
+        return self._next_id
+
+    @property
+    def freelancers(self):
+        """Names of the freelancers in registry order; do not modify the list."""
+        if self._freelancers is None:
+            self._index_freelancers()
+        return self._freelancers
+
+    def is_freelancer(self, name):
+        if self._freelancer_set is None:
+            self._index_freelancers()
+        return name in self._freelancer_set
+
+    def add(self, employee):
+        """
+        Append employee, giving it an id when it has none.
+
+        Raises ValueError when its name or id is already taken.
+        """
+        if employee.name in self._by_name:
+            raise ValueError(f"Employee '{employee.name}' already exists")
+        if getattr(employee, "id", None) is None:
+            employee.id = self._next_id
+        elif employee.id in self._by_id:
+            raise ValueError(f"Employee id {employee.id} is already taken")
+        self._next_id = max(self._next_id, employee.id + 1)
+        self._employees.append(employee)
+        self._by_name[employee.name] = employee
+        self._by_id[employee.id] = employee
+        self._changed()
+        return employee
+
+    def update(self, name, /, **attributes):
+        """
+        Set attributes (e.g. name=, employee_type=) of the employee called name
+        and reindex it.
+
+        Raises KeyError when there is no such employee and ValueError when the
+        new name is taken.
+        """
+        employee = self._by_name[name]
+        new_name = attributes.get("name", name)
+        if new_name != name and new_name in self._by_name:
+            raise ValueError(f"Employee '{new_name}' already exists")
+        for attribute, value in attributes.items():
+            setattr(employee, attribute, value)
+        del self._by_name[name]
+        self._by_name[employee.name] = employee
+        self._changed()
+        return employee
+
+    def remove(self, name):
+        """Drop the employee called name and return it, or None when there is none."""
+        employee = self._by_name.pop(name, None)
+        if employee is None:
+            return None
+        self._employees.remove(employee)
+        del self._by_id[employee.id]
+        self._changed()
+        return employee
+
+    def _role_index(self):
+        if self._roles is None:
+            roles = {}
+            for employee in self._employees:
+                roles.setdefault(employee.employee_type, []).append(employee)
+            self._roles = roles
+        return self._roles
+
+    def _index_freelancers(self):
+        self._freelancers = self.names(FREELANCER_ROLE)
+        self._freelancer_set = frozenset(self._freelancers)
+
+    def _changed(self):
+        self._roles = None
+        self._freelancers = None
+        self._freelancer_set = None
+        self.version += 1
@@ -0,0 +1,237 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+
+import scheduling_logic
+from availability_tensor import compile_availability
+from scheduling_logic import (assign_freelancer_day, freelancer_day_mask, freelancer_rule_mask,
+                              freelancer_shift_columns, fulltime_entry, fulltime_violations,
+                              generate_fulltime_schedule_for_integrated, new_freelancer_timeline,
+                              new_freelancer_tracker, scheduled_names)
+
+
+class IncrementalScheduler:
+    """
+    Keeps the last generated schedule and the freelancer fairness counters
+    (shift_counts before every day) so a single availability edit only
+    reschedules the days it can affect.
+
+    After changing availability[iso_date][name], call update_cell(iso_date, name).
+    The edited day is rescheduled; the changed counters are then carried
+    forward and a later day is only rescheduled when one of the freelancers
+    whose counts changed is available that day, because nobody else's
+    tie-break can move, or when it is close enough to a day whose
+    assignments changed for the minimum rest between shifts to matter, or
+    while the constraint state it starts from differs from the last run.
+    """
+
+    def __init__(self, availability, engine="flow"):
+        self.availability = availability
+        self.engine = engine
+        self.rebuild()
+
+    @property
+    def schedule(self):
+        """Schedule rows in date order, in the get_last_generated_schedule format."""
+        return self.rows
+
+    @property
+    def warnings(self):
+        """Current warnings as generate_schedule returns them: understaffing in date order, then violations."""
+        warnings = [warning for day_warnings in self.day_warnings for warning in day_warnings]
+        return warnings + [str(violation) for violation in self.violations]
+
+    @property
+    def violations(self):
+        """Current constraint Violations, fulltime roles first, as generate_schedule reports them."""
+        by_date = {row["Date"]: row for row in self.rows}
+        freelancer = [violation for day_violations in self.day_violations for violation in day_violations]
+        return fulltime_violations(self.dates, by_date) + freelancer
+
+    def rebuild(self):
+        """Schedule every date from scratch."""
+        date_strings = sorted(self.availability.keys())
+        self.dates = [datetime.strptime(d, "%Y-%m-%d") for d in date_strings]
+        self.date_index = {d: i for i, d in enumerate(date_strings)}
+        self.freelancers = list(scheduling_logic.EMPLOYEES.freelancers)
+        self.freelancer_index = {name: i for i, name in enumerate(self.freelancers)}
+        self.fulltime_defaults = self._current_fulltime_defaults()
+
+        tensor = compile_availability(self.availability, date_strings, scheduled_names())
+        schedule_by_date = {}
+        for date in self.dates:
+            date_str = date.strftime("%d/%m/%Y")
+            schedule_by_date[date_str] = {"Date": date_str}
+        for role_type in scheduling_logic.RULES:
+            if role_type != "Freelancer":
+                generate_fulltime_schedule_for_integrated(self.availability, self.dates, schedule_by_date,
+                                                          role_type, tensor)
+        self.rows = [schedule_by_date[date.strftime("%d/%m/%Y")] for date in self.dates]
+
+        day_count, freelancer_count = len(self.dates), len(self.freelancers)
+        shape = (day_count, freelancer_count, len(freelancer_shift_columns()))
+        self.counts_before = np.zeros(shape, dtype=np.int64)
+        self.day_deltas = np.zeros(shape, dtype=np.int8)
+        self.candidates = np.zeros((day_count, freelancer_count), dtype=bool)
+        self.day_warnings = [[] for _ in self.dates]
+        self._masks = [None] * day_count
+        self._lengths = np.zeros((day_count, freelancer_count), dtype=np.int16)
+        self.timeline = new_freelancer_timeline(self.dates)
+        self.tracker = new_freelancer_tracker()
+        self.day_violations = [[] for _ in self.dates]
+        self.constraint_states = [None] * (day_count + 1)  # tracker state before each day
+
+        cols = tensor.columns(self.freelancers)
+        counts = self.counts_before[0].copy() if day_count else None
+        for j in range(day_count):
+            self._load_day(j, tensor, j, cols)
+            self.counts_before[j] = counts
+            self.constraint_states[j] = self.tracker.snapshot()
+            self.day_deltas[j] = self._run_day(j)
+            counts = counts + self.day_deltas[j]
+        self.constraint_states[day_count] = self.tracker.snapshot()
+
+    def update_cell(self, iso_date, name):
+        """
+        Reschedule after availability[iso_date][name] changed.
+
+        Returns a list of (iso_date, employee, old_shift, new_shift) for every
+        assignment that changed. Date or employee list changes trigger a full
+        rebuild, diffed against the previous schedule.
+        """
+        if self._is_stale() or iso_date not in self.date_index:
+            old_rows = {row["Date"]: row for row in self.rows}
+            self.rebuild()
+            return self._diff_rows(old_rows)
+
+        j = self.date_index[iso_date]
+        changes = []
+
+        if name in self.fulltime_defaults:
+            new_shift = fulltime_entry(self.availability[iso_date].get(name), self.fulltime_defaults[name])
+            old_shift = self.rows[j].get(name)
+            if new_shift != old_shift:
+                self.rows[j][name] = new_shift
+                changes.append((iso_date, name, old_shift, new_shift))
+
+        if name not in self.freelancer_index:
+            return changes
+
+        tensor = compile_availability(self.availability, [iso_date], self.freelancers)
+        self._load_day(j, tensor, 0, tensor.columns(self.freelancers))
+
+        carry = np.zeros(self.counts_before.shape[1:], dtype=np.int64)
+        day_count = len(self.dates)
+        rest_until = j  # last day whose rest checks may see a changed assignment
+        while j < day_count:
+            old_shifts = [self.rows[j][freelancer] for freelancer in self.freelancers]
+            self.tracker.restore(self.constraint_states[j])
+            delta = self._run_day(j)
+            constraints_changed = not self.tracker.matches(self.constraint_states[j + 1])
+            if constraints_changed:
+                self.constraint_states[j + 1] = self.tracker.snapshot()
+            carry += delta.astype(np.int64) - self.day_deltas[j]
+            self.day_deltas[j] = delta
+
+            day_iso = self.dates[j].strftime("%Y-%m-%d")
+            for freelancer, old_shift in zip(self.freelancers, old_shifts):
+                new_shift = self.rows[j][freelancer]
+                if new_shift != old_shift:
+                    changes.append((day_iso, freelancer, old_shift, new_shift))
+                    rest_until = j + self.timeline.reach
+
+            changed = np.flatnonzero(carry.any(axis=1))
+            if not changed.size and rest_until <= j and not constraints_changed:
+                break
+            # Days where none of the affected freelancers are available keep
+            # their assignments; only their incoming counters shift
+            affected = self.candidates[j + 1:, changed].any(axis=1)
+            next_j = j + 1 + int(np.argmax(affected)) if affected.any() else day_count
+            if rest_until > j or constraints_changed:
+                next_j = min(next_j, j + 1)
+            self.counts_before[j + 1:next_j + 1] += carry
+            j = next_j
+
+        return changes
+
+    def _load_day(self, j, tensor, d, cols):
+        """Take day j's freelancer availability from row d of a compiled tensor."""
+        self._masks[j] = freelancer_day_mask(self.dates[j], tensor, d, cols)
+        self._lengths[j] = tensor.lengths[d, cols]
+        self.candidates[j] = self._masks[j].any(axis=1)
+
+    def _run_day(self, j):
+        """Assign day j's freelancers from its incoming counters; returns the counter delta."""
+        counts = self.counts_before[j].copy()
+        mask = self._masks[j] & freelancer_rule_mask(self.dates[j], self.timeline, j, self.tracker)
+        assigned_shifts, self.day_warnings[j] = assign_freelancer_day(
+            self.dates[j], mask, self._lengths[j], counts, self.engine)
+        self.timeline.place_day(j, assigned_shifts)
+        self.day_violations[j] = self.tracker.record(self.dates[j], assigned_shifts)
+        self.rows[j].update(zip(self.freelancers, assigned_shifts))
+        return (counts - self.counts_before[j]).astype(np.int8)
+
+    def _current_fulltime_defaults(self):
+        """Default shift of every fulltimer the fulltime pass schedules."""
+        return {
+            emp.name: scheduling_logic.RULES.role(emp.employee_type).default_shift
+            for emp in scheduling_logic.EMPLOYEES
+            if emp.employee_type != "Freelancer" and emp.employee_type in scheduling_logic.RULES
+        }
+
+    def _is_stale(self):
+        """True when dates or employees changed since the last rebuild."""
+        return (len(self.availability) != len(self.dates)
+                or self.freelancers != scheduling_logic.EMPLOYEES.freelancers
+                or self.fulltime_defaults != self._current_fulltime_defaults())
+
+    def _diff_rows(self, old_rows):
+        """Changes between rows keyed by "Date" and the current rows."""
+        changes = []
+        for row in self.rows:
+            old_row = old_rows.get(row["Date"], {})
+            iso_date = datetime.strptime(row["Date"], "%d/%m/%Y").strftime("%Y-%m-%d")
+            for name, new_shift in row.items():
+                if name != "Date" and old_row.get(name) != new_shift:
+                    changes.append((iso_date, name, old_row.get(name), new_shift))
+        return changes
+
+
+class BackgroundBuild(threading.Thread):
+    """
+    Builds an IncrementalScheduler on a daemon thread, from a copy of
+    availability taken when the build is created so later edits cannot race
+    with it. Once done(), scheduler holds the result (or error the exception);
+    attach() points it at the live availability and replays the cells edited
+    in the meantime.
+    """
+
+    def __init__(self, availability, engine="flow"):
+        super().__init__(daemon=True)
+        self.availability = availability
+        self.snapshot = {date: {name: list(shifts) for name, shifts in day.items()}
+                         for date, day in availability.items()}
+        self.engine = engine
+        self.scheduler = None
+        self.error = None
+        self.edited = []
+
+    def run(self):
+        try:
+            self.scheduler = IncrementalScheduler(self.snapshot, self.engine)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.snapshot = None
+
+    def done(self):
+        return self.ident is not None and not self.is_alive()
+
+    def attach(self):
+        """The built scheduler, following self.availability with the edits made since the copy."""
+        scheduler = self.scheduler
+        scheduler.availability = self.availability
+        for iso_date, name in self.edited:
+            scheduler.update_cell(iso_date, name)
+        return scheduler
@@ -0,0 +1,134 @@
+import bz2
+import gzip
+import json
+import lzma
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Every persisted JSON file goes through here: orjson when it is installed,
+# the standard library otherwise, both writing compact UTF-8 the other reads
+BACKEND = "orjson" if orjson is not None else "json"
+
+# Compact output by default; encode/write_json can ask for indentation per call
+PRETTY = False
+
+# Codecs write_json can compress with: name -> (module, file suffix, options).
+# gzip at level 6 is nearly as small as 9 and much faster to write
+COMPRESSIONS = {
+    "gzip": (gzip, ".gz", {"compresslevel": 6}),
+    "lzma": (lzma, ".xz", {}),
+    "bz2": (bz2, ".bz2", {}),
+}
+
+# Compressed data is recognised by its first bytes, whatever the file is called
+_MAGIC = ((b"\x1f\x8b", gzip), (b"\xfd7zXZ\x00", lzma), (b"BZh", bz2))
+
+
+def encode(obj, pretty=None):
+    """obj as UTF-8 JSON bytes, indented by two spaces when pretty."""
+    if pretty is None:
+        pretty = PRETTY
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    if pretty:
+        text = json.dumps(obj, indent=2, ensure_ascii=False)
+    else:
+        text = json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+    return text.encode('utf-8')
+
+
+def decode(data):
+    """The object in JSON bytes or text; raises ValueError when it is not valid JSON."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return json.loads(data)
+
+
+def iterencode(obj, depth=2):
+    """
+    obj as compact JSON bytes in pieces: dicts and lists down to depth are
+    taken apart, so the pieces are one entry of a nested value each rather
+    than the whole document.
+    """
+    if depth > 0 and isinstance(obj, dict) and all(isinstance(key, str) for key in obj):
+        yield b"{"
+        for i, (key, value) in enumerate(obj.items()):
+            yield (b"," if i else b"") + encode(key, False) + b":"
+            yield from iterencode(value, depth - 1)
+        yield b"}"
+    elif depth > 0 and isinstance(obj, list):
+        yield b"["
+        for i, value in enumerate(obj):
+            if i:
+                yield b","
+            yield from iterencode(value, depth - 1)
+        yield b"]"
+    else:
+        yield encode(obj, False)
+
+
+def compression_module(compression):
+    """(module, file suffix, options) of a codec in COMPRESSIONS; raises ValueError for others."""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    return COMPRESSIONS[compression]
+
+
+def compress(data, compression=None):
+    """data compressed with a codec in COMPRESSIONS, or unchanged for None."""
+    if compression is None:
+        return data
+    module, _, options = compression_module(compression)
+    return module.compress(data, **options)
+
+
+def decompress(data):
+    """data decompressed according to its magic bytes; anything else is returned unchanged."""
+    for magic, module in _MAGIC:
+        if data[:len(magic)] == magic:
+            return module.decompress(data)
+    return data
+
+
+def read_json(path):
+    """
+    The object stored in a JSON file, compressed or not. A compressed file
+    is decompressed in memory as a whole and then decoded in one call, which
+    is faster than decoding piece by piece; at the peak both the
+    decompressed bytes and the decoded object are held.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(6)
+        for magic, module in _MAGIC:
+            if head.startswith(magic):
+                f.seek(0)
+                with module.open(f, 'rb') as stream:
+                    return decode(stream.read())
+        return decode(head + f.read())
+
+
+def write_json(path, obj, pretty=None, compression=None):
+    """
+    Store obj in a JSON file, replacing its contents. With a compression
+    from COMPRESSIONS the document is encoded piece by piece straight into
+    the compressor, never held in memory as a whole.
+    """
+    if compression is None:
+        with open(path, 'wb') as f:
+            f.write(encode(obj, pretty))
+        return
+    module, _, options = compression_module(compression)
+    with module.open(path, 'wb', **options) as f:
+        if pretty if pretty is not None else PRETTY:
+            f.write(encode(obj, True))
+        else:
+            for piece in iterencode(obj):
+                f.write(piece)
@@ -0,0 +1,234 @@
+import math
+import random
+import time
+
+import numpy as np
+
+
+class AssignmentState:
+    """
+    Freelancer assignments over a horizon with O(1) move evaluation.
+
+    The cost being minimised is
+        understaffed_weight * missing headcount
+        + sum over people of (total shifts)^2
+        + sum over people and shift types of (shifts of that type)^2
+    Squares of counts are what make spreading work evenly pay off; the
+    understaffing weight is large enough that coverage always comes first.
+    Counters are kept up to date so every delta_* method only looks at the
+    handful of counts the move touches.
+
+    With a timeline (a shift_intervals.ShiftTimeline over the same days and
+    people) and the interval of every slot, it also tracks who works when so
+    fits() can reject moves that break the minimum rest between shifts or
+    any of the given hard constraints.
+    """
+
+    def __init__(self, slots, requirements, masks, slot_columns, column_count, understaffed_weight=None,
+                 timeline=None, slot_intervals=None, constraints=()):
+        self.slots = slots
+        self.requirements = requirements
+        self.masks = masks
+        self.slot_columns = slot_columns
+        self.timeline = timeline
+        self.slot_intervals = slot_intervals
+        self.constraints = constraints
+        day_count, person_count = slots.shape
+
+        self.filled = [np.zeros(len(day_requirements), dtype=np.int64) for day_requirements in requirements]
+        self.members = [[[] for _ in day_requirements] for day_requirements in requirements]
+        self.totals = np.zeros(person_count, dtype=np.int64)
+        self.type_counts = np.zeros((person_count, column_count), dtype=np.int64)
+        for j in range(day_count):
+            for p in np.flatnonzero(slots[j] >= 0).tolist():
+                s = slots[j, p]
+                self.filled[j][s] += 1
+                self.members[j][s].append(p)
+                self.totals[p] += 1
+                self.type_counts[p, slot_columns[j][s]] += 1
+                self._mark(j, s, p)
+
+        # One more shift can never raise the fairness terms by more than this
+        self.understaffed_weight = understaffed_weight or 4 * (day_count + 1)
+        self.available = [[np.flatnonzero(mask[:, s]) for s in range(mask.shape[1])] for mask in masks]
+
+    def fits(self, j, s, p):
+        """True when person p can work slot s on day j next to their shifts on other days."""
+        if self.timeline is None or self.slot_intervals[j][s] is None:
+            return True
+        interval = self.slot_intervals[j][s]
+        if not self.timeline.fits(j, p, interval):
+            return False
+        return all(constraint.fits(self.timeline, j, p, interval.start, interval.end)
+                   for constraint in self.constraints)
+
+    def _mark(self, j, s, p):
+        if self.timeline is not None:
+            if s < 0 or self.slot_intervals[j][s] is None:
+                self.timeline.clear(j, p)
+            else:
+                self.timeline.place(j, p, self.slot_intervals[j][s])
+
+    def missing(self, j, s):
+        return max(0, self.requirements[j][s] - int(self.filled[j][s]))
+
+    def _gain(self, p, column):
+        """Cost of giving person p one more shift of the given type."""
+        return 2 * int(self.totals[p]) + 1 + 2 * int(self.type_counts[p, column]) + 1
+
+    def _loss(self, p, column):
+        """Cost change of taking one shift of the given type away from person p."""
+        return -2 * int(self.totals[p]) + 1 - 2 * int(self.type_counts[p, column]) + 1
+
+    def _coverage(self, j, s, change):
+        """Understaffing cost change when slot s on day j gains change people."""
+        before = self.missing(j, s)
+        after = max(0, self.requirements[j][s] - int(self.filled[j][s]) - change)
+        return self.understaffed_weight * (after - before)
+
+    def delta_fill(self, j, s, p):
+        """Free person p takes slot s on day j."""
+        return self._coverage(j, s, 1) + self._gain(p, self.slot_columns[j][s])
+
+    def delta_transfer(self, j, s, old, new):
+        """Free person new replaces old in slot s on day j."""
+        column = self.slot_columns[j][s]
+        # Counts of two different people, so the two terms are independent
+        return self._loss(old, column) + self._gain(new, column)
+
+    def delta_reslot(self, j, p, target):
+        """Person p moves from their slot on day j to slot target."""
+        source = self.slots[j, p]
+        source_column = self.slot_columns[j][source]
+        target_column = self.slot_columns[j][target]
+        coverage = self._coverage(j, source, -1) + self._coverage(j, target, 1)
+        if source_column == target_column:
+            return coverage
+        counts = self.type_counts[p]
+        return coverage + (2 * int(counts[target_column]) + 1) - (2 * int(counts[source_column]) - 1)
+
+    def apply_fill(self, j, s, p):
+        self._place(j, s, p)
+
+    def apply_transfer(self, j, s, old, new):
+        self._remove(j, old)
+        self._place(j, s, new)
+
+    def apply_reslot(self, j, p, target):
+        self._remove(j, p)
+        self._place(j, target, p)
+
+    def apply_clear(self, j, p):
+        """Undo of apply_fill."""
+        self._remove(j, p)
+
+    def _place(self, j, s, p):
+        self.slots[j, p] = s
+        self.filled[j][s] += 1
+        self.members[j][s].append(p)
+        self.totals[p] += 1
+        self.type_counts[p, self.slot_columns[j][s]] += 1
+        self._mark(j, s, p)
+
+    def _remove(self, j, p):
+        s = self.slots[j, p]
+        self.slots[j, p] = -1
+        self.filled[j][s] -= 1
+        self.members[j][s].remove(p)
+        self.totals[p] -= 1
+        self.type_counts[p, self.slot_columns[j][s]] -= 1
+        self._mark(j, -1, p)
+
+
+def improve_assignment(slots, requirements, masks, slot_columns, column_count, time_budget, seed=None,
+                       timeline=None, slot_intervals=None, constraints=()):
+    """
+    Simulated annealing over freelancer assignments within a wall-clock budget.
+
+    Parameters:
+    slots (ndarray): int [day, person] starting slot index, -1 when off
+    requirements (list): per day, required headcount per slot
+    masks (list): per day, bool [person, slot] availability
+    slot_columns (list): per day, shift type column of each slot
+    column_count (int): number of shift type columns
+    time_budget (float): seconds to spend searching
+    seed: random seed for reproducible runs
+    timeline (ShiftTimeline): optional, empty timeline over the same days and
+                              people; moves breaking its minimum rest are skipped
+    slot_intervals (list): per day, ShiftInterval of each slot (with timeline)
+    constraints (tuple): hard constraints.Constraint objects moves must keep (with timeline)
+
+    Moves are: fill an understaffed slot with a free available person, hand
+    a filled slot to a free available person, or move a person to another
+    slot on the same day. The best assignment seen is returned (never worse
+    than the input).
+    """
+    rng = random.Random(seed)
+    state = AssignmentState(slots.copy(), requirements, masks, slot_columns, column_count,
+                            timeline=timeline, slot_intervals=slot_intervals, constraints=constraints)
+    day_count = slots.shape[0]
+    if day_count == 0 or time_budget <= 0:
+        return state.slots
+
+    current = best = 0
+    # Inverses of the moves made since the best state, so the search can
+    # return to it at the end without copying the assignment on every gain
+    undo = []
+    start = time.monotonic()
+    deadline = start + time_budget
+    temperature = start_temperature = 2.0
+    iteration = 0
+
+    while True:
+        iteration += 1
+        if iteration % 256 == 0:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            # Cool linearly towards pure descent as the budget runs out
+            temperature = start_temperature * (deadline - now) / time_budget
+
+        j = rng.randrange(day_count)
+        slot_count = len(requirements[j])
+        if not slot_count:
+            continue
+        s = rng.randrange(slot_count)
+        candidates = state.available[j][s]
+        if not len(candidates):
+            continue
+        p = int(candidates[rng.randrange(len(candidates))])
+        current_slot = state.slots[j, p]
+
+        if current_slot == s or not state.fits(j, s, p):
+            continue
+        if current_slot >= 0:
+            move, inverse = (state.apply_reslot, j, p, s), (state.apply_reslot, j, p, current_slot)
+            delta = state.delta_reslot(j, p, s)
+        elif state.filled[j][s] < requirements[j][s]:
+            move, inverse = (state.apply_fill, j, s, p), (state.apply_clear, j, p)
+            delta = state.delta_fill(j, s, p)
+        elif state.members[j][s]:
+            old = state.members[j][s][rng.randrange(len(state.members[j][s]))]
+            move, inverse = (state.apply_transfer, j, s, old, p), (state.apply_transfer, j, s, p, old)
+            delta = state.delta_transfer(j, s, old, p)
+        else:
+            continue
+
+        if delta <= 0 or (temperature > 0 and rng.random() < math.exp(-delta / temperature)):
+            move[0](*move[1:])
+            current += delta
+            if current <= best:
+                best = current
+                undo.clear()
+            else:
+                undo.append(inverse)
+                if len(undo) > 100000:
+                    # Wandered too far uphill: go back to the best state
+                    for step in reversed(undo):
+                        step[0](*step[1:])
+                    undo.clear()
+                    current = best
+
+    for inverse in reversed(undo):
+        inverse[0](*inverse[1:])
+    return state.slots
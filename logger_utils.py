@@ -1,7 +1,7 @@
 from logging import basicConfig, critical, error, info, INFO
 from json import dumps
 from os import path, makedirs, listdir, walk
-from shutil import copy, rmtree
+from shutil import copy, copytree, rmtree
 from zipfile import ZipFile
 from datetime import datetime
 import sys
@@ -10,6 +10,15 @@ from traceback import format_exception
 # Import for global exception handling
 import sys
 import traceback
+# Called by the global exception hook before the exception is reported,
+# e.g. to write pending saves while the application is still alive
+crash_handlers = []
+
+def add_crash_handler(handler):
+    """Run handler() whenever an unhandled exception reaches the global exception hook"""
+    if handler not in crash_handlers:
+        crash_handlers.append(handler)
+
 def setup_global_exception_handler():
     """Set up a global exception hook to catch and log unhandled exceptions"""
     original_hook = sys.excepthook
@@ -19,6 +28,12 @@ def setup_global_exception_handler():
         error_msg = ''.join(traceback.format_exception(exc_type, exc_value, exc_traceback))
         critical(f"Unhandled exception: {error_msg}")
         
+        for handler in crash_handlers:
+            try:
+                handler()
+            except Exception as e:
+                critical(f"Crash handler failed: {str(e)}")
+        
         # Call the original exception hook
         original_hook(exc_type, exc_value, exc_traceback)
     
@@ -60,7 +75,7 @@ def log_info(message):
     info(message)
 
 def create_data_package():
-    """Create a zip file containing all JSON data files for debugging"""
+    """Create a zip file containing all JSON data files and databases for debugging"""
     try:
         # Create timestamp for unique filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -71,11 +86,15 @@ def create_data_package():
         if not path.exists(package_dir):
             makedirs(package_dir)
         
-        # Copy all JSON files to the package directory
-        json_files = [f for f in listdir() if f.endswith('.json')]
+        # Copy all JSON files and the availability database or journal to the package directory
+        json_files = [f for f in listdir() if f.endswith(('.json', '.db', '.journal'))]
         for file in json_files:
             copy(file, package_dir)
         
+        # Saves go in as stored (compressed manifests, chunks and the catalog), without re-encoding
+        if path.exists("saves"):
+            copytree("saves", path.join(package_dir, "saves"))
+        
         # Add the latest log file if it exists
         log_dir = "logs"
         if path.exists(log_dir):
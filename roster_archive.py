@@ -0,0 +1,215 @@
+import mmap
+import os
+import struct
+from datetime import date, datetime
+
+import numpy as np
+
+MAGIC = b"RARC"
+VERSION = 1
+
+# Header: magic, version, record size, date count, string count, record count,
+# then the offsets of the string table, the date index and the records
+_HEADER = struct.Struct("<4sHHIIIQQQ")
+
+# What a record describes
+AVAILABILITY = 0  # one listed entry of a cell; position -1 and no shift for a cell listing nothing
+SCHEDULE = 1      # the shift (or "off") an employee was scheduled for
+
+RECORD = np.dtype([("employee", "<u4"), ("shift", "<i4"), ("kind", "u1"), ("position", "i1"), ("pad", "<u2")])
+INDEX = np.dtype([("day", "<i4"), ("first", "<u4"), ("count", "<u4")])
+
+
+class RosterArchive:
+    """
+    Read-only view of a roster archive file through mmap.
+
+    The file holds fixed-size records (employee, shift, kind, position)
+    sorted by date and a date index of (day ordinal, first record, count),
+    so a date's records are found by binary search and read in place:
+    nothing is deserialised beyond the strings a query returns.
+    Employees and shifts are codes into one string table.
+
+    Use as a context manager, or call close(), to release the mapping;
+    arrays returned by records_for() have to be dropped first.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, record_size, date_count, string_count, record_count,
+         strings_offset, index_offset, records_offset) = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.itemsize:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a roster archive this version can read")
+        self._string_offsets = np.frombuffer(self._mmap, dtype="<u8", count=string_count + 1, offset=strings_offset)
+        self._strings_start = strings_offset + self._string_offsets.nbytes
+        self.index = np.frombuffer(self._mmap, dtype=INDEX, count=date_count, offset=index_offset)
+        self.records = np.frombuffer(self._mmap, dtype=RECORD, count=record_count, offset=records_offset)
+        self._codes = None
+
+    def close(self):
+        # The arrays borrow the mapping, so they have to go first
+        self.index = self.records = self._string_offsets = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def string(self, code):
+        """Employee name or shift string stored under code."""
+        start = self._strings_start + int(self._string_offsets[code])
+        end = self._strings_start + int(self._string_offsets[code + 1])
+        return self._mmap[start:end].decode('utf-8')
+
+    def code(self, value):
+        """Code of an employee name or shift string, or -1 when the archive does not contain it."""
+        if self._codes is None:
+            self._codes = {self.string(code): code for code in range(len(self._string_offsets) - 1)}
+        return self._codes.get(value, -1)
+
+    def dates(self):
+        """ISO dates in the archive, in order."""
+        return [date.fromordinal(int(day)).isoformat() for day in self.index["day"]]
+
+    def __contains__(self, iso_date):
+        return self._position(iso_date) is not None
+
+    def records_for(self, iso_date, kind=None):
+        """The date's records (a view into the file), optionally only those of one kind."""
+        position = self._position(iso_date)
+        if position is None:
+            return self.records[:0]
+        entry = self.index[position]
+        records = self.records[int(entry["first"]):int(entry["first"]) + int(entry["count"])]
+        return records if kind is None else records[records["kind"] == kind]
+
+    def availability(self, iso_date):
+        """{name: [shift, ...]} archived for iso_date, empty when there is none."""
+        day = {}
+        for employee, shift in self.records_for(iso_date, AVAILABILITY)[["employee", "shift"]].tolist():
+            cell = day.setdefault(self.string(employee), [])
+            if shift >= 0:
+                cell.append(self.string(shift))
+        return day
+
+    def schedule_row(self, iso_date):
+        """The schedule row ({"Date": dd/mm/YYYY, name: shift}) archived for iso_date, or None."""
+        records = self.records_for(iso_date, SCHEDULE)
+        if not len(records):
+            return None
+        row = {"Date": datetime.strptime(iso_date, "%Y-%m-%d").strftime("%d/%m/%Y")}
+        for employee, shift in records[["employee", "shift"]].tolist():
+            row[self.string(employee)] = self.string(shift)
+        return row
+
+    def who(self, iso_date, shift, kind=SCHEDULE):
+        """Names with shift on iso_date: scheduled for it, or listing it with kind=AVAILABILITY."""
+        code = self.code(shift)
+        if code < 0:
+            return []
+        records = self.records_for(iso_date, kind)
+        return [self.string(employee) for employee in records["employee"][records["shift"] == code].tolist()]
+
+    def to_dicts(self):
+        """(availability, schedule rows) of the whole archive, for rewriting it."""
+        availability = {}
+        schedule = []
+        for iso_date in self.dates():
+            day = self.availability(iso_date)
+            if day:
+                availability[iso_date] = day
+            row = self.schedule_row(iso_date)
+            if row is not None:
+                schedule.append(row)
+        return availability, schedule
+
+    def _position(self, iso_date):
+        day = date.fromisoformat(iso_date).toordinal()
+        position = int(np.searchsorted(self.index["day"], day))
+        if position < len(self.index) and self.index[position]["day"] == day:
+            return position
+        return None
+
+
+def write_archive(path, availability=None, schedule=None):
+    """
+    Write availability ({iso_date: {name: [shift, ...]}}) and schedule rows
+    ({"Date": dd/mm/YYYY, name: shift}) as a roster archive, replacing path
+    atomically.
+    """
+    by_day = {}
+    for iso_date, day in (availability or {}).items():
+        entries = by_day.setdefault(date.fromisoformat(iso_date).toordinal(), ([], []))[0]
+        for name, shifts in day.items():
+            if not shifts:
+                entries.append((name, None, -1))
+            entries.extend((name, shift, position) for position, shift in enumerate(shifts))
+    for row in schedule or []:
+        day = datetime.strptime(row["Date"], "%d/%m/%Y").toordinal()
+        entries = by_day.setdefault(day, ([], []))[1]
+        entries.extend((name, shift, 0) for name, shift in row.items() if name != "Date")
+
+    string_codes = {}
+    def intern(value):
+        code = string_codes.get(value)
+        if code is None:
+            code = string_codes[value] = len(string_codes)
+        return code
+
+    days = sorted(by_day)
+    index = np.zeros(len(days), dtype=INDEX)
+    rows = []
+    for i, day in enumerate(days):
+        index[i] = (day, len(rows), 0)
+        for kind, entries in enumerate(by_day[day]):
+            for name, shift, position in entries:
+                rows.append((intern(name), -1 if shift is None else intern(shift), kind, position, 0))
+        index["count"][i] = len(rows) - index["first"][i]
+    records = np.array(rows, dtype=RECORD)
+
+    encoded = [value.encode('utf-8') for value in string_codes]
+    string_offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(value) for value in encoded], out=string_offsets[1:])
+    strings_offset = _align(_HEADER.size)
+    index_offset = _align(strings_offset + string_offsets.nbytes + int(string_offsets[-1]))
+    records_offset = _align(index_offset + index.nbytes)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, RECORD.itemsize, len(days), len(encoded), len(records),
+                             strings_offset, index_offset, records_offset))
+        f.write(b"\0" * (strings_offset - f.tell()))
+        f.write(string_offsets.tobytes())
+        f.write(b"".join(encoded))
+        f.write(b"\0" * (index_offset - f.tell()))
+        f.write(index.tobytes())
+        f.write(b"\0" * (records_offset - f.tell()))
+        f.write(records.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def merge_archive(path, availability=None, schedule=None):
+    """
+    Add availability and schedule rows to the archive at path, creating it
+    when missing. A date given here replaces what the archive held for that
+    date of the same kind.
+    """
+    archived, archived_schedule = {}, []
+    if os.path.exists(path):
+        with RosterArchive(path) as archive:
+            archived, archived_schedule = archive.to_dicts()
+    archived.update(availability or {})
+    rows = {row["Date"]: row for row in archived_schedule}
+    rows.update((row["Date"], row) for row in schedule or [])
+    write_archive(path, archived, list(rows.values()))
+
+
+def _align(offset, alignment=8):
+    return -(-offset // alignment) * alignment
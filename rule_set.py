@@ -0,0 +1,163 @@
+from constraints import compile_constraints
+from shift_intervals import parse_shift
+
+DAY_TYPES = ("weekday", "weekend")
+RULE_TYPES = ("shift_based", "fixed_time")
+
+
+def day_type_of(date):
+    """'weekend' for Saturday and Sunday, 'weekday' otherwise."""
+    return "weekend" if date.weekday() >= 5 else "weekday"
+
+
+class DayRule:
+    """Shifts of a shift_based role for one day type, in filling priority order."""
+    __slots__ = ("names", "times", "intervals", "shift_ids", "requirements", "columns")
+
+    def __init__(self, names, times, shift_ids, requirements):
+        self.names = names                # tuple of shift names, e.g. ("night", "early", "day")
+        self.times = times                # tuple of shift strings, e.g. ("15-24", "7-16", "0930-1830")
+        self.intervals = tuple(parse_shift(t) for t in times)
+        self.shift_ids = shift_ids        # tuple of RuleSet shift ids for times
+        self.requirements = requirements  # tuple of required headcounts
+        self.columns = ()                 # RoleRule.shift_columns index of each name
+
+
+class RoleRule:
+    """One compiled entry of ROLE_RULES."""
+    __slots__ = ("name", "rule_type", "default_shift", "min_rest", "constraints", "days", "shift_columns",
+                 "all_times")
+
+    def __init__(self, name, rule_type, default_shift, min_rest, constraints, days, all_times):
+        self.name = name
+        self.rule_type = rule_type
+        self.default_shift = default_shift
+        self.min_rest = min_rest          # minutes required between two shifts of one person
+        self.constraints = constraints    # tuple of constraints.Constraint
+        self.days = days                  # day type -> DayRule, empty for fixed_time roles
+        self.all_times = all_times        # every shift string of the role, weekday ones first
+        # Every shift name of the role, sorted, mapped to a counter column
+        shift_names = sorted({name for day in days.values() for name in day.names})
+        self.shift_columns = {name: i for i, name in enumerate(shift_names)}
+        for day in days.values():
+            day.columns = tuple(self.shift_columns[name] for name in day.names)
+
+    def day(self, date):
+        """DayRule for the date's day type."""
+        return self.days[day_type_of(date)]
+
+
+class RuleSet:
+    """
+    ROLE_RULES validated and compiled once for the scheduling hot paths.
+
+    Shift strings are interned to integer ids shared by every role.
+    """
+    __slots__ = ("roles", "shift_strings", "shift_ids")
+
+    def __init__(self):
+        self.roles = {}
+        self.shift_strings = []
+        self.shift_ids = {}
+
+    def __contains__(self, role_name):
+        return role_name in self.roles
+
+    def __iter__(self):
+        return iter(self.roles)
+
+    def get(self, role_name):
+        return self.roles.get(role_name)
+
+    def role(self, role_name):
+        return self.roles[role_name]
+
+    def shift_id(self, shift):
+        """Integer id of a shift string, interning it on first use."""
+        shift_id = self.shift_ids.get(shift)
+        if shift_id is None:
+            shift_id = self.shift_ids[shift] = len(self.shift_strings)
+            self.shift_strings.append(shift)
+        return shift_id
+
+
+def compile_rules(role_rules, errors=None):
+    """
+    Validate raw ROLE_RULES and build a RuleSet.
+
+    Raises ValueError describing the first problem found. When an errors
+    list is given, invalid roles are left out of the RuleSet instead and a
+    message for each is appended to it.
+    """
+    rule_set = RuleSet()
+    for role_name, rule in role_rules.items():
+        try:
+            rule_set.roles[role_name] = _compile_role(rule_set, role_name, rule)
+        except ValueError as e:
+            if errors is None:
+                raise
+            errors.append(str(e))
+    return rule_set
+
+
+def _compile_role(rule_set, role_name, rule):
+    """RoleRule for one entry of ROLE_RULES."""
+    if not isinstance(rule, dict):
+        raise ValueError(f"Role '{role_name}': rule must be an object")
+    rule_type = rule.get("rule_type")
+    if rule_type not in RULE_TYPES:
+        raise ValueError(f"Role '{role_name}': unknown rule_type {rule_type!r}")
+
+    default_shift = rule.get("default_shift")
+    days = {}
+    if rule_type == "fixed_time":
+        if not default_shift:
+            raise ValueError(f"Role '{role_name}': fixed_time roles need a default_shift")
+        if parse_shift(default_shift) is None:
+            raise ValueError(f"Role '{role_name}': default_shift '{default_shift}' is not a valid shift time")
+    else:
+        for day_type in DAY_TYPES:
+            days[day_type] = _compile_day(rule_set, role_name, rule, day_type)
+
+    min_rest_hours = rule.get("min_rest_hours", 0)
+    if isinstance(min_rest_hours, bool) or not isinstance(min_rest_hours, (int, float)) or min_rest_hours < 0:
+        raise ValueError(f"Role '{role_name}': min_rest_hours must be a non-negative number")
+
+    try:
+        constraints = compile_constraints(rule.get("constraints", []))
+    except ValueError as e:
+        raise ValueError(f"Role '{role_name}': {e}") from None
+
+    all_times = []
+    for day_type in DAY_TYPES:
+        if day_type in days:
+            all_times.extend(t for t in rule["shifts"][day_type].values() if t not in all_times)
+    if default_shift:
+        rule_set.shift_id(default_shift)
+
+    return RoleRule(role_name, rule_type, default_shift, round(min_rest_hours * 60),
+                    constraints, days, tuple(all_times))
+
+
+def _compile_day(rule_set, role_name, rule, day_type):
+    """DayRule for one day type of a shift_based role."""
+    shifts = rule.get("shifts", {}).get(day_type)
+    requirements = rule.get("requirements", {}).get(day_type)
+    if not isinstance(shifts, dict) or not isinstance(requirements, dict):
+        raise ValueError(f"Role '{role_name}': shift_based roles need {day_type} shifts and requirements")
+
+    for shift_name, required in requirements.items():
+        if shift_name not in shifts:
+            raise ValueError(f"Role '{role_name}': {day_type} requirement for unknown shift '{shift_name}'")
+        if not isinstance(required, int) or isinstance(required, bool) or required < 0:
+            raise ValueError(f"Role '{role_name}': {day_type} requirement for '{shift_name}' "
+                             f"must be a non-negative integer")
+    for shift_name, shift in shifts.items():
+        if parse_shift(shift) is None:
+            raise ValueError(f"Role '{role_name}': {day_type} shift '{shift_name}' is not a valid shift time")
+
+    # Shifts needing the most people are filled first (stable for ties)
+    names = tuple(name for name, _ in sorted(requirements.items(), key=lambda x: x[1], reverse=True))
+    times = tuple(shifts[name] for name in names)
+    return DayRule(names, times, tuple(rule_set.shift_id(t) for t in times),
+                   tuple(requirements[name] for name in names))
@@ -0,0 +1,156 @@
+import os
+import sqlite3
+
+from json_codec import decode, encode
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS saves (
+    id TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    start_date TEXT,
+    end_date TEXT,
+    metadata BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS saves_by_created_at ON saves (created_at);
+CREATE INDEX IF NOT EXISTS saves_by_period ON saves (start_date, end_date);
+CREATE TABLE IF NOT EXISTS chunk_refs (
+    save_id TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (save_id, digest)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chunk_refs_by_digest ON chunk_refs (digest);
+"""
+
+
+class SaveCatalog:
+    """
+    Metadata of every save in an SQLite file next to the saves, so listing
+    them is one indexed query instead of parsing each save file.
+
+    A row holds the save's file name, the columns listing sorts and filters
+    on, and the complete metadata block; chunk_refs lists the chunks each
+    save is made of, so the chunks a deletion frees are found by index.
+    record() and forget() take an
+    action to run inside their transaction (writing or removing the file),
+    so a row is only committed when the file change succeeded.
+    reconcile() brings the catalog in line with the directory: rows whose
+    file is gone are dropped and files without a row are read and added,
+    which also rebuilds a missing catalog.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, metadata, file_name, write=None, chunks=()):
+        """
+        Add or replace the row of a save and the chunk digests it refers to;
+        write() is called before the row is committed.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM chunk_refs WHERE save_id = ?", (metadata["id"],))
+            self.connection.executemany("INSERT OR IGNORE INTO chunk_refs (save_id, digest) VALUES (?, ?)",
+                                        [(metadata["id"], digest) for digest in chunks])
+            self.connection.execute(
+                "INSERT OR REPLACE INTO saves (id, file, created_at, description, start_date, end_date, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (metadata["id"], file_name, metadata.get("created_at") or "", metadata.get("description") or "",
+                 metadata.get("start_date"), metadata.get("end_date"), encode(metadata)))
+            if write is not None:
+                write()
+
+    def forget(self, save_id, remove=None):
+        """
+        Drop the row of a save, if any; remove() is called before that is
+        committed. Returns the digests no other save refers to any more.
+        """
+        with self.connection:
+            digests = [digest for (digest,) in self.connection.execute(
+                "SELECT digest FROM chunk_refs WHERE save_id = ?", (save_id,))]
+            self.connection.execute("DELETE FROM chunk_refs WHERE save_id = ?", (save_id,))
+            self.connection.execute("DELETE FROM saves WHERE id = ?", (save_id,))
+            if remove is not None:
+                remove()
+        return [digest for digest in digests if not self.connection.execute(
+            "SELECT 1 FROM chunk_refs WHERE digest = ? LIMIT 1", (digest,)).fetchone()]
+
+    def metadata(self, save_id):
+        """The metadata block of a save, or None when the catalog does not list it."""
+        row = self.connection.execute("SELECT metadata FROM saves WHERE id = ?", (save_id,)).fetchone()
+        return decode(row[0]) if row else None
+
+    def exclusive_chunks(self, save_ids):
+        """Digests referred to by some of save_ids and by no other save."""
+        save_ids = list(save_ids)
+        if not save_ids:
+            return []
+        placeholders = ", ".join("?" * len(save_ids))
+        return [digest for (digest,) in self.connection.execute(
+            f"SELECT DISTINCT digest FROM chunk_refs WHERE save_id IN ({placeholders}) "
+            f"AND digest NOT IN (SELECT digest FROM chunk_refs WHERE save_id NOT IN ({placeholders}))",
+            save_ids + save_ids)]
+
+    def compact(self):
+        """Give the space of deleted rows back to the file system."""
+        self.connection.execute("VACUUM")
+
+    def referenced(self):
+        """Set of the chunk digests any listed save refers to."""
+        return {digest for (digest,) in self.connection.execute("SELECT DISTINCT digest FROM chunk_refs")}
+
+    def saves(self, start_date=None, end_date=None, description=None, newest_first=True):
+        """
+        Metadata of the listed saves ordered by creation time. start_date and
+        end_date (ISO dates) keep saves whose period overlaps that range;
+        description keeps those whose description contains it, ignoring case.
+        """
+        conditions, parameters = [], []
+        if start_date is not None:
+            conditions.append("(end_date IS NULL OR end_date >= ?)")
+            parameters.append(str(start_date))
+        if end_date is not None:
+            conditions.append("(start_date IS NULL OR start_date <= ?)")
+            parameters.append(str(end_date))
+        if description:
+            conditions.append("description LIKE ? ESCAPE '\\'")
+            escaped = description.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            parameters.append(f"%{escaped}%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if newest_first else "ASC"
+        rows = self.connection.execute(
+            f"SELECT metadata FROM saves {where} ORDER BY created_at {order}, id {order}", parameters)
+        return [decode(metadata) for (metadata,) in rows]
+
+    def reconcile(self, directory, is_save_file, describe):
+        """
+        Drop rows whose file is missing from directory and add the saves in
+        files without a row. Only the added files are read, by
+        describe(path), which returns (metadata, chunk digests).
+        """
+        files = {name for name in os.listdir(directory) if is_save_file(name)}
+        listed = dict(self.connection.execute("SELECT file, id FROM saves"))
+        gone = [(save_id,) for name, save_id in listed.items() if name not in files]
+        with self.connection:
+            self.connection.executemany("DELETE FROM chunk_refs WHERE save_id = ?", gone)
+            self.connection.executemany("DELETE FROM saves WHERE id = ?", gone)
+        for name in sorted(files.difference(listed)):
+            try:
+                metadata, chunks = describe(os.path.join(directory, name))
+            except Exception as e:
+                print(f"Error loading save {name}: {e}")
+                continue
+            if metadata and "id" in metadata:
+                self.record(metadata, name, chunks=chunks)
+
+    def rebuild(self, directory, is_save_file, describe):
+        """Forget every row and read the metadata of each save file in directory again."""
+        with self.connection:
+            self.connection.execute("DELETE FROM chunk_refs")
+            self.connection.execute("DELETE FROM saves")
+        self.reconcile(directory, is_save_file, describe)
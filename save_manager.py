@@ -1,18 +1,88 @@
 # save_manager.py
-import json
 import os
 import datetime
-from typing import List, Dict, Any, Optional
-import shutil
+import functools
+import threading
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
+
+from chunk_store import ChunkStore, link_or_copy
+from columnar_format import read_availability, read_schedule, write_availability, write_schedule
+from json_codec import COMPRESSIONS, compression_module, decode, encode, read_json, write_json
+from roster_archive import merge_archive
+from save_catalog import SaveCatalog
+
+CATALOG_FILE = "catalog.db"
+CHUNKS_DIRECTORY = "chunks"
+
+# A save file in this format is a manifest: the availability as [ISO date,
+# chunk digest] pairs (one chunk per date) and the schedule as [ISO date,
+# digest] pairs (one chunk per row), so any dates can be read on their own.
+# Chunks key employees by registry id and "employees" maps the keys back to
+# names, so a renamed employee's unchanged dates are still the same chunks.
+# chunked-1 manifests listed only the schedule rows' digests
+CHUNKED_FORMAT = "chunked-2"
+CHUNKED_FORMATS = ("chunked-1", CHUNKED_FORMAT)
+
+# What load_save can return
+SECTIONS = ("metadata", "availability_data", "schedule_data")
+
+# Save files are save_<timestamp> plus one of these
+SAVE_SUFFIXES = (".json",) + tuple(f".json{suffix}" for _, suffix, _ in COMPRESSIONS.values())
+
+
+def _locked(method):
+    """
+    Run a SaveManager method holding its lock, so a background pruner never
+    sees a save half written nor deletes one, or uses the catalog, while it
+    is being read.
+    """
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return locked
+
 
 class SaveManager:
-    def __init__(self, saves_directory: str = "saves"):
-        """Initialize the SaveManager with a directory for saves."""
+    def __init__(self, saves_directory: str = "saves", compression: Optional[str] = "gzip",
+                 employee_ids: Optional[Callable[[str], Optional[int]]] = None):
+        """
+        Initialize the SaveManager with a directory for saves.
+        
+        compression is the codec new saves are written with ("gzip", "lzma",
+        "bz2", or None for plain JSON); saves in any of them can be read.
+        employee_ids(name) gives the registry id chunks key an employee by;
+        names without one are keyed as "~name".
+        """
+        if compression is not None:
+            compression_module(compression)  # raises ValueError for an unknown codec
         self.saves_directory = saves_directory
+        self.compression = compression
+        self.employee_ids = employee_ids
+        self.suffix = ".json" + (COMPRESSIONS[compression][1] if compression else "")
         # Create saves directory if it doesn't exist
         if not os.path.exists(saves_directory):
             os.makedirs(saves_directory)
+        # Metadata index of the saves; rebuilt from the files when missing
+        self.catalog = SaveCatalog(os.path.join(saves_directory, CATALOG_FILE))
+        # Deduplicated contents of the saves, shared between saves
+        self.chunks = ChunkStore(os.path.join(saves_directory, CHUNKS_DIRECTORY), compression)
+        # Held while saves, backups or the catalog are changed or read
+        self.lock = threading.RLock()
+    
+    @staticmethod
+    def is_save_file(filename: str) -> bool:
+        return filename.endswith(SAVE_SUFFIXES) and filename.startswith('save_')
+    
+    def save_path(self, save_id: str) -> Optional[str]:
+        """Path of the file of a save in whichever format it was written, or None."""
+        for suffix in SAVE_SUFFIXES:
+            save_path = os.path.join(self.saves_directory, f"{save_id}{suffix}")
+            if os.path.exists(save_path):
+                return save_path
+        return None
             
+    @_locked
     def save_schedule(self, 
                      availability_data: Dict, 
                      schedule_data: Optional[Dict] = None, 
@@ -22,6 +92,10 @@ class SaveManager:
         """
         Save the current schedule and availability data.
         
+        Each date of availability and each schedule row is stored once as a
+        content-addressed chunk, so a save that differs from earlier ones in
+        a few cells only writes those dates and a small manifest.
+        
         Args:
             availability_data: The availability data to save
             schedule_data: The generated schedule data (if any)
@@ -35,6 +109,11 @@ class SaveManager:
         # Generate a timestamp-based ID for the save
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         save_id = f"save_{timestamp}"
+        # Saves can now be quick enough to come twice in a second
+        suffix = 1
+        while self.save_path(save_id) is not None:
+            suffix += 1
+            save_id = f"save_{timestamp}_{suffix}"
         
         # Create save metadata
         save_metadata = {
@@ -45,69 +124,225 @@ class SaveManager:
             "end_date": end_date.isoformat() if end_date else None,
         }
         
-        # Create save data object
-        save_data = {
+        # Store the contents as chunks and describe the save with a manifest
+        keys = {}
+        manifest = {
             "metadata": save_metadata,
-            "availability_data": availability_data,
-            "schedule_data": schedule_data
+            "format": CHUNKED_FORMAT,
+            "availability": self._put_availability(availability_data, keys),
+            "schedule": self._put_schedule(schedule_data, keys),
+            "employees": {key: name for name, key in keys.items()},
         }
         
-        # Save to file
-        save_path = os.path.join(self.saves_directory, f"{save_id}.json")
-        with open(save_path, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, indent=2, ensure_ascii=False)
+        # Save to file, cataloguing it in the same transaction
+        file_name = f"{save_id}{self.suffix}"
+        save_path = os.path.join(self.saves_directory, file_name)
+        self.catalog.record(save_metadata, file_name,
+                            lambda: write_json(save_path, manifest, compression=self.compression),
+                            chunks=manifest_chunks(manifest))
             
         return save_id
     
-    def get_all_saves(self) -> List[Dict]:
+    def _put_availability(self, availability_data, keys):
+        if availability_data is None:
+            return None
+        entries = []
+        for date, day in availability_data.items():
+            # Views such as CompactAvailability's days give their lists as views, copied here
+            chunk = {self._key(name, keys): shifts if isinstance(shifts, list) else list(shifts)
+                     for name, shifts in day.items()}
+            entries.append([date, self.chunks.put(encode(chunk))])
+        return entries
+    
+    def _put_schedule(self, schedule_data, keys):
+        if schedule_data is None:
+            return None
+        if isinstance(schedule_data, list):
+            return [[schedule_date(row.get("Date")),
+                     self.chunks.put(encode({column if column == "Date" else self._key(column, keys): value
+                                             for column, value in row.items()}))]
+                    for row in schedule_data]
+        return {"value": self.chunks.put(encode(schedule_data))}
+    
+    def _key(self, name, keys):
+        """Chunk key of an employee, remembered in keys ({name: key}) for the manifest."""
+        key = keys.get(name)
+        if key is None:
+            employee_id = self.employee_ids(name) if self.employee_ids is not None else None
+            key = keys[name] = f"~{name}" if employee_id is None else str(employee_id)
+        return key
+    
+    @_locked
+    def get_all_saves(self,
+                      start_date: Optional[datetime.date] = None,
+                      end_date: Optional[datetime.date] = None,
+                      description: Optional[str] = None) -> List[Dict]:
         """
-        Get a list of all available saves with their metadata.
+        Get a list of all available saves with their metadata, newest first.
         
+        The list comes from the catalog; only save files it does not know
+        yet are read.
+        
+        Args:
+            start_date: Only saves whose period ends on or after this date
+            end_date: Only saves whose period starts on or before this date
+            description: Only saves whose description contains this text
+            
         Returns:
             List of save metadata dictionaries
         """
-        saves = []
-        
-        # List all save files
-        for filename in os.listdir(self.saves_directory):
-            if filename.endswith('.json') and filename.startswith('save_'):
-                file_path = os.path.join(self.saves_directory, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        save_data = json.load(f)
-                        if "metadata" in save_data:
-                            saves.append(save_data["metadata"])
-                except Exception as e:
-                    print(f"Error loading save {filename}: {e}")
-        
-        # Sort by creation date (newest first)
-        saves.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        return saves
+        self.catalog.reconcile(self.saves_directory, self.is_save_file, self._describe)
+        return self.catalog.saves(start_date, end_date, description)
+    
+    @_locked
+    def rebuild_catalog(self) -> None:
+        """Rebuild the save catalog from the metadata in the save files."""
+        self.catalog.rebuild(self.saves_directory, self.is_save_file, self._describe)
+    
+    @staticmethod
+    def _describe(save_path: str):
+        save_data = read_json(save_path)
+        return save_data.get("metadata"), manifest_chunks(save_data)
     
-    def load_save(self, save_id: str) -> Dict:
+    @_locked
+    def load_save(self, save_id: str, sections: Optional[Iterable[str]] = None,
+                  date_range: Optional[Tuple] = None) -> Dict:
         """
-        Load a specific save by ID.
+        Load a specific save by ID, or only part of it.
+        
+        Only the chunks of the requested sections and dates are read, and
+        metadata alone comes from the catalog without opening the save.
+        Legacy single-file saves are parsed whole and then cut down.
         
         Args:
             save_id: The ID of the save to load
+            sections: Keys of SECTIONS to return; all of them by default
+            date_range: (first, last) ISO dates or dates, inclusive, either
+                of which may be None; availability and schedule rows
+                outside it are left out
             
         Returns:
-            The complete save data
+            The save data, with only the requested sections
             
         Raises:
             FileNotFoundError: If the save doesn't exist
+            ValueError: For a section not in SECTIONS
         """
-        save_path = os.path.join(self.saves_directory, f"{save_id}.json")
+        sections = SECTIONS if sections is None else tuple(sections)
+        unknown = set(sections).difference(SECTIONS)
+        if unknown:
+            raise ValueError(f"Unknown save sections: {', '.join(sorted(unknown))}")
+        save_path = self.save_path(save_id)
         
-        if not os.path.exists(save_path):
+        if save_path is None:
             raise FileNotFoundError(f"Save {save_id} not found")
+        
+        if set(sections) == {"metadata"}:
+            metadata = self.catalog.metadata(save_id)
+            if metadata is not None:
+                return {"metadata": metadata}
             
-        with open(save_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        save_data = read_json(save_path)
+        if save_data.get("format") in CHUNKED_FORMATS:
+            return self._assemble(save_data, sections, date_range)
+        return _select(save_data, sections, date_range)
+    
+    @_locked
+    def _assemble(self, manifest: Dict, sections: Iterable[str] = SECTIONS,
+                  date_range: Optional[Tuple] = None) -> Dict:
+        """The save data described by a chunked manifest, reading only the chunks asked for."""
+        save_data = {}
+        names = manifest.get("employees")
+        if "metadata" in sections:
+            save_data["metadata"] = manifest["metadata"]
+        if "availability_data" in sections:
+            availability = manifest.get("availability")
+            if availability is not None:
+                availability = {date: _named(decode(self.chunks.get(digest)), names) for date, digest in availability
+                                if in_date_range(date, date_range)}
+            save_data["availability_data"] = availability
+        if "schedule_data" in sections:
+            schedule = manifest.get("schedule")
+            if isinstance(schedule, list):
+                schedule = [_named(row, names) for row in self._schedule_rows(schedule, date_range)]
+            elif schedule is not None:
+                schedule = decode(self.chunks.get(schedule["value"]))
+            save_data["schedule_data"] = schedule
+        return save_data
+    
+    def _schedule_rows(self, entries: List, date_range: Optional[Tuple]) -> List[Dict]:
+        rows = []
+        for entry in entries:
+            if isinstance(entry, list):
+                row_date, digest = entry
+                if in_date_range(row_date, date_range):
+                    rows.append(decode(self.chunks.get(digest)))
+            else:
+                # chunked-1 rows carry their date only inside the chunk
+                row = decode(self.chunks.get(entry))
+                if in_date_range(schedule_date(row.get("Date")), date_range):
+                    rows.append(row)
+        return rows
+    
+    @_locked
+    def diff_saves(self, first_id: str, second_id: str, date_range: Optional[Tuple] = None) -> List[Tuple]:
+        """
+        Availability cells that differ between two saves.
+        
+        Dates stored as the same chunk in both saves are skipped without
+        being read, so comparing saves a few edits apart reads a few chunks.
+        When both saves key employees by id, cells are matched by id, so an
+        employee renamed between them is not a difference.
+        
+        Returns:
+            (date, name, shifts in the first save, shifts in the second)
+            for every differing cell, None standing for no entry; the name
+            is the one in the second save when the employee is in both
+        """
+        (first, first_names), (second, second_names) = (self._availability_days(save_id, date_range)
+                                                         for save_id in (first_id, second_id))
+        by_key = first_names is not None and second_names is not None
+        # Equal digests only mean equal cells when both saves key them the same way
+        same_keys = by_key or (first_names is None and second_names is None)
+        names = {**(first_names or {}), **(second_names or {})} if by_key else None
+        differences = []
+        for date in list(first) + [date for date in second if date not in first]:
+            first_day, second_day = first.get(date), second.get(date)
+            if same_keys and isinstance(first_day, str) and first_day == second_day:
+                continue
+            first_day, second_day = self._day(first_day), self._day(second_day)
+            if not by_key:
+                first_day, second_day = _named(first_day, first_names), _named(second_day, second_names)
+            for key in list(first_day) + [key for key in second_day if key not in first_day]:
+                if first_day.get(key) != second_day.get(key):
+                    name = names.get(key, key) if by_key else key
+                    differences.append((date, name, first_day.get(key), second_day.get(key)))
+        return differences
+    
+    def _availability_days(self, save_id: str, date_range: Optional[Tuple]) -> Tuple[Dict, Optional[Dict]]:
+        """
+        ({date: chunk digest} of a chunked save or {date: day} of a legacy
+        one, {key: name} when its chunks key employees by id, else None).
+        """
+        save_path = self.save_path(save_id)
+        if save_path is None:
+            raise FileNotFoundError(f"Save {save_id} not found")
+        save_data = read_json(save_path)
+        if save_data.get("format") in CHUNKED_FORMATS:
+            days = save_data.get("availability") or []
+        else:
+            days = (save_data.get("availability_data") or {}).items()
+        return {date: day for date, day in days if in_date_range(date, date_range)}, save_data.get("employees")
     
+    def _day(self, day) -> Dict:
+        if day is None:
+            return {}
+        return decode(self.chunks.get(day)) if isinstance(day, str) else day
+    
+    @_locked
     def delete_save(self, save_id: str) -> bool:
         """
-        Delete a save by ID.
+        Delete a save by ID, along with the chunks no other save uses.
         
         Args:
             save_id: The ID of the save to delete
@@ -115,21 +350,49 @@ class SaveManager:
         Returns:
             True if successful, False otherwise
         """
-        save_path = os.path.join(self.saves_directory, f"{save_id}.json")
+        save_path = self.save_path(save_id)
         
-        if not os.path.exists(save_path):
+        if save_path is None:
+            self.catalog.forget(save_id)
             return False
             
         try:
-            os.remove(save_path)
-            return True
+            # Every manifest has to be catalogued before its chunks can be judged unused
+            self.catalog.reconcile(self.saves_directory, self.is_save_file, self._describe)
+            unused = self.catalog.forget(save_id, lambda: os.remove(save_path))
         except Exception:
             return False
+        for digest in unused:
+            self.chunks.delete(digest)
+        return True
+    
+    @_locked
+    def collect_garbage(self) -> int:
+        """
+        Delete every chunk no save refers to, such as those left by a save
+        that failed half way or by manifests removed by hand.
+        
+        Returns:
+            The number of chunks deleted
+        """
+        self.catalog.reconcile(self.saves_directory, self.is_save_file, self._describe)
+        referenced = self.catalog.referenced()
+        unused = [digest for digest in self.chunks.digests() if digest not in referenced]
+        for digest in unused:
+            self.chunks.delete(digest)
+        return len(unused)
             
+    @_locked
     def backup_save(self, save_id: str, backup_dir: str = "backups") -> bool:
         """
         Create a backup of a save file.
         
+        Files are hard-linked where the file system allows it and copied
+        byte for byte otherwise, compressed as they are, so a backup of a
+        save costs no space until the save is deleted. A chunked save's
+        manifest becomes {save_id}_backup.json[.gz|.xz|.bz2] and its chunks
+        are added to backup_dir/chunks, which all backups share.
+        
         Args:
             save_id: The ID of the save to backup
             backup_dir: Directory to store backups
@@ -141,14 +404,124 @@ class SaveManager:
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
             
-        save_path = os.path.join(self.saves_directory, f"{save_id}.json")
-        backup_path = os.path.join(backup_dir, f"{save_id}_backup.json")
+        save_path = self.save_path(save_id)
         
-        if not os.path.exists(save_path):
+        if save_path is None:
             return False
+        suffix = os.path.basename(save_path)[len(save_id):]
+        backup_path = os.path.join(backup_dir, f"{save_id}_backup{suffix}")
             
         try:
-            shutil.copy2(save_path, backup_path)
+            # A manifest is useless without its chunks, so they go first
+            backup_chunks = ChunkStore(os.path.join(backup_dir, CHUNKS_DIRECTORY))
+            for digest in manifest_chunks(read_json(save_path)):
+                if digest not in backup_chunks:
+                    os.makedirs(os.path.dirname(backup_chunks.path(digest)), exist_ok=True)
+                    link_or_copy(self.chunks.path(digest), backup_chunks.path(digest))
+            link_or_copy(save_path, backup_path)
             return True
         except Exception:
             return False
+    
+    def export_columnar(self, save_id: str, directory: str = "exports", extension: str = ".npz") -> List[str]:
+        """
+        Write a save's availability and schedule as columnar files for analysis.
+        
+        Args:
+            save_id: The ID of the save to export
+            directory: Directory for the files
+            extension: ".npz", or ".arrow" when pyarrow is installed
+            
+        Returns:
+            Paths of the files written ({save_id}_availability and, when the
+            save has one, {save_id}_schedule)
+        """
+        save_data = self.load_save(save_id)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        paths = []
+        availability_path = os.path.join(directory, f"{save_id}_availability{extension}")
+        write_availability(availability_path, save_data.get("availability_data") or {})
+        paths.append(availability_path)
+        if save_data.get("schedule_data"):
+            schedule_path = os.path.join(directory, f"{save_id}_schedule{extension}")
+            write_schedule(schedule_path, save_data["schedule_data"])
+            paths.append(schedule_path)
+        return paths
+    
+    def import_columnar(self, availability_path: str, schedule_path: Optional[str] = None,
+                        description: str = "") -> str:
+        """
+        Create a save from columnar files written by export_columnar.
+        
+        Returns:
+            save_id: The ID of the created save
+        """
+        schedule_data = read_schedule(schedule_path) if schedule_path else None
+        return self.save_schedule(read_availability(availability_path), schedule_data, description)
+    
+    def archive_save(self, save_id: str, archive_path: str = "roster.archive") -> None:
+        """
+        Add a save's availability and schedule to the roster archive, where
+        past rosters are read through mmap without loading the save.
+        
+        Args:
+            save_id: The ID of the save to archive
+            archive_path: The archive file, created when missing
+        """
+        save_data = self.load_save(save_id)
+        merge_archive(archive_path, save_data.get("availability_data") or {}, save_data.get("schedule_data") or [])
+
+
+def manifest_chunks(save_data: Dict) -> List[str]:
+    """Digests of the chunks a save file refers to; none for a save in the legacy single-file format."""
+    if save_data.get("format") not in CHUNKED_FORMATS:
+        return []
+    digests = [digest for _, digest in save_data.get("availability") or []]
+    schedule = save_data.get("schedule")
+    if isinstance(schedule, list):
+        digests.extend(entry[1] if isinstance(entry, list) else entry for entry in schedule)
+    elif schedule is not None:
+        digests.append(schedule["value"])
+    return digests
+
+
+def _named(chunk: Dict, names: Optional[Dict]) -> Dict:
+    """A day or schedule row chunk with its employee keys turned back into names."""
+    if not names:
+        return chunk
+    return {names.get(key, key): value for key, value in chunk.items()}
+
+
+def schedule_date(row_date: Optional[str]) -> Optional[str]:
+    """ISO date of a schedule row's "Date" (dd/mm/YYYY, or already ISO), or None."""
+    for date_format in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(str(row_date), date_format).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def in_date_range(iso_date: Optional[str], date_range: Optional[Tuple]) -> bool:
+    """Whether an ISO date lies in an inclusive (first, last) range; everything does when there is no range."""
+    if date_range is None:
+        return True
+    if iso_date is None:
+        return False
+    first, last = date_range
+    return (first is None or iso_date >= str(first)) and (last is None or iso_date <= str(last))
+
+
+def _select(save_data: Dict, sections: Iterable[str], date_range: Optional[Tuple]) -> Dict:
+    """The requested sections of a whole save, cut down to date_range."""
+    selected = {section: save_data.get(section) for section in sections}
+    if date_range is not None:
+        if selected.get("availability_data") is not None:
+            selected["availability_data"] = {date: day for date, day in selected["availability_data"].items()
+                                             if in_date_range(date, date_range)}
+        if isinstance(selected.get("schedule_data"), list):
+            selected["schedule_data"] = [row for row in selected["schedule_data"]
+                                         if in_date_range(schedule_date(row.get("Date")), date_range)]
+    return selected
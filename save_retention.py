@@ -0,0 +1,216 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from chunk_store import ChunkStore
+from json_codec import read_json
+from save_manager import CHUNKS_DIRECTORY, SAVE_SUFFIXES, manifest_chunks
+
+# How the saves of a tier are grouped; only the newest save of each group is
+# kept, except under "all"
+BUCKETS = {
+    "all": None,
+    "day": lambda created: created.date(),
+    "week": lambda created: tuple(created.isocalendar())[:2],
+    "month": lambda created: (created.year, created.month),
+}
+
+# Every save of the last 7 days, the newest of each day up to a month, then
+# the newest of each week
+DEFAULT_TIERS = ((timedelta(days=7), "all"), (timedelta(days=30), "day"), (None, "week"))
+
+# Seconds between background runs
+DEFAULT_INTERVAL = 6 * 60 * 60
+
+# Whether the application prunes in the background; off by default, as
+# pruning deletes saves and backups for good
+AUTO_PRUNE = False
+
+
+class RetentionPolicy:
+    """
+    Which saves to keep, as tiers of (maximum age, bucket) from youngest to
+    oldest.
+
+    A save belongs to the first tier its age fits, None meaning no limit.
+    Within a tier, "all" keeps every save and "day", "week" or "month" keep
+    the newest save of each. Saves older than the last tier are pruned;
+    saves whose creation time cannot be read are always kept.
+    """
+    __slots__ = ("tiers",)
+
+    def __init__(self, tiers=DEFAULT_TIERS):
+        for _, bucket in tiers:
+            if bucket not in BUCKETS:
+                raise ValueError(f"Unknown retention bucket: {bucket}")
+        self.tiers = tuple(tiers)
+
+    def decide(self, saves, now=None):
+        """(save id, keep, reason) for each metadata dict in saves, newest first."""
+        now = now or datetime.now()
+        decisions = []
+        kept_buckets = set()
+        for metadata in sorted(saves, key=lambda save: save.get("created_at") or "", reverse=True):
+            save_id = metadata.get("id")
+            created = _created_at(metadata)
+            if created is None:
+                decisions.append((save_id, True, "no readable creation time"))
+                continue
+            tier = next((index for index, (max_age, _) in enumerate(self.tiers)
+                         if max_age is None or now - created <= max_age), None)
+            if tier is None:
+                decisions.append((save_id, False, "older than every tier"))
+                continue
+            bucket = self.tiers[tier][1]
+            if BUCKETS[bucket] is None:
+                decisions.append((save_id, True, f"tier {tier + 1} keeps all"))
+                continue
+            key = (tier, BUCKETS[bucket](created))
+            if key in kept_buckets:
+                decisions.append((save_id, False, f"a newer save of the same {bucket} is kept"))
+            else:
+                kept_buckets.add(key)
+                decisions.append((save_id, True, f"newest of its {bucket}"))
+        return decisions
+
+
+class RetentionReport:
+    """What a retention run kept and pruned, or would have for a dry run."""
+    __slots__ = ("dry_run", "entries", "bytes_freed")
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.entries = []  # (location, save id, keep, reason)
+        self.bytes_freed = 0
+
+    @property
+    def pruned(self):
+        """(location, save id) of every pruned save or backup."""
+        return [(location, save_id) for location, save_id, keep, _ in self.entries if not keep]
+
+    def format(self):
+        """The report as text, one line per save or backup."""
+        verb = "would prune" if self.dry_run else "pruned"
+        lines = [f"{location}: {save_id} {'kept' if keep else verb} ({reason})"
+                 for location, save_id, keep, reason in self.entries]
+        lines.append(f"{len(self.pruned)} {verb}, {self.bytes_freed / 1e6:.2f} MB "
+                     f"{'would be ' if self.dry_run else ''}freed")
+        return "\n".join(lines)
+
+
+class RetentionEngine:
+    """
+    Applies a RetentionPolicy to the saves of a SaveManager and to its
+    backups, then deletes the chunks nothing refers to any more and
+    compacts the catalog.
+
+    run() does it once; dry_run=True only reports. start() runs it every
+    interval seconds on a daemon thread, holding the SaveManager's lock
+    while it works so it never sees a save half written. The last report
+    is kept in last_report, and the error of a failed background run in
+    error.
+
+    Bytes freed count only files with no other hard link, as backups made
+    by SaveManager.backup_save share their files with the saves.
+    """
+
+    def __init__(self, save_manager, policy=None, backup_dir="backups"):
+        self.save_manager = save_manager
+        self.policy = policy or RetentionPolicy()
+        self.backup_dir = backup_dir
+        self.last_report = None
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run(self, dry_run=False, now=None):
+        """Prune saves and backups once; returns the RetentionReport."""
+        report = RetentionReport(dry_run)
+        with self.save_manager.lock:
+            self._prune_saves(report, now)
+            self._prune_backups(report, now)
+        self.last_report = report
+        return report
+
+    def start(self, interval=DEFAULT_INTERVAL):
+        """Run now and then every interval seconds in the background, until stop()."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self, interval):
+        while True:
+            try:
+                self.run()
+                self.error = None
+            except Exception as e:
+                self.error = e
+            if self._stop.wait(interval):
+                return
+
+    def _prune_saves(self, report, now):
+        manager = self.save_manager
+        decisions = self.policy.decide(manager.get_all_saves(), now)
+        pruned = [save_id for save_id, keep, _ in decisions if not keep]
+        report.entries.extend(("saves", save_id, keep, reason) for save_id, keep, reason in decisions)
+        report.bytes_freed += sum(_unshared_size(manager.save_path(save_id)) for save_id in pruned)
+        report.bytes_freed += sum(_unshared_size(manager.chunks.path(digest))
+                                  for digest in manager.catalog.exclusive_chunks(pruned))
+        if report.dry_run or not pruned:
+            return
+        for save_id in pruned:
+            manager.delete_save(save_id)
+        manager.collect_garbage()
+        manager.catalog.compact()
+
+    def _prune_backups(self, report, now):
+        if not os.path.isdir(self.backup_dir):
+            return
+        backups = {}
+        for name in os.listdir(self.backup_dir):
+            if any(name.endswith(f"_backup{suffix}") for suffix in SAVE_SUFFIXES):
+                try:
+                    backup = read_json(os.path.join(self.backup_dir, name))
+                except Exception as e:
+                    print(f"Error loading backup {name}: {e}")
+                    continue
+                backups[name] = (backup.get("metadata") or {}, manifest_chunks(backup))
+        decisions = self.policy.decide(
+            [{"id": name, "created_at": metadata.get("created_at")} for name, (metadata, _) in backups.items()], now)
+        report.entries.extend(("backups", name, keep, reason) for name, keep, reason in decisions)
+
+        pruned = [name for name, keep, _ in decisions if not keep]
+        referenced = {digest for name, keep, _ in decisions if keep for digest in backups[name][1]}
+        chunks = ChunkStore(os.path.join(self.backup_dir, CHUNKS_DIRECTORY))
+        unused = [digest for digest in chunks.digests() if digest not in referenced]
+        report.bytes_freed += sum(_unshared_size(os.path.join(self.backup_dir, name)) for name in pruned)
+        report.bytes_freed += sum(_unshared_size(chunks.path(digest)) for digest in unused)
+        if report.dry_run:
+            return
+        for name in pruned:
+            os.remove(os.path.join(self.backup_dir, name))
+        for digest in unused:
+            chunks.delete(digest)
+
+
+def _created_at(metadata):
+    try:
+        return datetime.fromisoformat(metadata.get("created_at") or "")
+    except ValueError:
+        return None
+
+
+def _unshared_size(path):
+    """Size of the file at path if deleting it frees it: it exists and has no other hard link."""
+    try:
+        status = os.stat(path)
+    except (OSError, TypeError):
+        return 0
+    return status.st_size if status.st_nlink <= 1 else 0
@@ -1,7 +1,26 @@
-import json
+import atexit
+import csv
+import os
 from pandas import DataFrame, read_excel, isna, notna
 #from collections import deque  
+from collections.abc import Mapping
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from assignment_solver import solve_min_cost_assignment
+from availability_journal import JournalAvailabilityStore
+from availability_store import SQLiteAvailabilityStore
+from availability_writer import AvailabilityWriter
+from availability_tensor import compile_availability
+from columnar_format import read_availability, write_availability
+from compact_availability import CompactAvailability
+from json_codec import read_json, write_json
+from local_search import improve_assignment
+from roster_archive import RosterArchive, merge_archive
+from rule_set import compile_rules
+from shift_intervals import ShiftTimeline, format_shift, shift_hours, split_shift
+from constraints import ConstraintTracker, check_constraints
+from employee_registry import EmployeeRegistry
+import numpy as np
 
 def initialize():
     """Initialize the module by loading data from files"""
@@ -9,6 +28,7 @@ def initialize():
 
 class Employee:
     def __init__(self, name, employee_type, additional_roles=None, start_time=None, end_time=None):
+        self.id = None  # assigned by the EmployeeRegistry it is added to
         self.name = name
         self.employee_type = employee_type  # Primary role (Role1)
         self.additional_roles = additional_roles or []  # List of additional roles
@@ -17,16 +37,14 @@ class Employee:
 
     def get_available_shifts(self):
         # Use primary role for shift determination
-        if self.employee_type in ROLE_RULES:
-            rule = ROLE_RULES[self.employee_type]
-            if rule["rule_type"] == "shift_based":
-                weekday_shifts = list(rule["shifts"]["weekday"].values())
-                weekend_shifts = list(rule["shifts"]["weekend"].values())
-                return list(set(weekday_shifts + weekend_shifts))
-            elif rule["rule_type"] == "fixed_time":
+        rule = RULES.get(self.employee_type)
+        if rule is not None:
+            if rule.rule_type == "shift_based":
+                return list(rule.all_times)
+            elif rule.rule_type == "fixed_time":
                 if self.start_time and self.end_time:
                     return [f"{self.start_time}-{self.end_time}"]
-                return [rule.get("default_shift", "Shift Not Set")]
+                return [rule.default_shift]
         return []
     
     def get_all_roles(self):
@@ -42,12 +60,8 @@ class Freelancer(Employee):
         super().__init__(name, "Freelancer")
         
     def get_available_shifts(self):
-        # Get current day of week to determine if it's a weekday or weekend
-        today = datetime.now().weekday()
-        day_type = "weekday" if today < 5 else "weekend"
-        
-        # Return all shifts for the current day type
-        return list(ROLE_RULES["Freelancer"]["shifts"][day_type].values()) 
+        # Return all shifts for today's day type (weekday or weekend)
+        return list(RULES.role("Freelancer").day(datetime.now()).times)
 
 class SeniorEditor(Employee):
     def __init__(self, name):
@@ -73,21 +87,60 @@ class KoreanEntertainment(Employee):
     def get_available_shifts(self):
         return ["10-19"]
 
+def read_employee_file(path='employees.json'):
+    """
+    (employee entries, id high-water mark) of employees.json, which is
+    {"next_id": n, "employees": [...]}, or just the list before
+    migrate_employee_ids() has run.
+    """
+    data = read_json(path)
+    if isinstance(data, list):
+        return data, 1
+    return data.get("employees", []), data.get("next_id", 1)
+
 def init_employees():
     try:
-        with open('employees.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            employees = []
-            for emp in data:
-                if emp['role'] == 'Freelancer':
-                    employees.append(Freelancer(emp['name']))  # ← Proper subclass instantiation
-                elif emp['role'] == 'SeniorEditor':
-                    employees.append(SeniorEditor(emp['name']))  # ← Add similar for other roles
-                else:
-                    employees.append(Employee(emp['name'], emp['role']))
-            return employees
+        data, next_id = read_employee_file()
+        employees = []
+        for emp in data:
+            if emp['role'] == 'Freelancer':
+                employee = Freelancer(emp['name'])  # ← Proper subclass instantiation
+            elif emp['role'] == 'SeniorEditor':
+                employee = SeniorEditor(emp['name'])  # ← Add similar for other roles
+            else:
+                employee = Employee(emp['name'], emp['role'])
+            employee.id = emp.get('id')
+            employees.append(employee)
+        return EmployeeRegistry(employees, next_id)
     except FileNotFoundError:
-        return []
+        return EmployeeRegistry()
+
+
+def migrate_employee_ids():
+    """
+    One-time upgrade to stable employee ids, run by the application on start.
+
+    Entries of employees.json without an id get the ones the registry gave
+    them and the file gains the id high-water mark; the availability
+    database then has its employees renumbered to those ids. Does nothing
+    once both are done; returns True when something changed.
+    """
+    try:
+        data = read_json('employees.json')
+    except FileNotFoundError:
+        return False
+    changed = isinstance(data, list) or any('id' not in emp for emp in data.get("employees", []))
+    if changed:
+        save_employees()
+    store = stored_availability()
+    if hasattr(store, "adopt_ids"):
+        changed = store.adopt_ids({emp.name: emp.id for emp in EMPLOYEES}) or changed
+    return changed
+
+def employee_id(name):
+    """Registry id of the employee called name, or None for someone not in EMPLOYEES."""
+    employee = EMPLOYEES.get(name)
+    return None if employee is None else employee.id
 
 def init_availability(start_date, employees):
     # Find the previous Sunday to start the calendar
@@ -102,25 +155,125 @@ def init_availability(start_date, employees):
     }
 
 
-def save_data(data):
-    try:
-        with open('availability.json', 'w') as f:
-            json.dump(data, f, indent=4)
-    except IOError as e:
-        raise RuntimeError(f"File write failed: {str(e)}")[1]
+AVAILABILITY_DB = 'availability.db'
+AVAILABILITY_JOURNAL = 'availability.journal'
 
+# Where availability is kept: an SQLite database (importing availability.json
+# into a new one), or availability.json as a snapshot plus an edit journal
+AVAILABILITY_BACKENDS = {
+    "sqlite": lambda: SQLiteAvailabilityStore(AVAILABILITY_DB, legacy_json='availability.json', employee_ids=employee_id),
+    "journal": lambda: JournalAvailabilityStore('availability.json', AVAILABILITY_JOURNAL),
+}
+AVAILABILITY_BACKEND = "sqlite"
+_availability_store = None
 
+def availability_store():
+    """The availability store of AVAILABILITY_BACKEND, opened on first use."""
+    global _availability_store
+    if _availability_store is None:
+        if AVAILABILITY_BACKEND not in AVAILABILITY_BACKENDS:
+            raise ValueError(f"Unknown availability backend: {AVAILABILITY_BACKEND}")
+        _availability_store = AVAILABILITY_BACKENDS[AVAILABILITY_BACKEND]()
+    return _availability_store
 
-def load_data():
-    try:
-        with open('availability.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return None
+# Availability saves are written in the background: at most SAVE_INTERVAL_MS
+# after the first unsaved edit, or once edits pause for SAVE_IDLE_MS
+SAVE_INTERVAL_MS = 500
+SAVE_IDLE_MS = 150
+_availability_writer = None
+
+def availability_writer():
+    """The background writer of availability saves, started on first use and flushed at exit."""
+    global _availability_writer
+    if _availability_writer is None:
+        _availability_writer = AvailabilityWriter(availability_store(), SAVE_INTERVAL_MS, SAVE_IDLE_MS)
+        atexit.register(flush_availability)
+    return _availability_writer
+
+def save_data(data, cells=None):
+    """
+    Persist availability without waiting for the disk. cells lists the
+    (date, employee) pairs that were edited, so only those rows are written;
+    without it only the cells that differ from what is stored are written.
+    Saves in quick succession are combined into one write.
+    """
+    availability_writer().submit(data, cells)
+
+def flush_availability():
+    """
+    Write every queued availability save now.
+
+    Raises RuntimeError when the write fails.
+    """
+    if _availability_writer is not None:
+        _availability_writer.flush()
+
+def availability_save_status():
+    """'saved', 'dirty' (edits queued), 'saving' or 'failed'."""
+    if _availability_writer is None:
+        return "saved"
+    return _availability_writer.status
+
+def stored_availability():
+    """The availability store with every queued save written, for reading or changing it directly."""
+    flush_availability()
+    return availability_store()
+
+
+def load_data(compact=False):
+    """
+    The stored availability, or None when nothing is stored. compact=True
+    returns it as a CompactAvailability, which takes a fraction of the
+    memory and can be passed wherever the dict is.
+    """
+    data = stored_availability().load()
+    if compact and data is not None:
+        return CompactAvailability(data)
+    return data
+
+def export_availability_json(file_path='availability.json'):
+    """Write the stored availability to a JSON file in the old availability.json format."""
+    stored_availability().export_json(file_path)
+
+def import_availability_json(file_path):
+    """Replace the stored availability with a JSON file in the availability.json format."""
+    stored_availability().import_json(file_path)
+
+def export_availability_columnar(file_path='availability.npz'):
+    """Write the stored availability as a columnar .npz, or .arrow with pyarrow, for analysis."""
+    write_availability(file_path, load_data() or {})
+
+def import_availability_columnar(file_path):
+    """Replace the stored availability with a file written by export_availability_columnar."""
+    stored_availability().replace_all(read_availability(file_path))
+
+# Past periods moved out of the working availability, read through mmap
+ARCHIVE_PATH = 'roster.archive'
+
+def archive_availability(before, schedule=None, path=ARCHIVE_PATH):
+    """
+    Move the availability of every date before the ISO date before into the
+    roster archive, with the rows of schedule (e.g. get_last_generated_schedule())
+    for those dates. Returns the number of dates moved.
+    """
+    availability = load_data() or {}
+    old = {iso_date: day for iso_date, day in availability.items() if iso_date < before}
+    if not old:
+        return 0
+    old_rows = [row for row in schedule or []
+                if datetime.strptime(row["Date"], "%d/%m/%Y").strftime("%Y-%m-%d") in old]
+    merge_archive(path, old, old_rows)
+    # A listed cell missing from the data is deleted
+    stored_availability().save({}, [(iso_date, name) for iso_date, day in old.items() for name in day])
+    return len(old)
+
+def open_archive(path=ARCHIVE_PATH):
+    """The roster archive as a RosterArchive, or None when nothing has been archived."""
+    return RosterArchive(path) if os.path.exists(path) else None
 
 # Constants
+# Everyone in employees.json; EMPLOYEES.freelancers is the freelancer axis of every pass
 EMPLOYEES = init_employees()
-FREELANCERS = [employee.name for employee in EMPLOYEES if isinstance(employee, Freelancer)]
 
 # New centralized role-based rules storage
 # ROLE_RULES = {
@@ -156,40 +309,66 @@ FREELANCERS = [employee.name for employee in EMPLOYEES if isinstance(employee, F
 
 def load_employees():
     try:
-        with open('employees.json', 'r') as f:
-            data = json.load(f)
-            return [Employee(
+        data, next_id = read_employee_file()
+        employees = []
+        for emp in data:
+            employee = Employee(
                 emp["name"], 
                 emp["role"], 
                 emp.get("additional_roles", []),
                 emp.get("start_time"), 
                 emp.get("end_time")
-            ) for emp in data]
+            )
+            employee.id = emp.get("id")
+            employees.append(employee)
+        return EmployeeRegistry(employees, next_id)
     except FileNotFoundError:
         return init_employees()
 
 
 
+# (store, registry, registry version, {id: name}) as of the last sync_availability()
+_last_sync = None
+
 def sync_availability():
-    employees = load_employees()
-    availability = load_data()
-    
-    # Get current employee names
-    current_employees = {e.name for e in employees}  # Use e.name
-    
-    # Update availability for each date
-    for date in availability:
-        # Remove deleted employees
-        for emp_name in list(availability[date].keys()):
-            if emp_name not in current_employees:
-                del availability[date][emp_name]
-                
-        # Add new employees
-        for emp in employees:
-            if emp.name not in availability[date]:  # Use emp.name
-                availability[date][emp.name] = []  # Use emp.name
-    
-    save_data(availability)
+    """
+    Give every employee in EMPLOYEES an entry on each stored date and drop
+    the entries of employees who are gone.
+
+    Only the employees added, removed or renamed (same id, new name) since
+    the previous sync are touched, and nothing is done when the registry has
+    not changed. The first sync of a session compares against what the store
+    holds instead, finding renames through the ids the store keeps; without
+    ids a rename shows up as a removal plus an addition.
+    """
+    global _last_sync
+    store = stored_availability()
+    if _last_sync is not None and _last_sync[:3] == (store, EMPLOYEES, EMPLOYEES.version):
+        return
+    current = {emp.id: emp.name for emp in EMPLOYEES}
+
+    if _last_sync is None or _last_sync[:2] != (store, EMPLOYEES):
+        date_count, stored = store.coverage()
+        renamed = [(name, current[emp_id]) for name, emp_id in store.stored_ids().items()
+                   if name in stored and name not in EMPLOYEES and emp_id in current]
+        for old_name, new_name in renamed:
+            stored[new_name] = max(stored.pop(old_name), stored.get(new_name, 0))
+        removed = [name for name in stored if name not in EMPLOYEES]
+        added = [name for name in current.values() if stored.get(name, 0) < date_count]
+    else:
+        previous = _last_sync[3]
+        removed = [name for emp_id, name in previous.items() if emp_id not in current]
+        renamed = [(previous[emp_id], name) for emp_id, name in current.items()
+                   if emp_id in previous and previous[emp_id] != name]
+        added = [name for emp_id, name in current.items() if emp_id not in previous]
+
+    for name in removed:
+        store.delete_employee(name)
+    for old_name, new_name in renamed:
+        store.rename_employee(old_name, new_name)
+    for name in added:
+        store.add_employee(name)
+    _last_sync = (store, EMPLOYEES, EMPLOYEES.version, current)
 
 def validate_synchronization():
     employees = load_employees()
@@ -213,24 +392,28 @@ def validate_synchronization():
 
 
 def save_employees():
-    with open('employees.json', 'w') as f:
-        json.dump([{
-            "name": emp.name,
-            "role": emp.employee_type,
-            "additional_roles": emp.additional_roles,
-            "start_time": emp.start_time,
-            "end_time": emp.end_time
-        } for emp in EMPLOYEES], f, indent=4, separators=(',', ': '))
+    write_json('employees.json', {"next_id": EMPLOYEES.next_id, "employees": [{
+        "id": emp.id,
+        "name": emp.name,
+        "role": emp.employee_type,
+        "additional_roles": emp.additional_roles,
+        "start_time": emp.start_time,
+        "end_time": emp.end_time
+    } for emp in EMPLOYEES]})
 
 
 def add_employee(name, role, additional_roles=None, start_time=None, end_time=None):
+    custom_shift = None
+    if role != 'Freelancer' and start_time and end_time:
+        custom_shift = format_shift(start_time, end_time)  # validate before changing anything
+    
     if role == 'Freelancer':
         new_emp = Freelancer(name)
         new_emp.additional_roles = additional_roles or []
     else:
         new_emp = Employee(name, role, additional_roles, start_time, end_time)
     
-    EMPLOYEES.append(new_emp)
+    EMPLOYEES.add(new_emp)
     save_employees()
     
     availability = load_data()
@@ -239,79 +422,103 @@ def add_employee(name, role, additional_roles=None, start_time=None, end_time=No
         availability = init_availability(datetime.now(), [new_emp])
     else:
         for date in availability:
-            if role != 'Freelancer' and start_time and end_time:
-                availability[date][new_emp.name] = [f"{start_time}-{end_time}"]
+            if custom_shift:
+                availability[date][new_emp.name] = [custom_shift]
             else:
                 availability[date][new_emp.name] = []
-    save_data(availability)
+    save_data(availability, [(date, new_emp.name) for date in availability])
     
     return new_emp
 
 
 def edit_employee(old_name, new_name, new_role, additional_roles=None, new_start_time=None, new_end_time=None):
-    for emp in EMPLOYEES:
-        if emp.name == old_name:
-            emp.name = new_name
-            emp.employee_type = new_role
-            emp.additional_roles = additional_roles or []
-            if new_role != 'Freelancer':
-                emp.start_time = new_start_time
-                emp.end_time = new_end_time
-            break
+    new_shift = None
+    if new_role != 'Freelancer' and new_start_time and new_end_time:
+        new_shift = format_shift(new_start_time, new_end_time)  # validate before changing anything
+    
+    old_shift = None
+    employee = EMPLOYEES.get(old_name)
+    if employee is not None:
+        if employee.start_time and employee.end_time:
+            try:
+                old_shift = format_shift(employee.start_time, employee.end_time)
+            except ValueError:
+                pass
+        changes = {"name": new_name, "employee_type": new_role, "additional_roles": additional_roles or []}
+        if new_role != 'Freelancer':
+            changes.update(start_time=new_start_time, end_time=new_end_time)
+        EMPLOYEES.update(old_name, **changes)
 
-    availability = load_data()
-    for date in availability:
-        if old_name in availability[date]:
-            current_shifts = availability[date][old_name]
-            # Preserve leaves and special codes
-            leaves = [s for s in current_shifts if s in {"AL", "CL", "PH", "ON", "自由調配", "half off"}]
-            
-            if new_role != 'Freelancer' and new_start_time and new_end_time:
-                new_shift = f"{new_start_time}-{new_end_time}"
+    # The store keys cells by employee id, so a rename does not touch them
+    if new_name != old_name:
+        stored_availability().rename_employee(old_name, new_name)
+
+    if new_shift and new_shift != old_shift:
+        availability = load_data() or {}
+        changed = []
+        for date in availability:
+            if new_name in availability[date]:
+                current_shifts = availability[date][new_name]
+                # Preserve leaves and special codes
+                leaves = [s for s in current_shifts if s in {"AL", "CL", "PH", "ON", "自由調配", "half off"}]
                 # Only update non-leave days
                 availability[date][new_name] = leaves if leaves else [new_shift]
-    
-    save_data(availability)
+                changed.append((date, new_name))
+        save_data(availability, changed)
+
     save_employees()
     sync_availability()
 
 
 def delete_employee(name):
-    global EMPLOYEES
-    # Find the employee to delete
-    employee_to_delete = next((emp for emp in EMPLOYEES if emp.name == name), None)
+    # Remove employee from the registry
+    employee_to_delete = EMPLOYEES.remove(name)
 
     if employee_to_delete:
-        # Remove employee from EMPLOYEES list
-        EMPLOYEES.remove(employee_to_delete)
-
         # Save the updated employee list to JSON
         save_employees()
 
         # Update availability data
-        availability = load_data()
-        for date in availability:
-            if employee_to_delete.name in availability[date]:  # Use employee_to_delete.name
-                del availability[date][employee_to_delete.name]  # Use employee_to_delete.name
-        save_data(availability)
+        stored_availability().delete_employee(employee_to_delete.name)
     else:
         print(f"Employee with name {name} not found.")
 
 
 _last_generated_schedule = []
+_last_violations = []
 
 def get_last_generated_schedule():
     global _last_generated_schedule
     return _last_generated_schedule
 
-def generate_schedule(availability, start_date, export_to_excel=True, file_path=None):
-    global _last_generated_schedule
+def get_last_violations():
+    """Constraint Violations of the last generate_schedule run, in the order they were found."""
+    return _last_violations
+
+def generate_schedule(availability, start_date, export_to_excel=True, file_path=None, engine="flow",
+                      improve_seconds=None, seed=None):
+    """
+    Generates the schedule for every date in availability and returns the warnings.
+
+    improve_seconds adds a local-search pass after the freelancer pass that
+    keeps swapping and moving assignments for that many seconds to reduce
+    understaffing and imbalance between freelancers (seed makes it repeatable).
+
+    The "constraints" declared for a role in role_rules.json are kept by the
+    freelancer pass when hard and checked for every role; what is broken is
+    available from get_last_violations() and added to the warnings.
+    """
+    global _last_generated_schedule, _last_violations
     warnings = []
+    freelancer_violations = []
     
     # Get all dates from availability
     date_strings = sorted(availability.keys())
     dates = [datetime.strptime(d, "%Y-%m-%d") for d in date_strings]
     
+    # Compile availability once; both passes read from the arrays
+    tensor = compile_availability(availability, date_strings, scheduled_names())
+    
     # Create a dictionary to organize schedule entries by date
     schedule_by_date = {}
     for date in dates:
@@ -319,15 +526,24 @@ def generate_schedule(availability, start_date, export_to_excel=True, file_path=
         schedule_by_date[date_str] = {"Date": date_str}
     
     # Generate schedules for fulltime employees first
-    for role_type in ROLE_RULES:
+    for role_type in RULES:
         if role_type != "Freelancer":  # Process all non-freelancer roles
-            role_warnings = generate_fulltime_schedule_for_integrated(availability, dates, schedule_by_date, role_type)
+            role_warnings = generate_fulltime_schedule_for_integrated(availability, dates, schedule_by_date, role_type, tensor)
             warnings.extend(role_warnings)
     
     # Generate freelancer schedule second
-    freelancer_warnings = generate_freelancer_schedule_for_integrated(availability, dates, schedule_by_date)
+    freelancer_warnings = generate_freelancer_schedule_for_integrated(availability, dates, schedule_by_date, engine,
+                                                                      tensor, freelancer_violations)
     warnings.extend(freelancer_warnings)
     
+    if improve_seconds:
+        # Only freelancer warnings exist so far, and the pass recomputes them all
+        warnings = improve_freelancer_schedule(availability, dates, schedule_by_date, improve_seconds, seed, tensor,
+                                               freelancer_violations)
+    
+    _last_violations = fulltime_violations(dates, schedule_by_date) + freelancer_violations
+    warnings.extend(str(violation) for violation in _last_violations)
+    
     # Convert the date-organized dictionary to a flat schedule list
     schedule = [entry for _, entry in sorted(schedule_by_date.items())]
     
@@ -341,107 +557,554 @@ def generate_schedule(availability, start_date, export_to_excel=True, file_path=
     
     return warnings
 
-def generate_fulltime_schedule_for_integrated(availability, dates, schedule_by_date, role_type):
+def iter_schedule(availability, engine="flow", warnings=None, violations=None):
     """
-    Generates schedules for fulltime employees of a specific role type and integrates them into the schedule_by_date dictionary.
+    Generates the schedule one day at a time, yielding each finished row in date order.
+
+    availability is either a mapping like the usual {iso_date: {name: [...]}}
+    dict (a CompactAvailability included) or an iterable of
+    (iso_date, {name: [...]}) pairs already in date order, so a long horizon
+    can be read lazily. Only the current day and the freelancer fairness
+    counters are kept in memory. Understaffing warnings are appended
+    to the warnings list and constraint Violations to the violations list
+    when they are given.
+    """
+    if isinstance(availability, Mapping):
+        days = ((iso_date, availability[iso_date]) for iso_date in sorted(availability.keys()))
+    else:
+        days = iter(availability)
+    
+    names = scheduled_names()
+    shift_counts = new_freelancer_shift_counts()
+    # Only the last few days can clash with the next one's shifts
+    timeline = ShiftTimeline.window(len(EMPLOYEES.freelancers), RULES.role("Freelancer").min_rest)
+    last = len(timeline.offsets) - 1
+    tracker = new_freelancer_tracker()
+    fulltime_trackers = new_fulltime_trackers()
+    
+    for iso_date, day_availability in days:
+        date = datetime.strptime(iso_date, "%Y-%m-%d")
+        date_str = date.strftime("%d/%m/%Y")
+        day = {iso_date: day_availability}
+        tensor = compile_availability(day, [iso_date], names)
+        schedule_by_date = {date_str: {"Date": date_str}}
+        
+        for role_type in RULES:
+            if role_type != "Freelancer":
+                generate_fulltime_schedule_for_integrated(day, [date], schedule_by_date, role_type, tensor)
+        
+        cols = tensor.columns(EMPLOYEES.freelancers)
+        timeline.advance(date.toordinal())
+        mask = freelancer_day_mask(date, tensor, 0, cols) & freelancer_rule_mask(date, timeline, last, tracker)
+        assigned_shifts, day_warnings = assign_freelancer_day(date, mask, tensor.lengths[0, cols], shift_counts, engine)
+        timeline.place_day(last, assigned_shifts)
+        day_violations = tracker.record(date, assigned_shifts)
+        if warnings is not None:
+            warnings.extend(day_warnings)
+        if violations is not None:
+            row = schedule_by_date[date_str]
+            for fulltime_tracker in fulltime_trackers:
+                violations.extend(fulltime_tracker.record(date, [row.get(name, "off") for name in fulltime_tracker.names]))
+            violations.extend(day_violations)
+        
+        schedule_by_date[date_str].update(zip(EMPLOYEES.freelancers, assigned_shifts))
+        yield schedule_by_date[date_str]
+
+def export_schedule_stream(availability, file_path, engine="flow"):
+    """
+    Generates the schedule day by day straight into a .csv or .xlsx file.
+
+    Rows are written as they are produced, so memory stays bounded by a single
+    day however long the horizon is. Returns the warnings as generate_schedule
+    does: understaffing, then constraint violations.
     """
     warnings = []
+    violations = []
+    rows = iter_schedule(availability, engine, warnings, violations)
     
-    role_rules = ROLE_RULES[role_type]
-    default_shift = role_rules.get("default_shift")
+    if file_path.lower().endswith(".csv"):
+        with open(file_path, 'w', newline='', encoding='utf-8') as f:
+            writer = None
+            for row in rows:
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+                    writer.writeheader()
+                writer.writerow(row)
+    else:
+        # write_only workbooks flush each appended row instead of keeping
+        # every cell object alive until save
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        headers = None
+        for row in rows:
+            if headers is None:
+                headers = list(row.keys())
+                sheet.append(headers)
+            sheet.append([row.get(header) for header in headers])
+        workbook.save(file_path)
     
-    employees = [emp.name for emp in EMPLOYEES if emp.employee_type == role_type]
+    warnings.extend(str(violation) for violation in violations)
+    return warnings
+
+def default_scenarios(count=8):
+    """A spread of engines, tie-break policies and greedy weightings to compare."""
+    scenarios = [
+        {"engine": "flow"},
+        {"engine": "greedy"},
+        {"engine": "flow", "tie_break": "reverse"},
+    ]
+    weightings = [(1.0, 1.0), (0.5, 1.0), (1.0, 0.5), (0.0, 1.0), (1.0, 2.0)]
+    seed = 0
+    while len(scenarios) < count:
+        availability_weight, count_weight = weightings[seed % len(weightings)]
+        scenarios.append({"engine": "flow", "tie_break": "random", "seed": seed})
+        scenarios.append({"engine": "greedy", "tie_break": "random", "seed": seed,
+                          "availability_weight": availability_weight, "count_weight": count_weight})
+        seed += 1
+    return scenarios[:count]
+
+def generate_schedule_scenarios(availability, scenarios=None, count=8, parallel=True, max_workers=None):
+    """
+    Generates several candidate schedules and returns the Pareto-optimal ones.
+
+    Each scenario is a ScenarioEngine dict (engine, tie-break policy, seed,
+    greedy weights); default_scenarios(count) is used when none are given.
+    Availability is compiled and the fulltime pass run once; only the
+    freelancer pass differs per scenario and runs in a process pool unless
+    parallel is False.
+
+    Every candidate is scored on three objectives, all minimised:
+    understaffed (understaffed shift count), fairness_variance (variance of
+    shifts per freelancer) and total_hours (freelancer hours). Returns the
+    non-dominated candidates as dicts with "scenario", "scores", "warnings"
+    and "schedule", best understaffing first; scenarios producing an
+    identical roster are only listed once.
+    """
+    scenarios = scenarios if scenarios is not None else default_scenarios(count)
     
-    for date in dates:
-        date_str = date.strftime("%d/%m/%Y")
-        iso_date_str = date.strftime("%Y-%m-%d")
+    date_strings = sorted(availability.keys())
+    dates = [datetime.strptime(d, "%Y-%m-%d") for d in date_strings]
+    tensor = compile_availability(availability, date_strings, scheduled_names())
+    
+    fulltime_by_date = {date.strftime("%d/%m/%Y"): {"Date": date.strftime("%d/%m/%Y")} for date in dates}
+    for role_type in RULES:
+        if role_type != "Freelancer":
+            generate_fulltime_schedule_for_integrated(availability, dates, fulltime_by_date, role_type, tensor)
+    
+    shared = (tensor, dates, RULES, EMPLOYEES)
+    if parallel:
+        # Each worker receives the compiled input once, not once per scenario
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_scenario_worker,
+                                 initargs=shared) as pool:
+            results = list(pool.map(_run_scenario, scenarios))
+    else:
+        _init_scenario_worker(*shared)
+        results = [_run_scenario(scenario) for scenario in scenarios]
+    
+    candidates = []
+    seen = []
+    for scenario, (freelancer_by_date, warnings) in zip(scenarios, results):
+        # Different scenarios often land on the same roster; keep it once
+        if freelancer_by_date in seen:
+            continue
+        seen.append(freelancer_by_date)
         
-        # Assign shifts to employees based on actual availability
-        for name in employees:
-            # Check if the employee has availability data for this date
-            if iso_date_str in availability and name in availability[iso_date_str]:
-                employee_data = availability[iso_date_str][name]
-                
-                # Check if there's any data for this employee on this date
-                if employee_data and len(employee_data) > 0:
-                    # Check for leave types or custom shifts
-                    first_entry = employee_data[0]
-                    leave_types = ["AL", "CL", "PH", "ON", "自由調配", "half off"]
-                    
-                    if first_entry in leave_types:
-                        # This is a leave entry
-                        schedule_by_date[date_str][name] = first_entry
-                    elif "-" in first_entry:
-                        # This is a custom shift time
-                        schedule_by_date[date_str][name] = first_entry
-                    else:
-                        # Unknown format, use default
-                        schedule_by_date[date_str][name] = default_shift
-                else:
-                    # Empty array means unavailable
-                    schedule_by_date[date_str][name] = "off"
-            else:
-                # If no data exists, use default shift
-                schedule_by_date[date_str][name] = default_shift
+        schedule = []
+        for date_str, entry in fulltime_by_date.items():
+            row = dict(entry)
+            row.update(freelancer_by_date[date_str])
+            schedule.append(row)
+        candidates.append({
+            "scenario": scenario,
+            "scores": score_schedule(schedule, warnings),
+            "warnings": warnings,
+            "schedule": schedule,
+        })
+    
+    front = pareto_front(candidates)
+    front.sort(key=lambda c: (c["scores"]["understaffed"], c["scores"]["fairness_variance"], c["scores"]["total_hours"]))
+    return front
+
+_scenario_input = None
+
+def _init_scenario_worker(tensor, dates, rule_set, employees):
+    """Pool initializer: keep the shared compiled input for every scenario this worker runs."""
+    global _scenario_input, RULES, EMPLOYEES
+    _scenario_input = (tensor, dates)
+    RULES = rule_set
+    EMPLOYEES = employees
+
+def _run_scenario(scenario):
+    """Pool task: the freelancer pass for one scenario."""
+    tensor, dates = _scenario_input
+    freelancer_by_date = {date.strftime("%d/%m/%Y"): {} for date in dates}
+    warnings = generate_freelancer_schedule_for_integrated(None, dates, freelancer_by_date,
+                                                           ScenarioEngine(scenario), tensor)
+    return freelancer_by_date, warnings
+
+def score_schedule(schedule, warnings):
+    """Objectives used to rank candidate schedules; lower is better for each."""
+    shifts_per_freelancer = np.zeros(len(EMPLOYEES.freelancers))
+    total_hours = 0.0
+    for row in schedule:
+        for i, name in enumerate(EMPLOYEES.freelancers):
+            shift = row.get(name, "off")
+            if shift != "off":
+                shifts_per_freelancer[i] += 1
+                total_hours += shift_hours(shift)
+    return {
+        "understaffed": len(warnings),
+        "fairness_variance": float(shifts_per_freelancer.var()) if len(EMPLOYEES.freelancers) else 0.0,
+        "total_hours": total_hours,
+    }
+
+def pareto_front(candidates):
+    """Candidates whose scores no other candidate matches or beats on every objective."""
+    def dominates(a, b):
+        return all(a[k] <= b[k] for k in a) and any(a[k] < b[k] for k in a)
+    return [c for c in candidates
+            if not any(dominates(other["scores"], c["scores"]) for other in candidates if other is not c)]
+
+def scheduled_names():
+    """Employee axis of the compiled availability: everyone the passes may schedule."""
+    return EMPLOYEES.names()
+
+def _tensor_for(availability, dates, tensor):
+    """Reuse the run's compiled availability, or compile it for a direct call."""
+    if tensor is None:
+        tensor = compile_availability(availability, [d.strftime("%Y-%m-%d") for d in dates], scheduled_names())
+    return tensor
+
+def generate_fulltime_schedule_for_integrated(availability, dates, schedule_by_date, role_type, tensor=None):
+    """
+    Generates schedules for fulltime employees of a specific role type and integrates them into the schedule_by_date dictionary.
+    """
+    warnings = []
+    tensor = _tensor_for(availability, dates, tensor)
+    
+    default_shift = RULES.role(role_type).default_shift
+    
+    employees = EMPLOYEES.names(role_type)
+    if employees:
+        fill_fulltime_schedule(tensor, dates, schedule_by_date, employees, default_shift)
     
     return warnings
 
-def generate_freelancer_schedule_for_integrated(availability, dates, schedule_by_date):
+def fill_fulltime_schedule(tensor, dates, schedule_by_date, employees, default_shift):
+    """Writes the fulltime entries of the given employees for the given dates into schedule_by_date."""
+    cols = tensor.columns(employees)
+    
+    # Map every interned entry to what it schedules as; two extra codes
+    # cover "no entry at all" and "empty list".
+    outputs = [fulltime_entry([shift], default_shift) for shift in tensor.shifts]
+    default_code, off_code = len(outputs), len(outputs) + 1
+    outputs += [default_shift, "off"]
+    
+    row_dates = [tensor.date_index[date.strftime("%Y-%m-%d")] for date in dates]
+    first = tensor.first[row_dates][:, cols]
+    present = tensor.present[row_dates][:, cols]
+    codes = np.where(present, np.where(first >= 0, first, off_code), default_code)
+    
+    for row, date in enumerate(dates):
+        entry = schedule_by_date[date.strftime("%d/%m/%Y")]
+        for name, code in zip(employees, codes[row].tolist()):
+            entry[name] = outputs[code]
+
+def fulltime_entry(entries, default_shift):
+    """
+    Schedule entry for one fulltimer cell.
+
+    entries is the availability list, or None when the employee has no data for
+    the date. A leave code or "start-end" time in first position is kept, an
+    empty list means "off", and anything else uses the role's default shift.
+    """
+    if entries is None:
+        return default_shift
+    if not entries:
+        return "off"
+    first_entry = entries[0]
+    leave_types = ["AL", "CL", "PH", "ON", "自由調配", "half off"]
+    if first_entry in leave_types or "-" in first_entry:
+        return first_entry
+    return default_shift
+
+def generate_freelancer_schedule_for_integrated(availability, dates, schedule_by_date, engine="flow", tensor=None,
+                                                violations=None):
     """
     Generates schedules for freelancers and integrates them into the schedule_by_date dictionary.
+
+    engine selects the assignment strategy from FREELANCER_ENGINES:
+    "flow" (exact min-cost flow, default) or "greedy" (the original weighted
+    pass). A kernel callable such as a ScenarioEngine is accepted as well.
+    Hard constraints of the Freelancer rule are never broken; Violations of
+    the soft ones are appended to the violations list when one is given.
     """
+    freelancer_engine(engine)  # fail early on an unknown engine name
+    tensor = _tensor_for(availability, dates, tensor)
     warnings = []
     
-    freelancer_rules = ROLE_RULES["Freelancer"]
-    shift_counts = {name: {"early": 0, "day": 0, "night": 0} for name in FREELANCERS}
+    shift_counts = new_freelancer_shift_counts()
+    timeline = new_freelancer_timeline(dates)
+    tracker = new_freelancer_tracker()
+    cols = tensor.columns(EMPLOYEES.freelancers)
     
-    for date in dates:
-        date_str = date.strftime("%d/%m/%Y")
-        iso_date_str = date.strftime("%Y-%m-%d")
-        day_type = 'weekend' if date.weekday() >= 5 else 'weekday'
-        assigned_shifts = {name: 'off' for name in FREELANCERS}
-        
-        shifts = freelancer_rules["shifts"][day_type]
-        shift_requirements = freelancer_rules["requirements"][day_type]
-        
-        # Process each shift type by priority
-        for shift_name, required_count in sorted(shift_requirements.items(), key=lambda x: x[1], reverse=True):
-            shift_time = shifts[shift_name]
-            assigned_count = 0
-            
-            # Find available freelancers for this shift
-            available_freelancers = []
-            for name in FREELANCERS:
-                if (iso_date_str in availability and 
-                    name in availability[iso_date_str] and 
-                    shift_time in availability[iso_date_str][name] and 
-                    assigned_shifts[name] == 'off'):
-                    weight = (1 / (len(availability[iso_date_str][name]) + 1)) + (1 / (shift_counts[name][shift_name] + 1))
-                    available_freelancers.append((name, weight))
-            
-            # Sort freelancers by weight (higher weight = higher priority)
-            available_freelancers.sort(key=lambda x: x[1], reverse=True)
-            
-            # Assign shifts
-            for name, _ in available_freelancers:
-                if assigned_count < required_count:
-                    assigned_shifts[name] = shift_time
-                    shift_counts[name][shift_name] += 1
-                    assigned_count += 1
-            
-            # Check for understaffing
-            if assigned_count < required_count:
-                warnings.append(
-                    f"Warning: {shift_name} shift on {date.strftime('%Y-%m-%d')} is understaffed. "
-                    f"Required: {required_count}, Assigned: {assigned_count}."
-                )
+    for j, date in enumerate(dates):
+        d = tensor.date_index[date.strftime("%Y-%m-%d")]
+        mask = freelancer_day_mask(date, tensor, d, cols) & freelancer_rule_mask(date, timeline, j, tracker)
+        assigned_shifts, day_warnings = assign_freelancer_day(date, mask, tensor.lengths[d, cols], shift_counts, engine)
+        timeline.place_day(j, assigned_shifts)
+        day_violations = tracker.record(date, assigned_shifts)
+        if violations is not None:
+            violations.extend(day_violations)
+        warnings.extend(day_warnings)
         
         # Add freelancer assignments to the schedule entry for this date
-        for name, shift in assigned_shifts.items():
-            schedule_by_date[date_str][name] = shift
+        schedule_by_date[date.strftime("%d/%m/%Y")].update(zip(EMPLOYEES.freelancers, assigned_shifts))
+    
+    return warnings
+
+def freelancer_shift_columns():
+    """Column of each freelancer shift name in the shift_counts arrays."""
+    return RULES.role("Freelancer").shift_columns
+
+def new_freelancer_shift_counts():
+    """Zeroed [freelancer, shift name] fairness counters for a run."""
+    return np.zeros((len(EMPLOYEES.freelancers), len(freelancer_shift_columns())), dtype=np.int64)
+
+def freelancer_day_slots(date):
+    """Shift names for the date in priority order, with their times and required headcounts."""
+    day_rule = RULES.role("Freelancer").day(date)
+    return day_rule.names, day_rule.times, day_rule.requirements
+
+def new_freelancer_timeline(dates):
+    """Empty ShiftTimeline of the freelancers over the given dates, with the Freelancer rule's min rest."""
+    return ShiftTimeline([date.toordinal() for date in dates], len(EMPLOYEES.freelancers),
+                         RULES.role("Freelancer").min_rest)
+
+def new_freelancer_tracker():
+    """ConstraintTracker for the Freelancer rule's constraints over EMPLOYEES.freelancers."""
+    return ConstraintTracker(RULES.role("Freelancer").constraints, EMPLOYEES.freelancers)
+
+def new_fulltime_trackers():
+    """A ConstraintTracker per non-freelancer role that declares constraints, over its employees."""
+    trackers = []
+    for role_type in RULES:
+        constraints = RULES.role(role_type).constraints
+        if role_type != "Freelancer" and constraints:
+            trackers.append(ConstraintTracker(constraints, EMPLOYEES.names(role_type)))
+    return trackers
+
+def fulltime_violations(dates, schedule_by_date):
+    """Violations of the non-freelancer roles' constraints in a finished schedule."""
+    violations = []
+    for tracker in new_fulltime_trackers():
+        rows = [schedule_by_date[date.strftime("%d/%m/%Y")] for date in dates]
+        violations.extend(check_constraints(tracker.constraints, tracker.names, dates, rows))
+    return violations
+
+def freelancer_rule_mask(date, timeline, j, tracker):
+    """
+    Boolean [freelancer, slot] of who can take each slot on position j of a
+    day-by-day pass: keeping the minimum rest after their earlier shifts and
+    every hard constraint given the tracker's state.
+    """
+    intervals = RULES.role("Freelancer").day(date).intervals
+    return timeline.allowed_after(j, intervals) & tracker.allowed(date, intervals)
+
+def freelancer_day_mask(date, tensor, d, cols):
+    """Boolean [freelancer, slot] array of who listed each of the day's shifts."""
+    _, slot_times, _ = freelancer_day_slots(date)
+    if not slot_times:
+        return np.zeros((len(cols), 0), dtype=bool)
+    return np.stack([tensor.shift_mask(d, cols, shift_time) for shift_time in slot_times], axis=1)
+
+def assign_freelancer_day(date, mask, lengths, shift_counts, engine="flow"):
+    """
+    Runs one day of the freelancer pass.
+
+    mask comes from freelancer_day_mask, lengths holds each freelancer's number
+    of listed entries, and shift_counts is updated in place with the day's
+    assignments. Returns the shift (or 'off') per freelancer and the day's
+    understaffing warnings.
+    """
+    day_rule = RULES.role("Freelancer").day(date)
+    slot_names, slot_times, requirements = day_rule.names, day_rule.times, day_rule.requirements
+    slot_columns = list(day_rule.columns)
+    
+    slots = freelancer_engine(engine)(requirements, mask, lengths,
+                                      shift_counts[:, slot_columns], shift_counts.sum(axis=1))
+    
+    assigned_shifts = ['off'] * len(mask)
+    for i in np.flatnonzero(slots >= 0).tolist():
+        s = slots[i]
+        assigned_shifts[i] = slot_times[s]
+        shift_counts[i, slot_columns[s]] += 1
+    
+    warnings = understaffing_warnings(date, slot_names, requirements, slots)
     
+    return assigned_shifts, warnings
+
+def understaffing_warnings(date, slot_names, requirements, slots):
+    """Warnings for the day's slots that got fewer people than required."""
+    warnings = []
+    assigned_per_slot = np.bincount(slots[slots >= 0], minlength=len(slot_names))
+    for s, shift_name in enumerate(slot_names):
+        if assigned_per_slot[s] < requirements[s]:
+            warnings.append(
+                f"Warning: {shift_name} shift on {date.strftime('%Y-%m-%d')} is understaffed. "
+                f"Required: {requirements[s]}, Assigned: {assigned_per_slot[s]}."
+            )
     return warnings
 
+def improve_freelancer_schedule(availability, dates, schedule_by_date, time_budget, seed=None, tensor=None,
+                                violations=None):
+    """
+    Post-optimises the freelancer assignments already in schedule_by_date.
+
+    Runs local_search.improve_assignment for time_budget seconds to fill
+    understaffed shifts and even out shifts per freelancer, writes the result
+    back and returns the recomputed understaffing warnings. A violations list
+    that is given is refilled with the Violations of the new assignments.
+    """
+    tensor = _tensor_for(availability, dates, tensor)
+    cols = tensor.columns(EMPLOYEES.freelancers)
+    shift_column = freelancer_shift_columns()
+    
+    slots = np.full((len(dates), len(EMPLOYEES.freelancers)), -1, dtype=np.intp)
+    days = []
+    for j, date in enumerate(dates):
+        slot_names, slot_times, requirements = freelancer_day_slots(date)
+        d = tensor.date_index[date.strftime("%Y-%m-%d")]
+        days.append((slot_names, slot_times, requirements, freelancer_day_mask(date, tensor, d, cols)))
+        row = schedule_by_date[date.strftime("%d/%m/%Y")]
+        for i, name in enumerate(EMPLOYEES.freelancers):
+            shift = row.get(name, 'off')
+            if shift in slot_times:
+                slots[j, i] = slot_times.index(shift)
+    
+    improved = improve_assignment(
+        slots,
+        [requirements for _, _, requirements, _ in days],
+        [mask for _, _, _, mask in days],
+        [[shift_column[name] for name in slot_names] for slot_names, _, _, _ in days],
+        len(shift_column), time_budget, seed,
+        new_freelancer_timeline(dates), [RULES.role("Freelancer").day(date).intervals for date in dates],
+        [constraint for constraint in RULES.role("Freelancer").constraints if constraint.hard])
+    
+    warnings = []
+    for j, date in enumerate(dates):
+        slot_names, slot_times, requirements, _ = days[j]
+        row = schedule_by_date[date.strftime("%d/%m/%Y")]
+        for i, name in enumerate(EMPLOYEES.freelancers):
+            row[name] = slot_times[improved[j, i]] if improved[j, i] >= 0 else 'off'
+        warnings.extend(understaffing_warnings(date, slot_names, requirements, improved[j]))
+    
+    if violations is not None:
+        violations[:] = check_constraints(RULES.role("Freelancer").constraints, EMPLOYEES.freelancers, dates,
+                                          [schedule_by_date[date.strftime("%d/%m/%Y")] for date in dates])
+    return warnings
+
+def greedy_freelancer_engine(requirements, mask, lengths, counts, totals, priority=None,
+                             availability_weight=1.0, count_weight=1.0):
+    """
+    Fills each shift in turn with the highest-weighted available freelancers.
+
+    counts holds each freelancer's previous shifts of each slot's type and
+    totals their previous shifts overall. Equal weights are broken by
+    priority (a permutation of freelancer indices, EMPLOYEES.freelancers order by
+    default). Returns the slot index per freelancer, -1 for unassigned.
+    """
+    slots = np.full(len(mask), -1, dtype=np.intp)
+    free = np.ones(len(mask), dtype=bool)
+    if priority is None:
+        priority = np.arange(len(mask))
+    
+    for s, required_count in enumerate(requirements):
+        # Weight every free freelancer who listed this shift; a stable sort
+        # keeps the priority order between equal weights
+        available = priority[mask[priority, s] & free[priority]]
+        weights = (availability_weight / (lengths[available] + 1)) + (count_weight / (counts[available, s] + 1))
+        chosen = available[np.argsort(-weights, kind="stable")[:required_count]]
+        slots[chosen] = s
+        free[chosen] = False
+    
+    return slots
+
+def flow_freelancer_engine(requirements, mask, lengths, counts, totals, priority=None):
+    """
+    Assigns freelancers to the day's slots with an exact min-cost max-flow.
+
+    A freelancer works at most one shift per day, so days are independent for
+    coverage and solving each day exactly gives the best coverage over the
+    whole horizon. Among the assignments with maximum coverage, the cheapest
+    one is chosen, where a shift costs more for freelancers who already have
+    more shifts (in total and of that shift type), so work spreads evenly.
+    Equal-cost choices go to the earlier freelancer in priority order.
+    """
+    costs_matrix = totals[:, None] + counts
+    if priority is None:
+        priority = np.arange(len(mask))
+    
+    candidates = []
+    costs = {}
+    for i in priority[mask[priority].any(axis=1)].tolist():
+        available_slots = np.flatnonzero(mask[i]).tolist()
+        candidates.append((i, available_slots))
+        for s in available_slots:
+            costs[(i, s)] = int(costs_matrix[i, s])
+    
+    slots = np.full(len(mask), -1, dtype=np.intp)
+    for i, s in solve_min_cost_assignment(requirements, candidates, costs).items():
+        slots[i] = s
+    return slots
+
+# Freelancer assignment strategies selectable through generate_schedule(engine=...)
+FREELANCER_ENGINES = {
+    "greedy": greedy_freelancer_engine,
+    "flow": flow_freelancer_engine,
+}
+
+def freelancer_engine(engine):
+    """Resolve an engine name from FREELANCER_ENGINES, or pass a kernel callable through."""
+    if callable(engine):
+        return engine
+    if engine not in FREELANCER_ENGINES:
+        raise ValueError(f"Unknown freelancer engine: {engine}")
+    return FREELANCER_ENGINES[engine]
+
+class ScenarioEngine:
+    """
+    Freelancer kernel configured by a scenario dict, for batch generation.
+
+    Keys (all optional):
+    engine: "flow" or "greedy" (default "flow")
+    tie_break: "order" (EMPLOYEES.freelancers order), "reverse" or "random"
+    seed: random seed used by tie_break="random"
+    availability_weight / count_weight: greedy weighting coefficients
+    """
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.engine = scenario.get("engine", "flow")
+        self.tie_break = scenario.get("tie_break", "order")
+        self.rng = np.random.default_rng(scenario.get("seed"))
+        self.weights = {}
+        if self.engine == "greedy":
+            self.weights = {
+                "availability_weight": scenario.get("availability_weight", 1.0),
+                "count_weight": scenario.get("count_weight", 1.0),
+            }
+    
+    def __call__(self, requirements, mask, lengths, counts, totals):
+        if self.tie_break == "random":
+            priority = self.rng.permutation(len(mask))
+        elif self.tie_break == "reverse":
+            priority = np.arange(len(mask))[::-1]
+        else:
+            priority = None
+        return freelancer_engine(self.engine)(requirements, mask, lengths, counts, totals,
+                                              priority=priority, **self.weights)
+
 
 
 
@@ -487,7 +1150,7 @@ def process_fulltime_availability(availability, row, employee_name):
     fulltime_cols = [col for col in row.index if col.startswith('全職 [') and ']' in col]
     
     # Find the employee object
-    employee = next((emp for emp in EMPLOYEES if emp.name == employee_name), None)
+    employee = EMPLOYEES.get(employee_name)
     if not employee:
         return  # Skip if employee not found
         
@@ -511,19 +1174,20 @@ def process_fulltime_availability(availability, row, employee_name):
             else:
                 # This is a regular shift entry
                 shift_value = row[col]
-                if notna(shift_value) and "-" in shift_value:
+                shift_times = split_shift(shift_value) if notna(shift_value) else None
+                if shift_times:
                     # Update employee configuration with the shift from form
-                    start_time, end_time = shift_value.split('-')
+                    start_time, end_time = shift_times
                     employee.start_time = start_time
                     employee.end_time = end_time
                     availability[iso_date][employee_name] = [shift_value]
-                elif employee.employee_type in ROLE_RULES:
+                elif employee.employee_type in RULES:
                     # Use employee's custom time if available, otherwise use default from role rules
                     if employee.start_time and employee.end_time:
                         availability[iso_date][employee_name] = [f"{employee.start_time}-{employee.end_time}"]
                     else:
-                        rule = ROLE_RULES[employee.employee_type]
-                        availability[iso_date][employee_name] = [rule["default_shift"]]
+                        rule = RULES.role(employee.employee_type)
+                        availability[iso_date][employee_name] = [rule.default_shift]
     
     # Save the updated employee configuration
     save_employees()
@@ -595,7 +1259,7 @@ def import_from_excel(file_path):
         shift = row['Shift']
         
         if date_str not in availability:
-            availability[date_str] = {name: [] for name in FREELANCERS}
+            availability[date_str] = {name: [] for name in EMPLOYEES.freelancers}
         
         if employee_name not in availability[date_str]:
             availability[date_str][employee_name] = []
@@ -604,10 +1268,11 @@ def import_from_excel(file_path):
             availability[date_str][employee_name].append(shift)
         
         # Update employee configuration
-        employee = next((emp for emp in EMPLOYEES if emp.name == employee_name), None)
+        employee = EMPLOYEES.get(employee_name)
         if employee and employee.employee_type != 'Freelancer':
-            if '-' in shift and shift not in ["AL", "CL", "PH", "ON", "自由調配", "half off"]:
-                start_time, end_time = shift.split('-')
+            shift_times = split_shift(shift)
+            if shift_times:
+                start_time, end_time = shift_times
                 employee.start_time = start_time
                 employee.end_time = end_time
     
@@ -650,11 +1315,18 @@ def add_role(role_name, role_config):
     Parameters:
     role_name (str): Name of the new role
     role_config (dict): Configuration for the role
+    
+    Raises ValueError if the configuration is invalid; ROLE_RULES is left unchanged.
     """
-    global ROLE_RULES
+    global ROLE_RULES, RULES, RULE_ERRORS
+    
+    # Compile first so a bad role never reaches ROLE_RULES
+    compile_rules({role_name: role_config})
     
     # Add the new role to ROLE_RULES
     ROLE_RULES[role_name] = role_config
+    RULE_ERRORS = []
+    RULES = compile_rules(ROLE_RULES, RULE_ERRORS)
     
     # Save the updated ROLE_RULES to a file
     save_role_rules()
@@ -662,20 +1334,35 @@ def add_role(role_name, role_config):
 def save_role_rules():
     """Save the ROLE_RULES dictionary to a JSON file"""
     try:
-        with open('role_rules.json', 'w') as f:
-            json.dump(ROLE_RULES, f, indent=4)
+        write_json('role_rules.json', ROLE_RULES)
     except Exception as e:
         print(f"Error saving role rules: {str(e)}")
 
 def load_role_rules():
-    """Load ROLE_RULES from JSON file if it exists"""
-    global ROLE_RULES
+    """
+    Load ROLE_RULES from JSON file if it exists and compile them into RULES.
+    
+    Invalid roles are left out of RULES rather than failing the import; what
+    is wrong with them is printed and kept for get_rule_errors().
+    """
+    global ROLE_RULES, RULES, RULE_ERRORS
     try:
-        with open('role_rules.json', 'r', encoding='utf-8') as f:
-            ROLE_RULES = json.load(f)
+        ROLE_RULES = read_json('role_rules.json')
     except FileNotFoundError:
         # If file doesn't exist, use the default ROLE_RULES
         pass
+    RULE_ERRORS = []
+    RULES = compile_rules(ROLE_RULES, RULE_ERRORS)
+    for error in RULE_ERRORS:
+        print(f"Skipping invalid role: {error}")
+
+def get_rule_set():
+    """The compiled RuleSet for the current ROLE_RULES"""
+    return RULES
+
+def get_rule_errors():
+    """Why each role left out of RULES is invalid, one message per role"""
+    return RULE_ERRORS
 
 initialize()    
     
@@ -0,0 +1,226 @@
+from datetime import date as calendar_date
+
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class ShiftInterval:
+    """
+    A "start-end" shift string parsed into minutes from the start of its day.
+
+    end is greater than start; overnight shifts such as "23-8" end past
+    MINUTES_PER_DAY. start_text and end_text are the two halves as written.
+    """
+    __slots__ = ("start", "end", "start_text", "end_text")
+
+    def __init__(self, start, end, start_text, end_text):
+        self.start = start
+        self.end = end
+        self.start_text = start_text
+        self.end_text = end_text
+
+    @property
+    def minutes(self):
+        return self.end - self.start
+
+    @property
+    def hours(self):
+        return self.minutes / 60
+
+
+# Every string ever parsed, including the ones that are not shifts (None), so
+# repeated lookups of the same few shift strings are a single dict hit
+_intervals = {}
+
+
+def parse_shift(shift):
+    """
+    ShiftInterval for a shift string such as "7-16", "0930-1830", "09:30-18:30"
+    or "23-8", or None for leave codes and anything else that is not a shift.
+    """
+    if not isinstance(shift, str):
+        return None
+    try:
+        return _intervals[shift]
+    except KeyError:
+        pass
+    interval = _intervals[shift] = _parse(shift)
+    return interval
+
+
+def _parse(shift):
+    parts = shift.split("-")
+    if len(parts) != 2:
+        return None
+    start_text, end_text = parts[0].strip(), parts[1].strip()
+    start, end = _to_minutes(start_text), _to_minutes(end_text)
+    if start is None or end is None:
+        return None
+    if end <= start:
+        end += MINUTES_PER_DAY
+    return ShiftInterval(start, end, start_text, end_text)
+
+
+def _to_minutes(value):
+    """Minutes after midnight for "7", "24", "0930" or "09:30"; None if malformed."""
+    digits = value.replace(":", "", 1)
+    if not digits.isdigit() or not 1 <= len(digits) <= 4:
+        return None
+    if len(digits) > 2:
+        hours, minutes = int(digits[:-2]), int(digits[-2:])
+    else:
+        hours, minutes = int(digits), 0
+    if minutes >= 60 or hours * 60 + minutes > MINUTES_PER_DAY:
+        return None
+    return hours * 60 + minutes
+
+
+def split_shift(shift):
+    """(start, end) texts of a shift string, or None when it is not a shift."""
+    interval = parse_shift(shift)
+    if interval is None:
+        return None
+    return interval.start_text, interval.end_text
+
+
+def format_shift(start_time, end_time):
+    """
+    Shift string for start and end times entered separately.
+
+    Raises ValueError when the two do not make a valid shift.
+    """
+    shift = f"{str(start_time).strip()}-{str(end_time).strip()}"
+    if parse_shift(shift) is None:
+        raise ValueError(f"Invalid shift time '{shift}'")
+    return shift
+
+
+def shift_hours(shift):
+    """Length in hours of a shift string; 0 for anything that is not a shift."""
+    interval = parse_shift(shift)
+    return interval.hours if interval is not None else 0.0
+
+
+_NEVER_START = np.iinfo(np.int64).max // 2
+_NEVER_END = np.iinfo(np.int64).min // 2
+
+
+class ShiftTimeline:
+    """
+    Assigned shifts per person and scheduled day on one absolute minute axis.
+
+    days holds the day number (date.toordinal()) of each position; positions
+    must be in date order but need not be consecutive. Every person holds at
+    most one shift per day and no shift lasts more than two days, so only a
+    fixed number of neighbouring positions can clash with a new assignment:
+    every check is O(1) whatever the horizon.
+
+    Two shifts clash when they overlap or leave less than min_rest minutes
+    between the end of one and the start of the other.
+    """
+
+    def __init__(self, days, person_count, min_rest=0):
+        self.min_rest = min_rest
+        self.reach = 2 + -(-min_rest // MINUTES_PER_DAY)
+        self.offsets = np.array(days, dtype=np.int64) * MINUTES_PER_DAY
+        # Unassigned cells start after and end before everything, so they never clash
+        self.starts = np.full((len(self.offsets), person_count), _NEVER_START, dtype=np.int64)
+        self.ends = np.full((len(self.offsets), person_count), _NEVER_END, dtype=np.int64)
+        self._ranges = {}
+
+    @classmethod
+    def window(cls, person_count, min_rest=0):
+        """Empty timeline just long enough to be moved along a stream of days with advance()."""
+        timeline = cls([], person_count, min_rest)
+        return cls([0] * (timeline.reach + 1), person_count, min_rest)
+
+    def place(self, j, p, interval):
+        """Record person p working interval on position j."""
+        self.starts[j, p] = self.offsets[j] + interval.start
+        self.ends[j, p] = self.offsets[j] + interval.end
+
+    def clear(self, j, p):
+        """Forget person p's shift on position j."""
+        self.starts[j, p] = _NEVER_START
+        self.ends[j, p] = _NEVER_END
+
+    def works(self, j, p):
+        """True when person p has a shift on position j."""
+        return self.starts[j, p] != _NEVER_START
+
+    def week_range(self, j):
+        """Positions [lo, hi) in the same Monday-to-Sunday week as position j."""
+        return self._range("week", lambda day: calendar_date.fromordinal(day).isocalendar()[:2], j)
+
+    def month_range(self, j):
+        """Positions [lo, hi) in the same calendar month as position j."""
+        return self._range("month", lambda day: calendar_date.fromordinal(day).replace(day=1), j)
+
+    def _range(self, name, key, j):
+        ranges = self._ranges.get(name)
+        if ranges is None:
+            # Positions are in date order, so each period is one contiguous run
+            keys = [key(day) for day in (self.offsets // MINUTES_PER_DAY).tolist()]
+            ranges = [None] * len(keys)
+            lo = 0
+            for k in range(1, len(keys) + 1):
+                if k == len(keys) or keys[k] != keys[lo]:
+                    for i in range(lo, k):
+                        ranges[i] = (lo, k)
+                    lo = k
+            self._ranges[name] = ranges
+        return ranges[j]
+
+    def place_day(self, j, shifts):
+        """Record one shift string (or 'off') per person for position j."""
+        for p, shift in enumerate(shifts):
+            interval = parse_shift(shift)
+            if interval is None:
+                self.clear(j, p)
+            else:
+                self.place(j, p, interval)
+
+    def fits(self, j, p, interval):
+        """True when person p can take interval on position j next to all their other shifts."""
+        start = self.offsets[j] + interval.start
+        end = self.offsets[j] + interval.end
+        rest = self.min_rest
+        for k in range(max(0, j - self.reach), min(len(self.offsets), j + self.reach + 1)):
+            if k != j and self.starts[k, p] < end + rest and start < self.ends[k, p] + rest:
+                return False
+        return True
+
+    def allowed_after(self, j, intervals):
+        """
+        Bool [person, slot] of who can take each of position j's slot intervals
+        given their shifts on earlier positions, for passes that go day by day.
+
+        A slot whose interval is None (not a parsable shift) is allowed for everyone.
+        """
+        allowed = np.ones((self.starts.shape[1], len(intervals)), dtype=bool)
+        lo = max(0, j - self.reach)
+        if lo == j:
+            return allowed
+        starts, ends = self.starts[lo:j], self.ends[lo:j]
+        rest = self.min_rest
+        for s, interval in enumerate(intervals):
+            if interval is None:
+                continue
+            start = self.offsets[j] + interval.start
+            end = self.offsets[j] + interval.end
+            allowed[:, s] = ~((starts < end + rest) & (start < ends + rest)).any(axis=0)
+        return allowed
+
+    def advance(self, day):
+        """
+        Drop the oldest position and append an empty one for day, so a window
+        of reach + 1 positions can follow a stream of days of any length.
+        """
+        self.offsets[:-1] = self.offsets[1:]
+        self.starts[:-1] = self.starts[1:]
+        self.ends[:-1] = self.ends[1:]
+        self.offsets[-1] = day * MINUTES_PER_DAY
+        self._ranges.clear()
+        self.starts[-1] = _NEVER_START
+        self.ends[-1] = _NEVER_END
@@ -18,9 +18,10 @@ class LoadingThread(QThread):
         from logger_utils import setup_logging
         setup_logging()
         
-        # Task 2: Load employee data
+        # Task 2: Load employee data, giving employees and stored availability stable ids the first time
         self.progress_update.emit(30, "Loading employee data...")
-        from scheduling_logic import load_employees
+        from scheduling_logic import load_employees, migrate_employee_ids
+        migrate_employee_ids()
         employees = load_employees()
         
         # Task 3: Load availability data
@@ -0,0 +1,144 @@
+import sqlite3
+
+import pytest
+
+import scheduling_logic
+from availability_store import SQLiteAvailabilityStore
+from json_codec import read_json, write_json
+
+# Version 1 of the availability database, keyed by name
+SCHEMA_V1 = """
+CREATE TABLE cells (date TEXT NOT NULL, employee TEXT NOT NULL, PRIMARY KEY (date, employee));
+CREATE TABLE shifts (
+    date TEXT NOT NULL, employee TEXT NOT NULL, position INTEGER NOT NULL, shift TEXT NOT NULL,
+    PRIMARY KEY (date, employee, position)
+) WITHOUT ROWID;
+CREATE INDEX cells_by_employee ON cells (employee);
+CREATE INDEX shifts_by_employee ON shifts (employee, date);
+"""
+
+# Stored in a different order than employees.json lists them, so every
+# store-made id differs from the registry id and renumbering has to swap ids
+AVAILABILITY = {
+    "2025-01-06": {"Cy": ["10-19"], "Bob": ["7-16", "15-24"], "Ann": [], "Gone": ["AL"]},
+    "2025-01-07": {"Cy": ["10-19"], "Bob": [], "Ann": ["15-24"], "Gone": []},
+}
+ROSTER = [
+    {"name": "Ann", "role": "Freelancer"},
+    {"name": "Bob", "role": "Freelancer"},
+    {"name": "Cy", "role": "Fulltimers", "start_time": "10", "end_time": "19"},
+]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A directory with a version 1 database and an employees.json without ids."""
+    monkeypatch.chdir(tmp_path)
+    connection = sqlite3.connect(scheduling_logic.AVAILABILITY_DB)
+    connection.executescript(SCHEMA_V1)
+    for date, day in AVAILABILITY.items():
+        for name, shifts in day.items():
+            connection.execute("INSERT INTO cells VALUES (?, ?)", (date, name))
+            connection.executemany("INSERT INTO shifts VALUES (?, ?, ?, ?)",
+                                   [(date, name, position, shift) for position, shift in enumerate(shifts)])
+    connection.commit()
+    connection.close()
+    write_json('employees.json', ROSTER)
+
+    monkeypatch.setattr(scheduling_logic, "AVAILABILITY_BACKEND", "sqlite")
+    monkeypatch.setattr(scheduling_logic, "_availability_store", None)
+    monkeypatch.setattr(scheduling_logic, "_availability_writer", None)
+    restart(monkeypatch)
+    yield tmp_path
+    if scheduling_logic._availability_store is not None:
+        scheduling_logic._availability_store.close()
+
+
+def restart(monkeypatch):
+    """Reload employees.json and reopen the database, as a new session would."""
+    if scheduling_logic._availability_store is not None:
+        scheduling_logic._availability_store.close()
+        scheduling_logic._availability_store = None
+    monkeypatch.setattr(scheduling_logic, "EMPLOYEES", scheduling_logic.load_employees())
+    monkeypatch.setattr(scheduling_logic, "_last_sync", None)
+
+
+def schema_version():
+    return scheduling_logic.stored_availability().connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def test_migrate_then_load(workdir):
+    store = scheduling_logic.stored_availability()
+    # Opening migrates the names to ids of the store's own, which say nothing yet
+    assert schema_version() == 2
+    assert store.stored_ids() == {}
+
+    assert scheduling_logic.migrate_employee_ids()
+
+    data = read_json('employees.json')
+    assert data["next_id"] == 4
+    assert [(emp["id"], emp["name"]) for emp in data["employees"]] == [(1, "Ann"), (2, "Bob"), (3, "Cy")]
+    assert schema_version() == 3
+    assert store.stored_ids() == {"Ann": 1, "Bob": 2, "Cy": 3, "Gone": -1}
+    assert scheduling_logic.load_data() == AVAILABILITY
+    assert list(scheduling_logic.load_data()["2025-01-06"]) == ["Cy", "Bob", "Ann", "Gone"]
+
+
+def test_second_migration_changes_nothing(workdir, monkeypatch):
+    assert scheduling_logic.migrate_employee_ids()
+    employees = (workdir / 'employees.json').read_bytes()
+    stored_ids = scheduling_logic.stored_availability().stored_ids()
+
+    restart(monkeypatch)
+    assert not scheduling_logic.migrate_employee_ids()
+    assert (workdir / 'employees.json').read_bytes() == employees
+    assert scheduling_logic.stored_availability().stored_ids() == stored_ids
+    assert scheduling_logic.load_data() == AVAILABILITY
+
+
+def test_adopt_ids_swaps_ids_that_are_in_use():
+    # Numbered in storage order, as a version 2 database is
+    store = SQLiteAvailabilityStore(":memory:", employee_ids={"Cy": 1, "Bob": 2, "Ann": 3, "Gone": 4}.get)
+    store.save(AVAILABILITY)
+
+    # Ann and Cy trade ids and Gone drops out of the registry; each target id is already taken
+    assert store.adopt_ids({"Ann": 1, "Bob": 2, "Cy": 3})
+    assert store.stored_ids() == {"Cy": 3, "Bob": 2, "Ann": 1, "Gone": -1}
+    assert store.load() == AVAILABILITY
+    assert not store.adopt_ids({"Ann": 1, "Bob": 2, "Cy": 3})
+
+
+def test_rename_then_sync_keeps_the_cells(workdir, monkeypatch):
+    scheduling_logic.migrate_employee_ids()
+    data = read_json('employees.json')
+    data["employees"][1]["name"] = "Rob"
+    write_json('employees.json', data)
+
+    # The next session finds the rename through the stored id, not as Bob leaving and Rob joining
+    restart(monkeypatch)
+    scheduling_logic.sync_availability()
+    availability = scheduling_logic.load_data()
+    assert availability["2025-01-06"]["Rob"] == ["7-16", "15-24"]
+    assert all(set(day) == {"Ann", "Rob", "Cy"} for day in availability.values())
+    assert scheduling_logic.stored_availability().stored_ids() == {"Ann": 1, "Rob": 2, "Cy": 3}
+
+
+def test_write_before_sync_does_not_take_a_stored_id(workdir, monkeypatch):
+    scheduling_logic.migrate_employee_ids()
+    data = read_json('employees.json')
+    data["employees"][1]["name"] = "Rob"
+    write_json('employees.json', data)
+    restart(monkeypatch)
+
+    # Rob's id 2 still belongs to Bob in the store, so Rob's cell is stored under an id of its own
+    store = scheduling_logic.stored_availability()
+    store.load()
+    store.save({"2025-01-08": {"Rob": ["7-16"]}}, [("2025-01-08", "Rob")])
+    assert store.stored_ids()["Bob"] == 2
+    assert store.stored_ids()["Rob"] < 0
+    assert scheduling_logic.load_data()["2025-01-06"]["Bob"] == ["7-16", "15-24"]
+
+    scheduling_logic.sync_availability()
+    availability = scheduling_logic.load_data()
+    assert [availability[date]["Rob"] for date in sorted(availability)] == [["7-16", "15-24"], [], ["7-16"]]
+    assert store.stored_ids() == {"Ann": 1, "Rob": 2, "Cy": 3}
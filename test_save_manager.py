@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from json_codec import read_json, write_json
+from save_manager import CATALOG_FILE, SaveManager, manifest_chunks
+
+IDS = {"Ann": 1, "Bob": 2, "Rob": 2}
+
+FIRST = {
+    "2025-01-06": {"Ann": ["7-16"], "Bob": ["15-24"]},
+    "2025-01-07": {"Ann": [], "Bob": ["AL"]},
+}
+# One cell differs from FIRST, so the two saves share every other chunk
+SECOND = {
+    "2025-01-06": {"Ann": ["7-16"], "Bob": ["15-24"]},
+    "2025-01-07": {"Ann": ["10-19"], "Bob": ["AL"]},
+}
+SCHEDULE = [{"Date": "06/01/2025", "Ann": "7-16", "Bob": "15-24"}]
+
+LEGACY = {
+    "metadata": {"id": "save_20240101_000000", "created_at": "2024-01-01T00:00:00", "description": "legacy",
+                 "start_date": None, "end_date": None},
+    "availability_data": {"2024-01-01": {"Ann": ["7-16"]}},
+    "schedule_data": None,
+}
+
+
+@pytest.fixture
+def saves_directory(tmp_path):
+    directory = tmp_path / "saves"
+    directory.mkdir()
+    write_json(str(directory / "save_20240101_000000.json"), LEGACY)
+    return str(directory)
+
+
+def two_saves(manager):
+    first = manager.save_schedule(FIRST, SCHEDULE, "first")
+    second = manager.save_schedule(SECOND, SCHEDULE, "second")
+    return first, second
+
+
+def chunks_of(manager, save_id):
+    return set(manifest_chunks(read_json(manager.save_path(save_id))))
+
+
+def test_delete_save_keeps_shared_chunks(saves_directory):
+    manager = SaveManager(saves_directory, employee_ids=IDS.get)
+    first, second = two_saves(manager)
+    only_first = chunks_of(manager, first) - chunks_of(manager, second)
+    assert len(only_first) == 1
+
+    assert manager.delete_save(first)
+    assert set(manager.chunks.digests()) == chunks_of(manager, second)
+    assert not any(digest in manager.chunks for digest in only_first)
+    assert manager.load_save(second)["availability_data"] == SECOND
+    assert manager.load_save(second)["schedule_data"] == SCHEDULE
+    assert manager.load_save(LEGACY["metadata"]["id"]) == LEGACY
+    assert [save["id"] for save in manager.get_all_saves()] == [second, LEGACY["metadata"]["id"]]
+
+
+def test_delete_save_after_the_catalog_is_lost(saves_directory):
+    manager = SaveManager(saves_directory, employee_ids=IDS.get)
+    first, second = two_saves(manager)
+    manager.catalog.close()
+    os.remove(os.path.join(saves_directory, CATALOG_FILE))
+
+    # The new catalog is empty; delete_save has it read every manifest before judging chunks unused
+    manager = SaveManager(saves_directory, employee_ids=IDS.get)
+    assert manager.delete_save(first)
+    assert set(manager.chunks.digests()) == chunks_of(manager, second)
+    assert manager.load_save(second)["availability_data"] == SECOND
+    assert [save["id"] for save in manager.get_all_saves()] == [second, LEGACY["metadata"]["id"]]
+
+
+def test_collect_garbage_after_a_manifest_is_removed(saves_directory):
+    manager = SaveManager(saves_directory, employee_ids=IDS.get)
+    first, second = two_saves(manager)
+    only_first = chunks_of(manager, first) - chunks_of(manager, second)
+    os.remove(manager.save_path(first))
+
+    assert manager.collect_garbage() == len(only_first)
+    assert set(manager.chunks.digests()) == chunks_of(manager, second)
+    assert manager.collect_garbage() == 0
+    assert manager.load_save(second)["availability_data"] == SECOND
+    assert manager.load_save(LEGACY["metadata"]["id"]) == LEGACY
+
+
+def test_renamed_employee_reuses_chunks(saves_directory):
+    manager = SaveManager(saves_directory, employee_ids=IDS.get)
+    first = manager.save_schedule(FIRST, SCHEDULE)
+    renamed = {date: {"Rob" if name == "Bob" else name: shifts for name, shifts in day.items()}
+               for date, day in FIRST.items()}
+    second = manager.save_schedule(renamed)
+
+    assert chunks_of(manager, second) <= chunks_of(manager, first)
+    assert manager.load_save(second)["availability_data"] == renamed
+    assert manager.load_save(first)["availability_data"] == FIRST
@@ -0,0 +1,41 @@
+import csv
+from datetime import date, timedelta
+
+from compact_availability import CompactAvailability
+from scheduling_logic import EMPLOYEES, export_schedule_stream, iter_schedule
+
+CELLS = (["7-16"], ["0930-1830", "15-24"], ["15-24"], [], ["AL"], ["7-16", "10-19", "15-24"])
+
+
+def sample_availability(days=21):
+    start = date(2025, 1, 6)
+    return {
+        (start + timedelta(days=d)).isoformat(): {name: list(CELLS[(d + e) % len(CELLS)])
+                                                  for e, name in enumerate(EMPLOYEES.names())}
+        for d in range(days)
+    }
+
+
+def stream(availability):
+    warnings, violations = [], []
+    rows = [dict(row) for row in iter_schedule(availability, warnings=warnings, violations=violations)]
+    return rows, warnings, [str(violation) for violation in violations]
+
+
+def test_compact_availability_streams_like_the_dict():
+    availability = sample_availability()
+    rows, warnings, violations = stream(availability)
+    assert len(rows) == len(availability)
+    assert stream(CompactAvailability(availability)) == (rows, warnings, violations)
+
+
+def test_export_schedule_stream_reads_compact_availability(tmp_path):
+    availability = sample_availability()
+    path = tmp_path / "schedule.csv"
+    warnings = export_schedule_stream(CompactAvailability(availability), str(path))
+
+    rows, expected_warnings, violations = stream(availability)
+    assert warnings == expected_warnings + violations
+    with open(path, newline='', encoding='utf-8') as f:
+        exported = list(csv.DictReader(f))
+    assert exported == [{key: str(value) for key, value in row.items()} for row in rows]
@@ -6,21 +6,25 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                               QMessageBox, QGridLayout, QScrollArea, QDialog, QLineEdit, QMenu,
                                 )
 from PySide6.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView, QDialogButtonBox # Import for SchedulePreviewDialog
-from PySide6.QtCore import Qt, QDate, QPoint
+from PySide6.QtCore import Qt, QDate, QPoint, QTimer
 from PySide6.QtGui import QColor, QPalette
 from PySide6.QtGui import QCursor # Import for correctly positioning leave menu
 
 from save_manager import SaveManager
-from scheduling_logic import (EMPLOYEES, Freelancer,  
-                              load_data, save_data, init_availability, 
+import save_retention
+from save_retention import RetentionEngine
+from incremental_scheduler import BackgroundBuild
+from shift_intervals import format_shift
+from scheduling_logic import (Freelancer,  
+                              load_data, save_data, flush_availability, availability_save_status, init_availability, 
                                generate_schedule, import_from_excel, 
-                               edit_employee, load_employees, ROLE_RULES, add_employee, delete_employee,sync_availability,
+                               edit_employee, load_employees, ROLE_RULES, get_rule_set, get_rule_errors, add_employee, employee_id, delete_employee,sync_availability,
                               export_availability_to_excel, clear_availability)
 # Import for Calendar UI
 from datetime import datetime, timedelta 
 
 # Import for logging
-from logger_utils import setup_logging, log_error, log_info, create_data_package  
+from logger_utils import setup_logging, log_error, log_info, create_data_package, add_crash_handler  
 
 # Import for localization
 # after updating the .ts file, run this in console to generate the .qm file
@@ -58,9 +62,15 @@ class AvailabilityEditor(QMainWindow):
         # Initialize logging first thing
         self.log_file = setup_logging()
         log_info("Application started")
+        # Availability edits are saved in the background; write them out before a crash is reported
+        add_crash_handler(flush_availability)
 
         # Initialize save manager
-        self.save_manager = SaveManager()
+        self.save_manager = SaveManager(employee_ids=employee_id)
+        # Prune old saves and backups (save_retention.DEFAULT_TIERS); only in the background when opted in
+        self.retention = RetentionEngine(self.save_manager)
+        if save_retention.AUTO_PRUNE:
+            self.retention.start()
 
         self.start_date = start_date
         self.employees = load_employees()  # Load employees from JSON
@@ -70,8 +80,22 @@ class AvailabilityEditor(QMainWindow):
         loaded_data = load_data()
         self.availability = loaded_data if loaded_data else init_availability(start_date, self.employees)
         
+        # Built on a worker thread whenever self.availability is replaced, then kept up to date cell by cell
+        self.live_scheduler = None
+        self.live_build = None
+        
         self.init_ui()
         self.update_calendar()
+        if get_rule_errors():
+            # Once the window is up, so the warning is not left behind it
+            QTimer.singleShot(0, self.show_rule_errors)
+
+    def show_rule_errors(self):
+        """Tell the user which roles in role_rules.json were skipped as invalid."""
+        errors = get_rule_errors()
+        log_info("Invalid roles skipped: " + "; ".join(errors))
+        QMessageBox.warning(self, self.tr("Invalid Roles"),
+                            self.tr("These roles in role_rules.json are invalid and were skipped:") + "\n\n" + "\n".join(errors))
 
     def init_ui(self):
         self.setWindowTitle(self.tr("Employee Availability Editor"))
@@ -109,6 +133,8 @@ class AvailabilityEditor(QMainWindow):
         tools_menu = QMenu(self)
         generate_action = tools_menu.addAction(self.tr("Generate Schedule"))
         validate_action = tools_menu.addAction(self.tr("Validate Schedule"))
+        tools_menu.addSeparator()
+        retention_action = tools_menu.addAction(self.tr("Save Retention Report"))
         tools_btn.setMenu(tools_menu)
 
         # HELP MENU
@@ -138,6 +164,7 @@ class AvailabilityEditor(QMainWindow):
         add_role_action.triggered.connect(self.add_new_role)
         generate_action.triggered.connect(self.generate_schedule)
         validate_action.triggered.connect(self.validate_schedule)
+        retention_action.triggered.connect(self.show_retention_report)
         data_package_action.triggered.connect(self.create_debug_package)
         check_updates_action.triggered.connect(self.check_for_updates)
 
@@ -212,6 +239,21 @@ class AvailabilityEditor(QMainWindow):
         self.selected_employee_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
         calendar_container.addWidget(self.selected_employee_label)
         
+        # Warning count from the live (incremental) schedule, refreshed on every edit
+        self.live_validation_label = QLabel("")
+        self.live_validation_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
+        calendar_container.addWidget(self.live_validation_label)
+        self.live_build_timer = QTimer(self)
+        self.live_build_timer.timeout.connect(self.finish_live_validation)
+        
+        # Background save state of availability edits, polled so the writer thread never touches widgets
+        self.save_status_label = QLabel("")
+        self.save_status_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
+        calendar_container.addWidget(self.save_status_label)
+        self.save_status_timer = QTimer(self)
+        self.save_status_timer.timeout.connect(self.update_save_status)
+        self.save_status_timer.start(200)
+        
         # Scroll area for the calendar - adjust to better handle grid layout
         scroll = QScrollArea()
         self.calendar_widget = QWidget()
@@ -563,7 +605,11 @@ class AvailabilityEditor(QMainWindow):
         
         # Add the new role to ROLE_RULES
         from scheduling_logic import add_role
-        add_role(role_name, new_role)
+        try:
+            add_role(role_name, new_role)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
         
         # Update UI components
         self.role_combo.clear()
@@ -694,10 +740,14 @@ class AvailabilityEditor(QMainWindow):
             return
         
         # For freelancers, ignore time inputs and use default rules
-        if new_role == 'Freelancer':
-            add_employee(new_name, new_role, additional_roles)
-        else:
-            add_employee(new_name, new_role, additional_roles, new_start_time, new_end_time)
+        try:
+            if new_role == 'Freelancer':
+                add_employee(new_name, new_role, additional_roles)
+            else:
+                add_employee(new_name, new_role, additional_roles, new_start_time, new_end_time)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
         
         # Refresh data and UI
         self.employees = load_employees()
@@ -713,7 +763,7 @@ class AvailabilityEditor(QMainWindow):
         
         # Add the new option for changing shift time
         # Get the employee to check if they're a fulltimer
-        current_employee = next((e for e in self.employees if e.name == self.current_employee_name), None)
+        current_employee = self.employees.get(self.current_employee_name)
         if current_employee and current_employee.employee_type != "Freelancer":
             change_shift_action = context_menu.addAction("Change Shift Time for Today")
         else:
@@ -741,7 +791,8 @@ class AvailabilityEditor(QMainWindow):
                 current_shifts.remove(shift)
             current_shifts.append(leave_type)
             
-            save_data(self.availability)
+            save_data(self.availability, [(date_str, self.current_employee_name)])
+            self.refresh_live_validation(date_str)
             self.update_calendar()
 
     def show_custom_shift_dialog(self, date_str, shift):
@@ -778,7 +829,11 @@ class AvailabilityEditor(QMainWindow):
             return
         
         # Create the custom shift string
-        custom_shift = f"{start_time}-{end_time}"
+        try:
+            custom_shift = format_shift(start_time, end_time)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
         
         # Update availability data
         if self.current_employee_name in self.availability[date_str]:
@@ -799,7 +854,8 @@ class AvailabilityEditor(QMainWindow):
             self.availability[date_str][self.current_employee_name] = current_shifts
             
             # Save and update UI
-            save_data(self.availability)
+            save_data(self.availability, [(date_str, self.current_employee_name)])
+            self.refresh_live_validation(date_str)
             self.update_calendar()
             
         dialog.accept()
@@ -922,24 +978,23 @@ class AvailabilityEditor(QMainWindow):
 
         day_layout.addWidget(day_label)
 
-        current_employee = next((e for e in self.employees if e.name == self.current_employee_name), None)
+        current_employee = self.employees.get(self.current_employee_name)
 
         if current_employee:
             role = current_employee.employee_type
-            rule = ROLE_RULES.get(role, {})
+            rule = get_rule_set().get(role)
             available_shifts = []
 
             # Determine available shifts based on role rules
             if rule:
-                if rule["rule_type"] == "shift_based":
-                    day_type = "weekend" if date.weekday() >= 5 else "weekday"
-                    available_shifts = list(rule["shifts"][day_type].values())
-                elif rule["rule_type"] == "fixed_time":
+                if rule.rule_type == "shift_based":
+                    available_shifts = list(rule.day(date).times)
+                elif rule.rule_type == "fixed_time":
                     # Use employee's custom time if available, otherwise use default
                     if current_employee.start_time and current_employee.end_time:
                         available_shifts = [f"{current_employee.start_time}-{current_employee.end_time}"]
                     else:
-                        available_shifts = [rule["default_shift"]]
+                        available_shifts = [rule.default_shift]
 
             # Get role color
             role_colors = {
@@ -1042,6 +1097,10 @@ class AvailabilityEditor(QMainWindow):
 
 
     def update_calendar(self):
+        # Data was (re)loaded: build the live scheduler for it before the next edit needs it
+        if self.live_build is None and getattr(self.live_scheduler, "availability", None) is not self.availability:
+            self.start_live_validation()
+
         # Clear existing widgets
         while self.calendar_layout.count():
             item = self.calendar_layout.takeAt(0)
@@ -1101,7 +1160,7 @@ class AvailabilityEditor(QMainWindow):
                     leaves = [s for s in current_shifts if s in {"AL", "CL", "PH", "ON", "自由調配", "half off"}]
                     
                     # Get employee and determine role type
-                    current_employee = next((e for e in self.employees if e.name == self.current_employee_name), None)
+                    current_employee = self.employees.get(self.current_employee_name)
                     is_freelancer = current_employee and current_employee.employee_type == "Freelancer"
                     
                     for i in range(day_widget.layout().count()):
@@ -1139,7 +1198,7 @@ class AvailabilityEditor(QMainWindow):
             leave_types = ["AL", "CL", "PH", "ON", "自由調配", "half off"]
             
             # Get the employee to determine if this is a fulltimer
-            current_employee = next((e for e in self.employees if e.name == self.current_employee_name), None)
+            current_employee = self.employees.get(self.current_employee_name)
             is_fulltimer = current_employee and current_employee.employee_type != "Freelancer"
             
             if shift in leave_types:
@@ -1171,9 +1230,62 @@ class AvailabilityEditor(QMainWindow):
             # Update the availability for this date and employee
             self.availability[date_str][self.current_employee_name] = current_shifts
             
-            save_data(self.availability)
+            save_data(self.availability, [(date_str, self.current_employee_name)])
+            self.refresh_live_validation(date_str)
             self.update_calendar()
 
+    def start_live_validation(self):
+        """Build the live scheduler for the current availability on a worker thread."""
+        self.live_scheduler = None
+        self.live_build = BackgroundBuild(self.availability)
+        self.live_build.start()
+        self.live_build_timer.start(100)
+        self.live_validation_label.setText(self.tr("Live validation: preparing..."))
+
+    def finish_live_validation(self):
+        """Take over the background build once it is done; polled so the worker never touches widgets."""
+        build = self.live_build
+        if build is None or not build.done():
+            return
+        self.live_build_timer.stop()
+        self.live_build = None
+        if build.availability is not self.availability:
+            self.start_live_validation()
+            return
+        if build.error is not None:
+            log_error("Live validation failed", build.error)
+            self.live_validation_label.setText("")
+            return
+        try:
+            self.live_scheduler = build.attach()
+        except Exception as e:
+            log_error("Live validation failed", e)
+            return
+        self.show_live_warnings()
+
+    def refresh_live_validation(self, date_str):
+        """Reschedule around the edited cell and show the resulting warning count."""
+        if self.live_scheduler is None or self.live_scheduler.availability is not self.availability:
+            # Still building, or availability was replaced: the edit is replayed once the build is done
+            if self.live_build is None or self.live_build.availability is not self.availability:
+                self.start_live_validation()
+            self.live_build.edited.append((date_str, self.current_employee_name))
+            return
+        try:
+            changes = self.live_scheduler.update_cell(date_str, self.current_employee_name)
+            if changes:
+                log_info(f"Live validation: {len(changes)} assignment(s) changed after editing {date_str}")
+            self.show_live_warnings()
+        except Exception as e:
+            log_error("Live validation failed", e)
+
+    def show_live_warnings(self):
+        warning_count = len(self.live_scheduler.warnings)
+        if warning_count:
+            self.live_validation_label.setText(self.tr("Live validation: ") + str(warning_count) + self.tr(" warning(s)"))
+        else:
+            self.live_validation_label.setText(self.tr("Live validation: no issues"))
+
 
 
 
@@ -1230,7 +1342,7 @@ class AvailabilityEditor(QMainWindow):
 
 
     def edit_employee(self, name):
-        old_employee = next((emp for emp in self.employees if emp.name == name), None)
+        old_employee = self.employees.get(name)
         
         if old_employee:
             dialog = QDialog(self)
@@ -1361,16 +1473,36 @@ class AvailabilityEditor(QMainWindow):
             QMessageBox.warning(self, "Error", "Fulltimers must provide start and end times")
             return
         
-        edit_employee(old_name, new_name, new_role, additional_roles, new_start_time, new_end_time)
+        try:
+            edit_employee(old_name, new_name, new_role, additional_roles, new_start_time, new_end_time)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
         self.employees = load_employees()
         self.availability = load_data()
         self.update_employee_list(self.role_combo.currentText())
         self.update_calendar()
         dialog.accept()
 
+    def update_save_status(self):
+        status = availability_save_status()
+        texts = {
+            "saved": self.tr("All changes saved"),
+            "dirty": self.tr("Unsaved changes"),
+            "saving": self.tr("Saving..."),
+            "failed": self.tr("Saving failed, retrying..."),
+        }
+        self.save_status_label.setText(texts[status])
+
     def save_data(self):
         sync_availability()  # Force synchronization
         save_data(self.availability)
+        try:
+            flush_availability()
+        except RuntimeError as e:
+            log_error("Failed to save availability", e)
+            QMessageBox.critical(self, self.tr("Error"), str(e))
+            return
         
         # Ask if user wants to create a named save
         reply = QMessageBox.question(
@@ -1523,6 +1655,38 @@ class AvailabilityEditor(QMainWindow):
             
             QMessageBox.information(self, "Success", f"Employee {name} deleted successfully.")
     
+    def show_retention_report(self):
+        """Show which saves and backups the retention policy would prune, and prune them if the user confirms."""
+        try:
+            report = self.retention.run(dry_run=True)
+        except Exception as e:
+            log_error("Failed to build retention report", e)
+            QMessageBox.critical(self, self.tr("Error"), str(e))
+            return
+        message = QMessageBox(self)
+        message.setWindowTitle(self.tr("Save Retention Report"))
+        message.setText(self.tr(f"{len(report.pruned)} saves and backups would be pruned, "
+                                f"freeing {report.bytes_freed / 1e6:.2f} MB."))
+        message.setDetailedText(report.format())
+        prune_button = None
+        if report.pruned:
+            message.setInformativeText(self.tr("Pruned saves and backups are deleted permanently."))
+            prune_button = message.addButton(self.tr("Prune Now"), QMessageBox.DestructiveRole)
+        message.addButton(QMessageBox.Close)
+        message.exec_()
+        if prune_button is None or message.clickedButton() is not prune_button:
+            return
+        try:
+            report = self.retention.run()
+            log_info(f"Retention pruned {len(report.pruned)} saves and backups")
+        except Exception as e:
+            log_error("Failed to prune saves", e)
+            QMessageBox.critical(self, self.tr("Error"), str(e))
+            return
+        QMessageBox.information(self, self.tr("Save Retention"),
+                                self.tr(f"Pruned {len(report.pruned)} saves and backups, "
+                                        f"freeing {report.bytes_freed / 1e6:.2f} MB."))
+
     def create_debug_package(self):
         try:
             log_info("Creating data package requested by user")
@@ -1702,6 +1866,10 @@ class SaveBrowserWindow(QDialog):
         self.load_btn.clicked.connect(self.load_selected)
         button_layout.addWidget(self.load_btn)
         
+        self.preview_btn = QPushButton(parent.tr("Preview Selected"))
+        self.preview_btn.clicked.connect(self.preview_selected)
+        button_layout.addWidget(self.preview_btn)
+        
         self.delete_btn = QPushButton(parent.tr("Delete Selected"))
         self.delete_btn.clicked.connect(self.delete_selected)
         button_layout.addWidget(self.delete_btn)
@@ -1793,6 +1961,43 @@ class SaveBrowserWindow(QDialog):
             self.accept()  # Close the browser window
             self.parent.load_save_data(save_id)
     
+    def preview_selected(self):
+        """Show the schedule of the selected save without loading the rest of it."""
+        selected_items = self.table.selectedItems()
+        
+        if not selected_items:
+            QMessageBox.warning(
+                self, 
+                self.parent.tr("No Selection"), 
+                self.parent.tr("Please select a save to preview")
+            )
+            return
+            
+        # Get the save ID from the selected row
+        row = selected_items[0].row()
+        save_id = self.table.item(row, 0).text()
+        
+        try:
+            save_data = self.save_manager.load_save(save_id, sections=("schedule_data",))
+        except Exception as e:
+            log_error("Failed to preview save", e)
+            QMessageBox.critical(
+                self,
+                self.parent.tr("Preview Failed"), 
+                self.parent.tr(f"Failed to preview save {save_id}: {str(e)}")
+            )
+            return
+        
+        schedule_data = save_data.get("schedule_data")
+        if not schedule_data:
+            QMessageBox.information(
+                self,
+                self.parent.tr("No Schedule"), 
+                self.parent.tr(f"Save {save_id} has no generated schedule")
+            )
+            return
+        SchedulePreviewDialog(schedule_data, self).exec_()
+    
     def delete_selected(self):
         """Delete the selected save."""
         selected_items = self.table.selectedItems()
@@ -1867,6 +2072,10 @@ class SaveBrowserWindow(QDialog):
 
 
 if __name__ == "__main__":
+    # Needed by the process pool of generate_schedule_scenarios in frozen builds
+    from multiprocessing import freeze_support
+    freeze_support()
+    
     try:
         # Initialize logging before creating the main window
         from logger_utils import setup_logging, log_info, log_error